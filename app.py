@@ -3,6 +3,7 @@ import logging
 from flask import Flask, request, render_template, redirect, url_for, flash, jsonify, send_from_directory
 from werkzeug.utils import secure_filename
 import threading
+import functools
 import jinja2
 import json
 
@@ -12,7 +13,9 @@ logger = logging.getLogger(__name__)
 
 # Importar módulos del proyecto
 from procesadores import obtener_procesador, obtener_procesador_postgresql
-from modelo_busqueda import Indexador, Buscador
+from modelo_busqueda import (Indexador, Buscador, PipelineIndexacion, GeneracionesIndice, CacheEmbeddings,
+                             CacheConsultas, CacheResultados, registro_modelos)
+from modelo_busqueda.codificadores import nombre_codificador
 import config
 
 # Crear la aplicación Flask
@@ -36,67 +39,184 @@ def page_not_found(e):
 # Crear directorios necesarios
 config.crear_directorios()
 
-# Inicializar el indexador y buscador
-indexador = Indexador(directorio_datos=config.DATA_FOLDER, 
-                     tamano_fragmento=config.DEFAULT_FRAGMENT_SIZE, 
-                     solapamiento=config.DEFAULT_OVERLAP)
-buscador = Buscador(indexador)
+# Generaciones del índice: las reconstrucciones se escriben en una nueva mientras se sirve la activa
+generaciones = GeneracionesIndice(config.DATA_FOLDER)
+generaciones.limpiar_huerfanas()
+
+# Caché de embeddings común a todas las generaciones, para no recalcularlos al reconstruir
+cache_embeddings = None
+if config.EMBEDDING_CACHE_MAX_ENTRIES > 0:
+    cache_embeddings = CacheEmbeddings(generaciones.ruta_compartida("cache_embeddings.db"),
+                                       nombre_codificador(config.ENCODER_BACKEND, config.EMBEDDING_MODEL,
+                                                          config.ONNX_MODEL_PATH),
+                                       max_entradas=config.EMBEDDING_CACHE_MAX_ENTRIES)
+
+def crear_indexador(directorio_datos, tamano_fragmento=config.DEFAULT_FRAGMENT_SIZE,
+                    solapamiento=config.DEFAULT_OVERLAP):
+    """Crea un indexador sobre el directorio de una generación con los parámetros de config.py"""
+    return Indexador(ruta_modelo=config.EMBEDDING_MODEL,
+                     directorio_datos=directorio_datos,
+                     tamano_fragmento=tamano_fragmento,
+                     solapamiento=solapamiento,
+                     tamano_lote=config.EMBEDDING_BATCH_SIZE,
+                     max_bytes_bitacora=config.JOURNAL_MAX_BYTES,
+                     max_segundos_bitacora=config.JOURNAL_MAX_SECONDS,
+                     tipo_embeddings=config.EMBEDDING_STORAGE_DTYPE,
+                     comprimir_textos=config.TEXT_COMPRESSION,
+                     capacidad_cache_textos=config.TEXT_CACHE_SIZE,
+                     max_entradas_cache_embeddings=config.EMBEDDING_CACHE_MAX_ENTRIES,
+                     modo_fragmentacion=config.CHUNKING_MODE,
+                     solapamiento_tokens=config.CHUNK_OVERLAP_TOKENS,
+                     procesos_codificacion=config.ENCODING_PROCESSES,
+                     tipo_codificador=config.ENCODER_BACKEND,
+                     ruta_modelo_onnx=config.ONNX_MODEL_PATH,
+                     cache_embeddings=cache_embeddings,
+                     capacidad_segmento_memoria=config.SEGMENT_MEMORY_FRAGMENTS,
+                     factor_fusion_segmentos=config.SEGMENT_MERGE_FACTOR,
+                     umbral_compactacion=config.COMPACTION_DEAD_RATIO,
+                     umbral_ann=config.ANN_MIN_FRAGMENTS,
+                     nprobe_ann=config.ANN_NPROBE,
+                     min_filas_ivf=config.ANN_SEGMENT_MIN_FRAGMENTS,
+                     tipo_puntuacion=config.EMBEDDING_SCORING_DTYPE,
+                     filas_reevaluadas=config.RESCORE_CANDIDATES)
+
+# Embeddings de las consultas repetidas; no dependen del índice y se comparten entre generaciones
+cache_consultas = CacheConsultas(config.QUERY_EMBEDDING_CACHE_SIZE)
+# Respuestas ya calculadas; su clave incluye la versión del índice, única también entre generaciones
+cache_resultados = (CacheResultados(config.RESULT_CACHE_MAX_BYTES, config.RESULT_CACHE_SECONDS)
+                    if config.RESULT_CACHE_MAX_BYTES > 0 else None)
+
+# Inicializar el indexador y buscador sobre la generación activa
+indexador = crear_indexador(generaciones.directorio_activo())
+buscador = Buscador(indexador, cache_consultas=cache_consultas, cache_resultados=cache_resultados,
+                    max_bytes_cache_resultados=0, candidatos_semanticos=config.SEMANTIC_SHORTLIST_SIZE)
+
+# Cargar el modelo en segundo plano para que la aplicación responda mientras tanto
+if config.MODEL_WARMUP:
+    registro_modelos.precargar(indexador.tipo_codificador, indexador.ruta_modelo, indexador.ruta_modelo_onnx)
 
 # Variables para controlar el estado de indexación
 indexacion_en_progreso = False
 documentos_indexados = set()
 bd_indexacion_completada = False
+reconstruccion_en_progreso = False  # Reindexación completa en una nueva generación del índice
+pipeline_indexacion = None  # Pipeline de la indexación masiva en curso o de la última
+bloqueo_indice = threading.Lock()  # Serializa los cambios del índice activo con el cambio de generación
 
 def allowed_file(filename):
     """Verifica si un archivo tiene una extensión permitida"""
     return os.path.splitext(filename)[1].lower() in config.ALLOWED_EXTENSIONS
 
+def extraer_documento(ruta_archivo, indice=None):
+    """
+    Extrae el texto y los metadatos de un documento
+    
+    Args:
+        ruta_archivo (str): Ruta al archivo a procesar
+        indice: Indexador cuyo manifiesto se consulta (por defecto, el activo)
+    
+    Returns:
+        tuple o None: (texto, metadatos), o None si el archivo ya está indexado y no
+        cambió desde entonces, o no hay procesador para su extensión
+    """
+    indice = indice if indice is not None else indexador
+    
+    # Obtener el nombre y extensión del archivo
+    nombre_archivo = os.path.basename(ruta_archivo)
+    _, extension = os.path.splitext(ruta_archivo)
+    
+    logger.info(f"Procesando documento: {nombre_archivo}")
+    
+    # Verificar si ya está indexado y sin cambios según el manifiesto
+    if not indice.manifiesto.ha_cambiado(ruta_archivo):
+        logger.info(f"El documento {nombre_archivo} ya está indexado. Omitiendo.")
+        return None
+    
+    # Obtener el procesador adecuado
+    procesador = obtener_procesador(extension.lower())
+    
+    if not procesador:
+        logger.warning(f"No hay procesador disponible para la extensión {extension}")
+        return None
+    
+    # Extraer texto y metadatos
+    texto = procesador.extraer_texto(ruta_archivo)
+    metadatos = procesador.obtener_metadatos(ruta_archivo)
+    
+    return texto, metadatos
+
 def procesar_documento(ruta_archivo):
-    """Procesa un solo documento y lo indexa"""
+    """Procesa un solo documento y lo indexa en el índice activo"""
     global documentos_indexados
     
     try:
-        # Obtener el nombre y extensión del archivo
-        nombre_archivo = os.path.basename(ruta_archivo)
-        _, extension = os.path.splitext(ruta_archivo)
-        
-        logger.info(f"Procesando documento: {nombre_archivo}")
-        
-        # Verificar si ya está indexado
-        if nombre_archivo in documentos_indexados:
-            logger.info(f"El documento {nombre_archivo} ya está indexado. Omitiendo.")
-            return
-        
-        # Obtener el procesador adecuado
-        procesador = obtener_procesador(extension.lower())
-        
-        if not procesador:
-            logger.warning(f"No hay procesador disponible para la extensión {extension}")
+        # Extraer sin bloquear: una extracción lenta no debe retrasar el cambio de generación
+        indice = indexador
+        documento = extraer_documento(ruta_archivo, indice)
+        if documento is None:
             return
         
-        # Extraer texto y metadatos
-        texto = procesador.extraer_texto(ruta_archivo)
-        metadatos = procesador.obtener_metadatos(ruta_archivo)
+        texto, metadatos = documento
         
-        # Indexar el documento
-        indexador.indexar_documento(texto, metadatos)
-        
-        # Marcar como indexado
-        documentos_indexados.add(nombre_archivo)
+        # Bloquear el cambio de generación mientras se modifica el índice activo
+        with bloqueo_indice:
+            # Si entretanto se ha activado otra generación, puede que ya incluya el archivo
+            if indexador is not indice and not indexador.manifiesto.ha_cambiado(ruta_archivo):
+                logger.info(f"El documento {metadatos['nombre']} ya está indexado. Omitiendo.")
+                return
+            
+            # Indexar el documento
+            indexador.indexar_documento(texto, metadatos)
+            
+            # Marcar como indexado
+            documentos_indexados.add(metadatos['nombre'])
+            indexador.manifiesto.registrar(ruta_archivo, metadatos['nombre'])
+            indexador.manifiesto.guardar()
         
-        logger.info(f"Documento {nombre_archivo} procesado e indexado correctamente")
+        logger.info(f"Documento {metadatos['nombre']} procesado e indexado correctamente")
     except Exception as e:
         logger.error(f"Error al procesar el documento {ruta_archivo}: {e}")
 
-def procesar_tabla_postgresql(config_tabla):
+def procesar_documentos(rutas_archivos, indice, nombres):
+    """
+    Procesa varios documentos y los indexa con el pipeline por etapas
+    
+    La extracción, la fragmentación, la codificación (en lotes que reúnen varios documentos)
+    y la persistencia se solapan; ver modelo_busqueda.PipelineIndexacion.
+    
+    Args:
+        rutas_archivos (list): Rutas de los archivos a procesar
+        indice: Indexador en el que se indexan
+        nombres (set): Nombres de los documentos indexados en él, que se actualizan
+    """
+    global pipeline_indexacion
+    
+    pipeline_indexacion = PipelineIndexacion(indice, functools.partial(extraer_documento, indice=indice),
+                                             al_persistir=functools.partial(_registrar_lote, indice, nombres),
+                                             hilos_extraccion=config.EXTRACTION_THREADS,
+                                             tamano_cola=config.PIPELINE_QUEUE_SIZE,
+                                             fragmentos_por_lote=config.PIPELINE_BATCH_FRAGMENTS)
+    pipeline_indexacion.ejecutar(rutas_archivos)
+
+def _registrar_lote(indice, nombres, documentos):
+    """Marca como indexados los documentos de un lote guardado por el pipeline"""
+    for ruta_archivo, metadatos in documentos:
+        nombres.add(metadatos['nombre'])
+        indice.manifiesto.registrar(ruta_archivo, metadatos['nombre'])
+        logger.info(f"Documento {metadatos['nombre']} procesado e indexado correctamente")
+    
+    # Los documentos ya están en la bitácora del índice; el manifiesto se guarda después
+    indice.manifiesto.guardar()
+
+def procesar_tabla_postgresql(config_tabla, indice, nombres):
     """
     Procesa una tabla de PostgreSQL y la indexa
     
     Args:
         config_tabla (dict): Configuración de la tabla a indexar
+        indice: Indexador en el que se indexa
+        nombres (set): Nombres de los documentos indexados en él, que se actualizan
     """
-    global documentos_indexados
-    
     try:
         # Validar configuración
         if not isinstance(config_tabla, dict) or 'tabla' not in config_tabla:
@@ -116,69 +236,190 @@ def procesar_tabla_postgresql(config_tabla):
         
         # Verificar si ya está indexado
         nombre_archivo = metadatos['nombre']
-        if nombre_archivo in documentos_indexados:
+        if nombre_archivo in nombres:
             logger.info(f"La tabla {tabla} ya está indexada con ID {nombre_archivo}. Omitiendo.")
             return
         
         # Indexar el documento
-        indexador.indexar_documento(texto, metadatos)
+        indice.indexar_documento(texto, metadatos)
         
         # Marcar como indexado
-        documentos_indexados.add(nombre_archivo)
+        nombres.add(nombre_archivo)
         
         logger.info(f"Tabla PostgreSQL {tabla} procesada e indexada correctamente")
     except Exception as e:
         logger.error(f"Error al procesar la tabla PostgreSQL {config_tabla.get('tabla', 'desconocida')}: {e}")
 
-def indexar_documentos_default():
-    """Indexa todos los documentos en la carpeta por defecto"""
-    global indexacion_en_progreso, documentos_indexados, bd_indexacion_completada
+def eliminar_documentos_ausentes(rutas_archivos, indice, nombres):
+    """
+    Quita del índice los archivos del manifiesto que ya no están en las carpetas
+    
+    Args:
+        rutas_archivos (list): Rutas de los archivos presentes actualmente
+        indice: Indexador del que se eliminan
+        nombres (set): Nombres de los documentos indexados en él, que se actualizan
+    """
+    presentes = {os.path.normpath(ruta) for ruta in rutas_archivos}
+    eliminados = 0
+    
+    for ruta in indice.manifiesto.rutas():
+        if ruta in presentes:
+            continue
+        
+        entrada = indice.manifiesto.eliminar(ruta)
+        indice.eliminar_documento(entrada['nombre'])
+        nombres.discard(entrada['nombre'])
+        eliminados += 1
+    
+    if eliminados:
+        indice.manifiesto.guardar()
+        logger.info(f"Eliminados del índice {eliminados} documentos cuyos archivos ya no existen")
+
+def listar_archivos():
+    """
+    Reúne los archivos indexables del directorio por defecto y luego los de uploads
+    
+    Returns:
+        list: Rutas de los archivos; si un mismo nombre aparece en ambas carpetas sólo
+        se incluye el de la carpeta por defecto
+    """
+    rutas_archivos = []
+    nombres_vistos = set()
+    for carpeta in [config.DEFAULT_DOCS_FOLDER, config.UPLOAD_FOLDER]:
+        for nombre_archivo in sorted(os.listdir(carpeta)):
+            ruta_completa = os.path.join(carpeta, nombre_archivo)
+            
+            if (os.path.isfile(ruta_completa) and allowed_file(nombre_archivo)
+                    and nombre_archivo not in nombres_vistos):
+                rutas_archivos.append(ruta_completa)
+                nombres_vistos.add(nombre_archivo)
+    return rutas_archivos
+
+def sincronizar_archivos(indice, nombres):
+    """
+    Sincroniza un índice con los archivos de las carpetas
+    
+    Sólo se extraen e indexan los archivos nuevos o modificados según el manifiesto del
+    indexador, y se eliminan del índice los que ya no existen.
+    
+    Args:
+        indice: Indexador a sincronizar
+        nombres (set): Nombres de los documentos indexados en él, que se actualizan
+    """
+    # Quitar los archivos eliminados y luego indexar en lotes los nuevos o modificados
+    rutas_archivos = listar_archivos()
+    eliminar_documentos_ausentes(rutas_archivos, indice, nombres)
+    procesar_documentos(rutas_archivos, indice, nombres)
+
+def sincronizar_indice(indice, nombres):
+    """
+    Sincroniza un índice con los archivos de las carpetas y las tablas de PostgreSQL
+    
+    Args:
+        indice: Indexador a sincronizar
+        nombres (set): Nombres de los documentos indexados en él, que se actualizan
+    """
+    global bd_indexacion_completada
+    
+    sincronizar_archivos(indice, nombres)
+    
+    # Finalmente, indexar las tablas de PostgreSQL configuradas
+    logger.info("Indexando tablas de PostgreSQL...")
+    
+    # Verificar si hay tablas configuradas para indexar
+    if config.PG_TABLES:
+        for config_tabla in config.PG_TABLES:
+            procesar_tabla_postgresql(config_tabla, indice, nombres)
+        bd_indexacion_completada = True
+        logger.info("Indexación de tablas PostgreSQL completada")
+    else:
+        logger.info("No hay tablas PostgreSQL configuradas para indexar")
+
+def reconstruir_indice(**parametros):
+    """
+    Reindexa todos los documentos en una nueva generación del índice y la activa al terminar
+    
+    Las búsquedas siguen usando el índice activo, completo, durante toda la reconstrucción.
+    Al terminar se repite la sincronización de los archivos (no la de las tablas de
+    PostgreSQL, que volvería a extraerlas enteras) sobre la nueva generación con el índice
+    activo bloqueado, para recoger los archivos subidos o eliminados mientras tanto, y se
+    cambia el índice activo de una vez; la generación anterior se elimina después.
+    
+    Args:
+        **parametros: Parámetros de fragmentación de la nueva generación (ver
+                      Indexador.reconfigurar); los que falten se toman del índice activo
+    """
+    global indexador, buscador, documentos_indexados
+    
+    for nombre in ('tamano_fragmento', 'solapamiento', 'modo_fragmentacion', 'solapamiento_tokens'):
+        parametros.setdefault(nombre, getattr(indexador, nombre))
+    
+    directorio = generaciones.nueva()
+    try:
+        nuevo = crear_indexador(directorio)
+        nuevo.reconfigurar(**parametros)
+        nombres = set()
+        
+        logger.info("Reconstruyendo el índice en una nueva generación; el índice activo sigue disponible...")
+        sincronizar_indice(nuevo, nombres)
+        
+        with bloqueo_indice:
+            sincronizar_archivos(nuevo, nombres)
+            generaciones.activar(directorio)
+            anterior = indexador
+            indexador = nuevo
+            buscador = Buscador(nuevo, cache_consultas=cache_consultas, cache_resultados=cache_resultados,
+                                max_bytes_cache_resultados=0,
+                                candidatos_semanticos=config.SEMANTIC_SHORTLIST_SIZE)
+            documentos_indexados = nombres
+    except Exception:
+        generaciones.eliminar(directorio)
+        raise
+    
+    anterior.cerrar()
+    generaciones.eliminar(anterior.directorio_datos)
+    logger.info(f"Índice reconstruido con {len(nombres)} documentos")
+
+def indexar_documentos_default(completo=False, **parametros):
+    """
+    Sincroniza el índice con los documentos de la carpeta por defecto y de uploads
+    
+    Sólo se extraen e indexan los archivos nuevos o modificados según el manifiesto del
+    indexador, y se eliminan del índice los que ya no existen.
+    
+    Args:
+        completo (bool): Si es True, reindexa todos los documentos en una nueva generación
+                         del índice (ver reconstruir_indice)
+        **parametros: Parámetros de fragmentación de la reindexación completa
+    """
+    global indexacion_en_progreso, reconstruccion_en_progreso
     
     try:
         indexacion_en_progreso = True
+        reconstruccion_en_progreso = completo
+        if cache_embeddings is not None:
+            cache_embeddings.reiniciar_estadisticas()
         
-        # Limpiar el índice para empezar desde cero
-        logger.info("Limpiando índice existente antes de reindexar...")
-        indexador.limpiar_indice()
-        documentos_indexados.clear()
-        bd_indexacion_completada = False
-        logger.info("Índice limpiado correctamente, comenzando reindexación...")
-        
-        # Listar archivos en el directorio por defecto
-        for nombre_archivo in os.listdir(config.DEFAULT_DOCS_FOLDER):
-            ruta_completa = os.path.join(config.DEFAULT_DOCS_FOLDER, nombre_archivo)
-            
-            # Verificar si es un archivo y tiene extensión permitida
-            if os.path.isfile(ruta_completa) and allowed_file(nombre_archivo):
-                procesar_documento(ruta_completa)
-        
-        # Luego indexar archivos en la carpeta de uploads
-        for nombre_archivo in os.listdir(config.UPLOAD_FOLDER):
-            ruta_completa = os.path.join(config.UPLOAD_FOLDER, nombre_archivo)
-            
-            # Verificar si es un archivo y tiene extensión permitida
-            if os.path.isfile(ruta_completa) and allowed_file(nombre_archivo):
-                procesar_documento(ruta_completa)
-        
-        # Finalmente, indexar las tablas de PostgreSQL configuradas
-        logger.info("Indexando tablas de PostgreSQL...")
-        
-        # Verificar si hay tablas configuradas para indexar
-        if config.PG_TABLES:
-            for config_tabla in config.PG_TABLES:
-                procesar_tabla_postgresql(config_tabla)
-            bd_indexacion_completada = True
-            logger.info("Indexación de tablas PostgreSQL completada")
+        if completo:
+            reconstruir_indice(**parametros)
         else:
-            logger.info("No hay tablas PostgreSQL configuradas para indexar")
+            # Los documentos persistidos en disco ya están disponibles para buscar
+            documentos_indexados.update(indexador.nombres_documentos())
+            logger.info(f"Índice cargado con {len(documentos_indexados)} documentos, buscando cambios...")
+            sincronizar_indice(indexador, documentos_indexados)
         
         logger.info("Indexación de documentos completada")
+        
+        if cache_embeddings is not None and cache_embeddings.aciertos + cache_embeddings.fallos:
+            logger.info(f"Caché de embeddings en esta indexación: {cache_embeddings.aciertos} aciertos, "
+                        f"{cache_embeddings.fallos} fallos (tasa de aciertos {cache_embeddings.tasa_aciertos():.1%})")
     except Exception as e:
         logger.error(f"Error en la indexación de documentos: {e}")
     finally:
         indexacion_en_progreso = False
+        reconstruccion_en_progreso = False
 
-# Iniciar la indexación de documentos por defecto en un hilo separado
+# Sincronizar el índice con los documentos por defecto en un hilo separado
 thread_indexacion = threading.Thread(target=indexar_documentos_default)
 thread_indexacion.daemon = True
 thread_indexacion.start()
@@ -201,8 +442,8 @@ def buscar():
         flash('Por favor ingresa una consulta válida', 'warning')
         return redirect(url_for('index'))
     
-    # Verificar si la indexación está en progreso
-    if indexacion_en_progreso:
+    # Verificar si la indexación está en progreso; una reconstrucción no toca el índice activo
+    if indexacion_en_progreso and not reconstruccion_en_progreso:
         flash('La indexación de documentos está en progreso. Los resultados pueden estar incompletos.', 'info')
     
     # Realizar la búsqueda
@@ -217,13 +458,38 @@ def buscar():
         flash(f'Error al procesar la búsqueda: {str(e)}', 'danger')
         return redirect(url_for('index'))
 
+@app.route('/buscar_lote', methods=['POST'])
+def buscar_lote():
+    """
+    Endpoint JSON que busca varias consultas a la vez
+    
+    Recibe {"consultas": [...], "top_k": 5} y devuelve {"resultados": [...]} con la lista
+    de fragmentos encontrados para cada consulta, en el mismo orden.
+    """
+    datos = request.get_json(silent=True) or {}
+    consultas = datos.get('consultas')
+    top_k = datos.get('top_k', 5)
+    
+    if not isinstance(consultas, list) or not all(isinstance(consulta, str) for consulta in consultas):
+        return jsonify({'error': 'Se espera "consultas": una lista de textos'}), 400
+    if isinstance(top_k, bool) or not isinstance(top_k, int) or top_k <= 0:
+        return jsonify({'error': '"top_k" debe ser un entero positivo'}), 400
+    if len(consultas) > config.BATCH_SEARCH_MAX_QUERIES:
+        return jsonify({'error': f'Como máximo {config.BATCH_SEARCH_MAX_QUERIES} consultas por petición'}), 413
+    
+    try:
+        return jsonify({'resultados': buscador.buscar_lote(consultas, top_k=top_k)})
+    except Exception as e:
+        logger.error(f"Error al procesar la búsqueda por lotes: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/subir', methods=['POST'])
 def subir_archivo():
     """Endpoint para subir archivos"""
     if 'archivo' not in request.files:
         flash('No se ha seleccionado ningún archivo', 'warning')
         return redirect(url_for('index'))
-        
+    
     archivo = request.files['archivo']
     
     if archivo.filename == '':
@@ -245,7 +511,7 @@ def subir_archivo():
     else:
         extensiones = ', '.join(config.ALLOWED_EXTENSIONS)
         flash(f'Formato de archivo no permitido. Formatos soportados: {extensiones}', 'danger')
-        
+    
     return redirect(url_for('index'))
 
 @app.route('/estado')
@@ -255,9 +521,31 @@ def estado_indexacion():
         'indexacion_en_progreso': indexacion_en_progreso,
         'documentos_indexados': list(documentos_indexados),
         'num_documentos': len(documentos_indexados),
-        'bd_indexacion_completada': bd_indexacion_completada
+        'bd_indexacion_completada': bd_indexacion_completada,
+        'modelo_cargado': registro_modelos.esta_cargado(indexador.tipo_codificador, indexador.ruta_modelo,
+                                                        indexador.ruta_modelo_onnx),
+        'pipeline': pipeline_indexacion.estadisticas() if pipeline_indexacion is not None else None,
+        'cache_consultas': cache_consultas.estadisticas(),
+        'cache_resultados': cache_resultados.estadisticas() if cache_resultados is not None else None,
+        'segmentos': indexador.segmentos.estadisticas(),
+        'proporcion_eliminada': round(indexador.proporcion_eliminada(), 4)
     })
 
+@app.route('/compactar', methods=['POST'])
+def compactar_indice():
+    """Endpoint de administración que compacta el índice activo y devuelve el espacio recuperado"""
+    if indexacion_en_progreso:
+        return jsonify({'error': 'La indexación está en progreso, espera a que termine'}), 409
+    
+    try:
+        # Las búsquedas continúan; sólo se esperan los cambios del índice y el cambio de generación
+        with bloqueo_indice:
+            informe = indexador.compactar()
+        return jsonify(informe)
+    except Exception as e:
+        logger.error(f"Error al compactar el índice: {e}")
+        return jsonify({'error': str(e)}), 500
+
 @app.route('/documentos')
 def listar_documentos():
     """Endpoint para listar los documentos indexados"""
@@ -322,16 +610,23 @@ def eliminar_documento(nombre):
     global documentos_indexados
     
     try:
-        # Eliminar el documento del índice
-        if indexador.eliminar_documento(nombre):
-            documentos_indexados.discard(nombre)
+        # Eliminar el documento del índice activo
+        with bloqueo_indice:
+            eliminado = indexador.eliminar_documento(nombre)
+            if eliminado:
+                documentos_indexados.discard(nombre)
+                # Olvidar el archivo para que vuelva a indexarse en una reindexación
+                indexador.manifiesto.eliminar_documento(nombre)
+                indexador.manifiesto.guardar()
+        
+        if eliminado:
             flash(f'Documento {nombre} eliminado correctamente del índice', 'success')
         else:
             flash(f'No se encontró el documento {nombre} en el índice', 'warning')
     except Exception as e:
         logger.error(f"Error al eliminar el documento {nombre}: {e}")
         flash(f'Error al eliminar el documento: {str(e)}', 'danger')
-        
+    
     return redirect(url_for('documentos'))
 
 @app.route('/reiniciar_indexacion', methods=['POST'])
@@ -343,8 +638,8 @@ def reiniciar_indexacion():
         flash('La indexación ya está en progreso, espera a que termine', 'warning')
         return redirect(url_for('index'))
     
-    # Iniciar la indexación en un hilo separado
-    thread_indexacion = threading.Thread(target=indexar_documentos_default)
+    # Iniciar la indexación completa en un hilo separado
+    thread_indexacion = threading.Thread(target=indexar_documentos_default, kwargs={'completo': True})
     thread_indexacion.daemon = True
     thread_indexacion.start()
     
@@ -353,8 +648,8 @@ def reiniciar_indexacion():
 
 @app.route('/ajustar_tamano_fragmentos', methods=['POST'])
 def ajustar_tamano_fragmentos():
-    """Endpoint para ajustar el tamaño de los fragmentos y reiniciar la indexación"""
-    global indexacion_en_progreso, indexador
+    """Endpoint para fragmentar por caracteres con el tamaño indicado y reiniciar la indexación"""
+    global indexacion_en_progreso
     
     if indexacion_en_progreso:
         flash('No se pueden cambiar los parámetros mientras hay una indexación en progreso', 'warning')
@@ -374,18 +669,18 @@ def ajustar_tamano_fragmentos():
             flash('El solapamiento debe estar entre 10 y la mitad del tamaño del fragmento', 'danger')
             return redirect(url_for('index'))
         
-        # Actualizar parámetros del indexador
-        indexador = Indexador(directorio_datos=config.DATA_FOLDER,
-                            tamano_fragmento=tamano_fragmento, 
-                            solapamiento=solapamiento)
-        
-        # Iniciar indexación en un hilo separado
+        # Reconstruir el índice con los nuevos parámetros en un hilo separado: el índice
+        # activo sigue sirviendo búsquedas y el modelo ya cargado se reutiliza. El modo por
+        # tokens no usa tamaños en caracteres, así que fijarlos pasa al modo por caracteres
         indexacion_en_progreso = True
-        thread = threading.Thread(target=indexar_documentos_default)
+        thread = threading.Thread(target=indexar_documentos_default,
+                                  kwargs={'completo': True, 'tamano_fragmento': tamano_fragmento,
+                                          'solapamiento': solapamiento, 'modo_fragmentacion': 'caracteres'})
         thread.daemon = True
         thread.start()
         
-        flash(f'Parámetros actualizados: Tamaño de fragmento={tamano_fragmento}, Solapamiento={solapamiento}. Reindexando...', 'success')
+        cambio_modo = ' Fragmentación por caracteres activada.' if indexador.modo_fragmentacion != 'caracteres' else ''
+        flash(f'Parámetros actualizados: Tamaño de fragmento={tamano_fragmento}, Solapamiento={solapamiento}.{cambio_modo} Reindexando...', 'success')
     except Exception as e:
         flash(f'Error al ajustar parámetros: {str(e)}', 'danger')
     
@@ -462,7 +757,7 @@ def configurar_bd():
                 thread.daemon = True
                 thread.start()
                 flash('Iniciando indexación de tablas PostgreSQL...', 'info')
-                
+            
             except Exception as e:
                 logger.error(f"Error al obtener tablas de la base de datos: {e}")
                 flash(f'Error al obtener tablas de la base de datos: {str(e)}', 'danger')
@@ -0,0 +1,78 @@
+"""
+Benchmark de la búsqueda flexible frente a la búsqueda con palabras clave exactas.
+
+Construye un índice sintético de `--documentos` documentos (embeddings aleatorios y el
+vocabulario de sintetico.py, sin cargar el modelo) y mide la latencia de
+`Buscador.buscar` con dos tipos de consulta:
+
+  - exactas: palabras del vocabulario, de modo que hay fragmentos con coincidencias
+    exactas y la búsqueda termina en la etapa principal
+  - flexibles: variantes de esas palabras que no aparecen en ningún fragmento, de modo
+    que la búsqueda recurre a `_busqueda_flexible` (coincidencias parciales o similitud
+    semántica pura)
+
+La búsqueda flexible reutiliza las similitudes de la etapa principal, así que su
+latencia no debe superar a la de las consultas exactas. Se muestran la mediana y el
+percentil 95 en ms.
+
+Uso:
+    python benchmarks/benchmark_busqueda_flexible.py [--documentos 20000] [--consultas 200]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda import Buscador
+from sintetico import PALABRAS, CodificadorSintetico, indice_sintetico
+
+
+def medir(buscador, consultas, top_k):
+    """Devuelve las latencias en ms"""
+    latencias = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        buscador.buscar(consulta, top_k=top_k)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    return np.array(latencias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documentos', type=int, default=20000)
+    parser.add_argument('--fragmentos', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--top-k', type=int, default=5)
+    args = parser.parse_args()
+    
+    logging.disable(logging.WARNING)
+    generador = np.random.default_rng(0)
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = indice_sintetico(directorio, CodificadorSintetico(args.dimension), generador,
+                                     args.documentos, args.fragmentos)
+        buscador = Buscador(indexador, modelo=CodificadorSintetico(args.dimension, semilla=1),
+                            capacidad_cache_consultas=0, max_bytes_cache_resultados=0)
+        
+        palabras = [generador.choice(PALABRAS, 2) for _ in range(args.consultas)]
+        exactas = [" ".join(par) for par in palabras]
+        # "termino123" -> "ermino123": no es un token del índice, pero sí una coincidencia parcial
+        flexibles = [" ".join(palabra[1:] for palabra in par) for par in palabras]
+        
+        print(f"{'consultas':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        for nombre, consultas in [("exactas", exactas), ("flexibles", flexibles)]:
+            latencias = medir(buscador, consultas, args.top_k)
+            print(f"{nombre:>10} {np.percentile(latencias, 50):>8.2f} {np.percentile(latencias, 95):>8.2f}")
+        indexador.cerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,90 @@
+"""
+Benchmark de la búsqueda por lotes frente a consultas sucesivas.
+
+Construye un índice sintético de `--documentos` documentos (embeddings aleatorios y el
+vocabulario de sintetico.py, sin cargar el modelo) y busca `--consultas`
+consultas de dos formas:
+
+  - sucesivas: una llamada a `Buscador.buscar` por consulta
+  - lote: una llamada a `Buscador.buscar_lote` con todas las consultas
+
+Muestra el tiempo total y las consultas por segundo de cada forma, primero sólo de la
+etapa semántica (`Indexador.puntuar` por consulta frente a `Indexador.puntuar_lote`) y
+después de la búsqueda completa, que añade el filtrado por palabras clave de cada
+consulta, y comprueba que ambas formas devuelven los mismos fragmentos. El codificador
+sintético genera el embedding de cada texto a partir de su hash, sin coste de modelo; con
+el modelo real, buscar_lote además codifica todas las consultas en una sola llamada.
+
+Uso:
+    python benchmarks/benchmark_busqueda_lote.py [--documentos 20000] [--consultas 1000] [--top-k 5]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda import Buscador
+from sintetico import PALABRAS, CodificadorSintetico, indice_sintetico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documentos', type=int, default=20000)
+    parser.add_argument('--fragmentos', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--consultas', type=int, default=1000)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--tipo-puntuacion', default='float32', choices=['float32', 'float16', 'int8'])
+    args = parser.parse_args()
+    
+    logging.disable(logging.WARNING)
+    generador = np.random.default_rng(0)
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = indice_sintetico(directorio, CodificadorSintetico(args.dimension), generador,
+                                     args.documentos, args.fragmentos, tipo_puntuacion=args.tipo_puntuacion)
+        # Embedding fijo por consulta, para comparar las dos formas de buscar; sin caché de
+        # consultas ni de resultados: cada forma calcula todos los embeddings
+        buscador = Buscador(indexador, modelo=CodificadorSintetico(args.dimension, modo='texto'),
+                            capacidad_cache_consultas=0, max_bytes_cache_resultados=0)
+        
+        consultas = [" ".join(generador.choice(PALABRAS, 4)) for _ in range(args.consultas)]
+        embeddings = buscador.codificar_consultas(consultas)
+        
+        inicio = time.perf_counter()
+        for embedding in embeddings:
+            indexador.puntuar(embedding)
+        puntuar_sucesivas = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        indexador.puntuar_lote(embeddings)
+        puntuar_lote = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        sucesivas = [buscador.buscar(consulta, top_k=args.top_k) for consulta in consultas]
+        segundos_sucesivas = time.perf_counter() - inicio
+        
+        inicio = time.perf_counter()
+        lote = buscador.buscar_lote(consultas, top_k=args.top_k)
+        segundos_lote = time.perf_counter() - inicio
+        
+        iguales = sum([r["id"] for r in a] == [r["id"] for r in b] for a, b in zip(sucesivas, lote))
+        print(f"{'etapa':>10} {'forma':>10} {'segundos':>9} {'consultas/s':>12}")
+        for etapa, forma, segundos in [("semántica", "sucesivas", puntuar_sucesivas),
+                                       ("semántica", "lote", puntuar_lote),
+                                       ("completa", "sucesivas", segundos_sucesivas),
+                                       ("completa", "lote", segundos_lote)]:
+            print(f"{etapa:>10} {forma:>10} {segundos:>9.2f} {len(consultas) / segundos:>12.1f}")
+        print(f"Mismos resultados en {iguales} de {len(consultas)} consultas")
+        indexador.cerrar()
+
+
+if __name__ == '__main__':
+    main()
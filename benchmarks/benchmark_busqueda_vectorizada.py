@@ -0,0 +1,100 @@
+"""
+Benchmark de la etapa semántica de Buscador: bucle por fragmento frente a producto matricial.
+
+Compara, para índices sintéticos de distinto tamaño, el recorrido original de
+`indexador.embeddings.items()` con `_calcular_similitud` contra la puntuación con la
+matriz normalizada del indexador y la selección top-k con argpartition, y verifica
+que ambos caminos devuelven el mismo ranking.
+
+Uso:
+    python benchmarks/benchmark_busqueda_vectorizada.py [--tamanos 10000 100000 1000000]
+"""
+
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda.buscador import Buscador
+
+
+class IndexadorSintetico:
+    """Indexador mínimo con embeddings aleatorios para medir sólo la etapa de puntuación"""
+    
+    def __init__(self, num_fragmentos, dimension, semilla=0):
+        generador = np.random.default_rng(semilla)
+        matriz = generador.standard_normal((num_fragmentos, dimension), dtype=np.float32)
+        matriz /= np.linalg.norm(matriz, axis=1, keepdims=True)
+        
+        self.modelo = None
+        self._ids = [f"documento_{i // 100}.pdf_{i % 100}" for i in range(num_fragmentos)]
+        self._matriz = matriz
+        # Las filas son vistas de la matriz para no duplicar memoria en el camino antiguo
+        self.embeddings = dict(zip(self._ids, matriz))
+    
+    def obtener_matriz(self):
+        return self._ids, self._matriz
+    
+    def puntuar(self, embedding_consulta):
+        consulta = np.asarray(embedding_consulta, dtype=np.float32)
+        return self._ids, self._matriz @ (consulta / np.linalg.norm(consulta))
+
+
+def ranking_bucle(buscador, indexador, consulta, top_k):
+    """Camino original: una llamada a _calcular_similitud por fragmento y ordenación completa"""
+    resultados = []
+    for fragmento_id, embedding_fragmento in indexador.embeddings.items():
+        similitud = buscador._calcular_similitud(consulta, embedding_fragmento)
+        resultados.append((fragmento_id, similitud))
+    resultados.sort(key=lambda x: x[1], reverse=True)
+    return [fragmento_id for fragmento_id, _ in resultados[:top_k]]
+
+
+def ranking_matricial(buscador, consulta, top_k):
+    """Camino vectorizado: un producto matriz-vector y selección con argpartition"""
+    ids, similitudes = buscador._puntuar_fragmentos(consulta)
+    return [ids[i] for i in buscador._seleccionar_top_k(similitudes, top_k)]
+
+
+def medir(funcion, repeticiones):
+    """Devuelve el resultado de la función y su tiempo medio en milisegundos"""
+    inicio = time.perf_counter()
+    for _ in range(repeticiones):
+        resultado = funcion()
+    return resultado, (time.perf_counter() - inicio) * 1000 / repeticiones
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--tamanos', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--top-k', type=int, default=5)
+    parser.add_argument('--consultas', type=int, default=5)
+    args = parser.parse_args()
+    
+    print(f"{'fragmentos':>12} {'bucle (ms)':>12} {'matriz (ms)':>12} {'aceleración':>12} {'ranking':>9}")
+    
+    for tamano in args.tamanos:
+        indexador = IndexadorSintetico(tamano, args.dimension)
+        buscador = Buscador(indexador)
+        consultas = np.random.default_rng(1).standard_normal((args.consultas, args.dimension), dtype=np.float32)
+        
+        tiempo_bucle = tiempo_matriz = 0.0
+        iguales = True
+        for consulta in consultas:
+            esperado, t_bucle = medir(lambda: ranking_bucle(buscador, indexador, consulta, args.top_k), 1)
+            obtenido, t_matriz = medir(lambda: ranking_matricial(buscador, consulta, args.top_k), 3)
+            tiempo_bucle += t_bucle / len(consultas)
+            tiempo_matriz += t_matriz / len(consultas)
+            iguales = iguales and esperado == obtenido
+        
+        print(f"{tamano:>12} {tiempo_bucle:>12.2f} {tiempo_matriz:>12.2f} "
+              f"{tiempo_bucle / max(tiempo_matriz, 1e-9):>11.1f}x {'igual' if iguales else 'DISTINTO':>9}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,73 @@
+"""
+Benchmark de eliminación de documentos en un índice grande.
+
+Construye un índice sintético con `--documentos` documentos de `--fragmentos` fragmentos
+cada uno (con embeddings aleatorios, sin cargar el coste del modelo en la indexación) y
+mide el tiempo de eliminar `--eliminar` documentos con `eliminar_documento`.
+
+También compara la búsqueda de los fragmentos de un documento:
+
+  - escaneo: recorrer la columna de documento de toda la tabla de fragmentos
+  - mapa: consultar el mapa documento -> fragmentos que mantiene el indexador
+
+Uso:
+    python benchmarks/benchmark_eliminacion.py [--documentos 20000] [--fragmentos 10] [--eliminar 1000]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from sintetico import CodificadorSintetico, indice_sintetico
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documentos', type=int, default=20000)
+    parser.add_argument('--fragmentos', type=int, default=10)
+    parser.add_argument('--eliminar', type=int, default=1000)
+    parser.add_argument('--dimension', type=int, default=384)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = indice_sintetico(directorio, CodificadorSintetico(args.dimension), np.random.default_rng(0),
+                                     args.documentos, args.fragmentos)
+
+        nombres = [f"documento_{i}.txt" for i in
+                   np.random.default_rng(1).choice(args.documentos, args.eliminar, replace=False)]
+        doc_ids = [indexador._documentos_por_nombre[nombre] for nombre in nombres]
+
+        inicio = time.perf_counter()
+        for doc_id in doc_ids:
+            np.flatnonzero((indexador.tabla.documento == doc_id) & indexador.tabla.vivo)
+        escaneo = time.perf_counter() - inicio
+
+        inicio = time.perf_counter()
+        for nombre in nombres:
+            indexador.fragmentos_de_documento(nombre)
+        mapa = time.perf_counter() - inicio
+
+        print(f"Búsqueda de fragmentos de {args.eliminar} documentos: "
+              f"escaneo {escaneo * 1000:.1f} ms, mapa {mapa * 1000:.1f} ms ({escaneo / mapa:.0f}x)")
+
+        inicio = time.perf_counter()
+        for nombre in nombres:
+            indexador.eliminar_documento(nombre)
+        duracion = time.perf_counter() - inicio
+
+        print(f"Eliminación de {args.eliminar} documentos: {duracion:.2f} s "
+              f"({duracion / args.eliminar * 1000:.2f} ms por documento, incluida la bitácora)")
+        print(f"Quedan {len(indexador.documentos)} documentos, {len(indexador.tabla)} fragmentos")
+
+
+if __name__ == '__main__':
+    main()
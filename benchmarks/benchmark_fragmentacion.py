@@ -0,0 +1,90 @@
+"""
+Comparación de la fragmentación por caracteres y por presupuesto de tokens.
+
+Extrae los documentos de `--carpeta` con los procesadores del proyecto y los fragmenta
+con cada modo de `Indexador`:
+
+  - caracteres: `--tamano-fragmento` y `--solapamiento` de config.py
+  - tokens: fragmentos llenados hasta `max_seq_length` del modelo con `--solapamiento-tokens`
+
+Para cada modo muestra cuántos fragmentos se generan, cuántos tokens tienen en total y
+cuántos de ellos quedan fuera de la entrada del modelo (texto que nunca se codifica).
+Con `--codificar` también mide el tiempo de generar los embeddings.
+
+Uso:
+    python benchmarks/benchmark_fragmentacion.py [--carpeta uploads] [--codificar]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from procesadores import obtener_procesador
+from modelo_busqueda import Indexador
+
+
+def extraer_documentos(carpeta):
+    """Devuelve (texto, metadatos) de cada documento de la carpeta con procesador disponible"""
+    documentos = []
+    for nombre_archivo in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre_archivo)
+        procesador = obtener_procesador(os.path.splitext(nombre_archivo)[1].lower())
+        if not os.path.isfile(ruta) or procesador is None:
+            continue
+        documentos.append((procesador.extraer_texto(ruta), procesador.obtener_metadatos(ruta)))
+    return documentos
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carpeta', default=config.UPLOAD_FOLDER)
+    parser.add_argument('--tamano-fragmento', type=int, default=config.DEFAULT_FRAGMENT_SIZE)
+    parser.add_argument('--solapamiento', type=int, default=config.DEFAULT_OVERLAP)
+    parser.add_argument('--solapamiento-tokens', type=int, default=config.CHUNK_OVERLAP_TOKENS)
+    parser.add_argument('--codificar', action='store_true', help="Medir también el tiempo de codificación")
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    documentos = extraer_documentos(args.carpeta)
+    if not documentos:
+        print(f"No hay documentos en {args.carpeta}")
+        return
+
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = Indexador(directorio_datos=directorio,
+                              tamano_fragmento=args.tamano_fragmento,
+                              solapamiento=args.solapamiento,
+                              solapamiento_tokens=args.solapamiento_tokens,
+                              max_entradas_cache_embeddings=0)
+        print(f"{len(documentos)} documentos; entrada del modelo: {indexador.presupuesto_tokens} tokens")
+        print(f"{'modo':>12} {'fragmentos':>11} {'truncados':>10} {'tokens':>10} "
+              f"{'fuera':>10} {'% fuera':>8} {'codificación':>13}")
+
+        for modo in ('caracteres', 'tokens'):
+            indexador.modo_fragmentacion = modo
+            for clave in indexador.estadisticas_fragmentacion:
+                indexador.estadisticas_fragmentacion[clave] = 0
+
+            textos = [fragmento for texto, metadatos in documentos
+                      for fragmento, _ in indexador._fragmentar_texto(texto, metadatos)]
+            estadisticas = indexador.estadisticas_fragmentacion
+
+            codificacion = ""
+            if args.codificar:
+                inicio = time.perf_counter()
+                indexador.modelo.encode(textos, batch_size=config.EMBEDDING_BATCH_SIZE, show_progress_bar=False)
+                codificacion = f"{time.perf_counter() - inicio:.2f} s"
+
+            print(f"{modo:>12} {estadisticas['fragmentos']:>11} {estadisticas['fragmentos_truncados']:>10} "
+                  f"{estadisticas['tokens']:>10} {estadisticas['tokens_truncados']:>10} "
+                  f"{estadisticas['tokens_truncados'] / max(estadisticas['tokens'], 1):>8.1%} {codificacion:>13}")
+
+
+if __name__ == '__main__':
+    main()
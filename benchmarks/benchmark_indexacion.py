@@ -0,0 +1,84 @@
+"""
+Benchmark de codificación de fragmentos: uno por uno frente a lotes compartidos.
+
+Extrae los documentos de ejemplo de `uploads/` con los procesadores del proyecto,
+los fragmenta con los parámetros de `config.py` y mide los fragmentos por segundo de:
+
+  - por_fragmento: una llamada a `modelo.encode` por fragmento (comportamiento anterior)
+  - por_documento: todos los fragmentos de cada documento en lotes de `--tamano-lote`
+  - masivo: los fragmentos de todos los documentos en lotes compartidos
+
+Uso:
+    python benchmarks/benchmark_indexacion.py [--carpeta uploads] [--tamano-lote 32]
+"""
+
+import os
+import sys
+import time
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from procesadores import obtener_procesador
+from modelo_busqueda import Indexador
+
+
+def cargar_fragmentos(indexador, carpeta):
+    """Devuelve una lista con los textos de los fragmentos de cada documento de la carpeta"""
+    fragmentos_por_documento = []
+    for nombre_archivo in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre_archivo)
+        procesador = obtener_procesador(os.path.splitext(nombre_archivo)[1])
+        if not os.path.isfile(ruta) or procesador is None:
+            continue
+        texto = procesador.extraer_texto(ruta)
+        metadatos = procesador.obtener_metadatos(ruta)
+        fragmentos = [fragmento for fragmento, _ in indexador._fragmentar_texto(texto, metadatos)]
+        print(f"  {nombre_archivo}: {len(fragmentos)} fragmentos")
+        fragmentos_por_documento.append(fragmentos)
+    return fragmentos_por_documento
+
+
+def medir(nombre, funcion, num_fragmentos):
+    """Ejecuta la función e imprime los fragmentos por segundo obtenidos"""
+    inicio = time.perf_counter()
+    funcion()
+    duracion = time.perf_counter() - inicio
+    print(f"{nombre:>15}: {num_fragmentos / duracion:8.1f} fragmentos/s ({duracion:.2f} s)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carpeta', default=config.UPLOAD_FOLDER)
+    parser.add_argument('--tamano-lote', type=int, default=config.EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = Indexador(directorio_datos=directorio,
+                              tamano_fragmento=config.DEFAULT_FRAGMENT_SIZE,
+                              solapamiento=config.DEFAULT_OVERLAP,
+                              tamano_lote=args.tamano_lote)
+        modelo = indexador.modelo
+        
+        print(f"Documentos en {args.carpeta}:")
+        documentos = cargar_fragmentos(indexador, args.carpeta)
+        todos = [fragmento for fragmentos in documentos for fragmento in fragmentos]
+        if not todos:
+            print("No hay fragmentos que codificar")
+            return
+        
+        # Calentar el modelo para no medir la inicialización
+        modelo.encode(todos[:2], batch_size=args.tamano_lote, show_progress_bar=False)
+        
+        medir("por_fragmento", lambda: [modelo.encode(f) for f in todos], len(todos))
+        medir("por_documento", lambda: [modelo.encode(fragmentos, batch_size=args.tamano_lote,
+                                                      show_progress_bar=False)
+                                         for fragmentos in documentos if fragmentos], len(todos))
+        medir("masivo", lambda: modelo.encode(todos, batch_size=args.tamano_lote,
+                                              show_progress_bar=False), len(todos))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""
+Escalado de la codificación de fragmentos con varios procesos.
+
+Fragmenta los documentos de `--carpeta` (repitiéndolos hasta reunir `--fragmentos`
+fragmentos) y mide los fragmentos por segundo de `Indexador._codificar_modelo` con
+1, 2, 4, ... procesos hasta `--max-procesos` (por defecto, el número de núcleos).
+Para cada número de procesos muestra la aceleración respecto a un proceso y la
+eficiencia (aceleración / procesos); un escalado lineal da una eficiencia cercana a 1.
+
+El arranque de los procesos (carga del modelo en cada uno) no se incluye en la medida.
+
+Uso:
+    python benchmarks/benchmark_procesos.py [--carpeta uploads] [--fragmentos 20000] [--max-procesos 32]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from procesadores import obtener_procesador
+from modelo_busqueda import Indexador
+
+
+def cargar_textos(indexador, carpeta, num_fragmentos):
+    """Devuelve num_fragmentos textos de fragmento a partir de los documentos de la carpeta"""
+    textos = []
+    for nombre_archivo in sorted(os.listdir(carpeta)):
+        ruta = os.path.join(carpeta, nombre_archivo)
+        procesador = obtener_procesador(os.path.splitext(nombre_archivo)[1].lower())
+        if not os.path.isfile(ruta) or procesador is None:
+            continue
+        texto = procesador.extraer_texto(ruta)
+        metadatos = procesador.obtener_metadatos(ruta)
+        textos.extend(fragmento for fragmento, _ in indexador._fragmentar_texto(texto, metadatos))
+
+    if not textos:
+        return []
+    return [textos[i % len(textos)] for i in range(num_fragmentos)]
+
+
+def numeros_de_procesos(maximo):
+    """1, 2, 4, ... hasta el máximo (incluido aunque no sea potencia de 2)"""
+    numeros = []
+    procesos = 1
+    while procesos < maximo:
+        numeros.append(procesos)
+        procesos *= 2
+    numeros.append(maximo)
+    return numeros
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carpeta', default=config.UPLOAD_FOLDER)
+    parser.add_argument('--fragmentos', type=int, default=20000)
+    parser.add_argument('--max-procesos', type=int, default=os.cpu_count() or 1)
+    parser.add_argument('--tamano-lote', type=int, default=config.EMBEDDING_BATCH_SIZE)
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = Indexador(directorio_datos=directorio,
+                              tamano_lote=args.tamano_lote,
+                              modo_fragmentacion=config.CHUNKING_MODE,
+                              solapamiento_tokens=config.CHUNK_OVERLAP_TOKENS,
+                              max_entradas_cache_embeddings=0)
+
+        textos = cargar_textos(indexador, args.carpeta, args.fragmentos)
+        if not textos:
+            print(f"No hay fragmentos que codificar en {args.carpeta}")
+            return
+
+        print(f"{len(textos)} fragmentos, lotes de {args.tamano_lote}")
+        print(f"{'procesos':>9} {'fragmentos/s':>13} {'aceleración':>12} {'eficiencia':>11}")
+
+        referencia = None
+        for procesos in numeros_de_procesos(args.max_procesos):
+            indexador.cerrar()
+            indexador.procesos_codificacion = procesos
+
+            # Calentar: arranca el pool (si hace falta) y carga el modelo en cada proceso
+            indexador._codificar_modelo(textos[:procesos * args.tamano_lote])
+
+            inicio = time.perf_counter()
+            indexador._codificar_modelo(textos)
+            velocidad = len(textos) / (time.perf_counter() - inicio)
+
+            referencia = referencia or velocidad
+            aceleracion = velocidad / referencia
+            print(f"{procesos:>9} {velocidad:>13.1f} {aceleracion:>11.2f}x {aceleracion / procesos:>11.2f}")
+
+        indexador.cerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+"""
+Benchmark de búsquedas concurrentes con la indexación en el índice de segmentos.
+
+Construye un índice sintético de `--documentos` documentos (embeddings aleatorios y un
+vocabulario pequeño, sin cargar el modelo) y mide la latencia de `Buscador.buscar`:
+
+  - reposo: sin ninguna escritura en curso
+  - concurrente: mientras `--escritores` hilos indexan documentos nuevos en lotes de
+    `--lote` y eliminan otros tantos, de modo que el hilo de fusión trabaja a la vez.
+    Cada escritor espera `--pausa` segundos entre lotes, en lugar del tiempo que tardaría
+    el modelo en codificarlos; con `--pausa 0` los escritores compiten por la CPU con las
+    búsquedas y la latencia refleja también ese reparto, no sólo los bloqueos.
+
+En ambos casos se muestran la mediana y los percentiles 95 y 99 en ms; con el índice de
+segmentos las búsquedas no esperan a los escritores y la latencia debe mantenerse plana.
+
+Uso:
+    python benchmarks/benchmark_segmentos.py [--documentos 5000] [--segundos 10] [--escritores 2]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import threading
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda import Buscador
+from sintetico import PALABRAS, CodificadorSintetico, agregar, documentos_sinteticos, indice_sintetico
+
+
+def medir_busquedas(buscador, consultas, segundos):
+    """Lanza consultas durante los segundos indicados y devuelve sus latencias en ms"""
+    latencias = []
+    fin = time.perf_counter() + segundos
+    i = 0
+    while time.perf_counter() < fin:
+        inicio = time.perf_counter()
+        buscador.buscar(consultas[i % len(consultas)], top_k=5)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        i += 1
+    return np.array(latencias)
+
+
+def mostrar(nombre, latencias):
+    print(f"{nombre:>12} {len(latencias):>9} {np.percentile(latencias, 50):>8.2f} "
+          f"{np.percentile(latencias, 95):>8.2f} {np.percentile(latencias, 99):>8.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--documentos', type=int, default=5000)
+    parser.add_argument('--fragmentos', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--segundos', type=float, default=10)
+    parser.add_argument('--escritores', type=int, default=2)
+    parser.add_argument('--lote', type=int, default=20, help="Documentos por indexación concurrente")
+    parser.add_argument('--pausa', type=float, default=0.2, help="Segundos entre lotes de cada escritor")
+    parser.add_argument('--capacidad', type=int, default=4096, help="Fragmentos del segmento en memoria")
+    parser.add_argument('--factor-fusion', type=int, default=4)
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    generador = np.random.default_rng(0)
+    
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = indice_sintetico(directorio, CodificadorSintetico(args.dimension), generador,
+                                     args.documentos, args.fragmentos,
+                                     capacidad_segmento_memoria=args.capacidad,
+                                     factor_fusion_segmentos=args.factor_fusion)
+        buscador = Buscador(indexador, modelo=CodificadorSintetico(args.dimension, semilla=1))
+        
+        consultas = [" ".join(generador.choice(PALABRAS, 4)) for _ in range(200)]
+        print(f"{'escenario':>12} {'consultas':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8}")
+        mostrar("reposo", medir_busquedas(buscador, consultas, args.segundos))
+        
+        detener = threading.Event()
+        siguiente = [args.documentos]
+        bloqueo = threading.Lock()
+        escritos = [0]
+        
+        def escribir(semilla):
+            generador_hilo = np.random.default_rng(semilla)
+            codificador_hilo = CodificadorSintetico(args.dimension, semilla=semilla)
+            while not detener.is_set():
+                with bloqueo:
+                    desde = siguiente[0]
+                    siguiente[0] += args.lote
+                agregar(indexador, codificador_hilo,
+                        documentos_sinteticos(generador_hilo, desde, args.lote, args.fragmentos))
+                for i in generador_hilo.choice(desde, args.lote, replace=False):
+                    indexador.eliminar_documento(f"documento_{i}.txt")
+                with bloqueo:
+                    escritos[0] += args.lote
+                detener.wait(args.pausa)
+        
+        hilos = [threading.Thread(target=escribir, args=(100 + i,)) for i in range(args.escritores)]
+        fusiones = indexador.segmentos.fusiones
+        for hilo in hilos:
+            hilo.start()
+        mostrar("concurrente", medir_busquedas(buscador, consultas, args.segundos))
+        detener.set()
+        for hilo in hilos:
+            hilo.join()
+        
+        print(f"Durante la medición: {escritos[0]} documentos indexados y otros tantos eliminados, "
+              f"{indexador.segmentos.fusiones - fusiones} fusiones; "
+              f"{len(indexador.instantanea().segmentos)} segmentos al terminar")
+        indexador.cerrar()
+
+
+if __name__ == '__main__':
+    main()
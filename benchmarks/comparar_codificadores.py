@@ -0,0 +1,144 @@
+"""
+Comparación de los motores de inferencia del modelo de embeddings.
+
+Codifica los fragmentos de los documentos de `--carpeta` con cada codificador de
+`modelo_busqueda.codificadores` y, para cada uno, muestra:
+
+  - carga: segundos que tarda en cargarse el modelo
+  - latencia: mediana y percentil 95 de codificar una consulta (un texto), en ms
+  - rendimiento: fragmentos por segundo codificando en lotes de `--tamano-lote`
+  - coseno: similitud media y mínima de sus embeddings con los de sentence-transformers (fp32)
+  - top-k: proporción de los `--top-k` vecinos de cada consulta que coinciden con los de fp32
+
+El motor 'onnx' se carga desde `--ruta-onnx` (por defecto ONNX_MODEL_PATH de config.py);
+con `--exportar` el modelo se exporta antes a ese directorio.
+
+Uso:
+    python benchmarks/comparar_codificadores.py [--carpeta uploads] [--exportar] [--fragmentos 2000]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import config
+from procesadores import obtener_procesador
+from modelo_busqueda import Indexador
+from modelo_busqueda.codificadores import CODIFICADORES, crear_codificador, exportar_onnx
+
+MODELO = "paraphrase-multilingual-MiniLM-L12-v2"
+
+
+def cargar_textos(carpeta, num_fragmentos):
+    """Devuelve hasta num_fragmentos textos de fragmento de los documentos de la carpeta"""
+    textos = []
+    with tempfile.TemporaryDirectory() as directorio:
+        indexador = Indexador(ruta_modelo=MODELO, directorio_datos=directorio,
+                              tamano_fragmento=config.DEFAULT_FRAGMENT_SIZE,
+                              solapamiento=config.DEFAULT_OVERLAP,
+                              modo_fragmentacion=config.CHUNKING_MODE,
+                              solapamiento_tokens=config.CHUNK_OVERLAP_TOKENS,
+                              max_entradas_cache_embeddings=0)
+        for nombre_archivo in sorted(os.listdir(carpeta)):
+            ruta = os.path.join(carpeta, nombre_archivo)
+            procesador = obtener_procesador(os.path.splitext(nombre_archivo)[1].lower())
+            if not os.path.isfile(ruta) or procesador is None:
+                continue
+            texto = procesador.extraer_texto(ruta)
+            metadatos = procesador.obtener_metadatos(ruta)
+            textos.extend(fragmento for fragmento, _ in indexador._fragmentar_texto(texto, metadatos))
+            if len(textos) >= num_fragmentos:
+                break
+    return textos[:num_fragmentos]
+
+
+def normalizar(matriz):
+    return matriz / np.clip(np.linalg.norm(matriz, axis=1, keepdims=True), 1e-12, None)
+
+
+def vecinos(consultas, fragmentos, k):
+    """Índices de los k fragmentos más similares a cada consulta"""
+    puntuaciones = consultas @ fragmentos.T
+    return np.argsort(-puntuaciones, axis=1)[:, :k]
+
+
+def medir(codificador, textos, consultas, tamano_lote):
+    """Latencias de consulta (ms), fragmentos por segundo y embeddings de textos y consultas"""
+    codificador.encode(consultas[0])  # Calentar
+    latencias = []
+    embeddings_consultas = []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        embeddings_consultas.append(codificador.encode(consulta))
+        latencias.append((time.perf_counter() - inicio) * 1000)
+    
+    inicio = time.perf_counter()
+    embeddings = codificador.encode(textos, batch_size=tamano_lote, show_progress_bar=False)
+    velocidad = len(textos) / (time.perf_counter() - inicio)
+    
+    return (np.array(latencias), velocidad, normalizar(np.asarray(embeddings, dtype=np.float32)),
+            normalizar(np.asarray(embeddings_consultas, dtype=np.float32)))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--carpeta', default=config.UPLOAD_FOLDER)
+    parser.add_argument('--fragmentos', type=int, default=2000)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--tamano-lote', type=int, default=config.EMBEDDING_BATCH_SIZE)
+    parser.add_argument('--top-k', type=int, default=10)
+    parser.add_argument('--ruta-onnx', default=config.ONNX_MODEL_PATH)
+    parser.add_argument('--exportar', action='store_true', help="Exportar antes el modelo a ONNX")
+    args = parser.parse_args()
+    
+    logging.disable(logging.INFO)
+    
+    if args.exportar:
+        exportar_onnx(MODELO, args.ruta_onnx)
+    
+    textos = cargar_textos(args.carpeta, args.fragmentos)
+    if not textos:
+        print(f"No hay fragmentos que codificar en {args.carpeta}")
+        return
+    
+    # Consultas cortas: las primeras palabras de fragmentos repartidos por el corpus
+    paso = max(1, len(textos) // args.consultas)
+    consultas = [" ".join(texto.split()[:12]) for texto in textos[::paso][:args.consultas]]
+    
+    print(f"{len(textos)} fragmentos, {len(consultas)} consultas, lotes de {args.tamano_lote}")
+    print(f"{'codificador':>22} {'carga':>7} {'p50 ms':>8} {'p95 ms':>8} {'frag/s':>9} "
+          f"{'coseno':>8} {'mínimo':>8} {f'top-{args.top_k}':>7}")
+    
+    referencia = None
+    for tipo in CODIFICADORES:
+        inicio = time.perf_counter()
+        try:
+            codificador = crear_codificador(tipo, MODELO, args.ruta_onnx)
+        except Exception as e:
+            print(f"{tipo:>22}  no disponible: {e}")
+            continue
+        carga = time.perf_counter() - inicio
+        
+        latencias, velocidad, embeddings, embeddings_consultas = medir(codificador, textos, consultas,
+                                                                       args.tamano_lote)
+        if referencia is None:
+            referencia = (embeddings, vecinos(embeddings_consultas, embeddings, args.top_k))
+        
+        cosenos = np.sum(embeddings * referencia[0], axis=1)
+        propios = vecinos(embeddings_consultas, embeddings, args.top_k)
+        coincidencia = np.mean([len(set(a) & set(b)) / args.top_k for a, b in zip(propios, referencia[1])])
+        
+        print(f"{tipo:>22} {carga:>6.1f}s {np.percentile(latencias, 50):>8.1f} "
+              f"{np.percentile(latencias, 95):>8.1f} {velocidad:>9.1f} {cosenos.mean():>8.4f} "
+              f"{cosenos.min():>8.4f} {coincidencia:>7.1%}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,107 @@
+"""
+Evaluación de la búsqueda aproximada (IVF) frente a la búsqueda exacta.
+
+Mide, para cada valor de `--nprobe`, el recall@k de la etapa semántica (qué fracción de
+los k fragmentos más similares según la búsqueda exacta devuelve también la aproximada),
+la proporción de filas puntuadas y la latencia de `Instantanea.puntuar` (mediana y
+percentil 95 en ms), junto a la de la búsqueda exacta.
+
+Sin `--directorio` se construye un índice sintético de `--fragmentos` embeddings
+agrupados alrededor de `--temas` centros (los embeddings reales de texto también se
+agrupan por tema; con vectores uniformes ningún índice aproximado funciona bien). Con
+`--directorio` se evalúa un índice real (el directorio de una generación) abierto en
+modo de sólo lectura; en ambos casos las consultas son embeddings del índice con ruido.
+
+Uso:
+    python benchmarks/evaluar_ann.py [--fragmentos 200000] [--nprobe 1 4 8 16 32 64] [--k 10]
+    python benchmarks/evaluar_ann.py --directorio indexados_datos/generacion_000001
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda.ivf import IndiceIVF
+from modelo_busqueda.segmentos import IndiceSegmentos, _normalizar
+from sintetico import segmentos_sinteticos
+
+
+def top_k(similitudes, k):
+    candidatos = np.argpartition(-similitudes, k - 1)[:k]
+    return set(candidatos.tolist())
+
+
+def medir(instantanea, consultas, k, nprobe):
+    """Devuelve las latencias en ms, los top-k de cada consulta y la proporción de filas puntuadas"""
+    latencias, resultados, puntuadas = [], [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        _, similitudes = instantanea.puntuar(consulta, nprobe)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        resultados.append(top_k(similitudes, k))
+        puntuadas.append(np.count_nonzero(~np.isneginf(similitudes)) / len(similitudes))
+    return np.array(latencias), resultados, float(np.mean(puntuadas))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directorio', help="Directorio de un índice existente (por defecto, uno sintético)")
+    parser.add_argument('--fragmentos', type=int, default=200000)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--temas', type=int, default=2000, help="Centros de los embeddings sintéticos")
+    parser.add_argument('--dispersion', type=float, default=1.0, help="Ruido alrededor de cada centro")
+    parser.add_argument('--capacidad', type=int, default=4096, help="Fragmentos del segmento en memoria")
+    parser.add_argument('--min-filas-ivf', type=int, default=16384)
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--nprobe', type=int, nargs='+', default=[1, 4, 8, 16, 32, 64])
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as temporal:
+        if args.directorio:
+            indice = IndiceSegmentos(args.directorio)
+            if not indice.cargar():
+                parser.error(f"{args.directorio} no contiene un índice de segmentos")
+            # Los segmentos sin IVF se indexan sólo en memoria, sin modificar el directorio
+            for segmento in indice.instantanea().segmentos:
+                if segmento.ivf is None and len(segmento) >= args.min_filas_ivf:
+                    segmento.ivf = IndiceIVF.entrenar(segmento.matriz)
+        else:
+            indice = segmentos_sinteticos(temporal, args.fragmentos, args.dimension, args.temas, args.dispersion,
+                                          capacidad_memoria=args.capacidad, factor_fusion=4,
+                                          min_filas_ivf=args.min_filas_ivf)
+
+        instantanea = indice.instantanea()
+        segmentos = instantanea.segmentos
+        con_ivf = [segmento for segmento in segmentos if segmento.ivf is not None]
+        print(f"{len(instantanea)} fragmentos en {len(segmentos)} segmentos, {len(con_ivf)} con IVF "
+              f"({sum(len(s) for s in con_ivf)} filas; listas: {[s.ivf.num_listas for s in con_ivf]})")
+
+        generador = np.random.default_rng(1)
+        ids, matriz = instantanea.obtener_matriz()
+        filas = generador.choice(len(ids), min(args.consultas, len(ids)), replace=False)
+        ruido = generador.standard_normal((len(filas), matriz.shape[1])).astype(np.float32)
+        consultas = _normalizar(np.asarray(matriz[filas], dtype=np.float32) + ruido * 0.5 / np.sqrt(matriz.shape[1]))
+
+        latencias, exactos, _ = medir(instantanea, consultas, args.k, 0)
+        print(f"{'nprobe':>8} {'recall@' + str(args.k):>10} {'puntuadas':>10} {'p50 ms':>8} {'p95 ms':>8}")
+        print(f"{'exacta':>8} {1.0:>10.3f} {1.0:>10.1%} {np.percentile(latencias, 50):>8.2f} "
+              f"{np.percentile(latencias, 95):>8.2f}")
+
+        for nprobe in args.nprobe:
+            latencias, aproximados, puntuadas = medir(instantanea, consultas, args.k, nprobe)
+            recall = np.mean([len(a & e) / args.k for a, e in zip(aproximados, exactos)])
+            print(f"{nprobe:>8} {recall:>10.3f} {puntuadas:>10.1%} {np.percentile(latencias, 50):>8.2f} "
+                  f"{np.percentile(latencias, 95):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
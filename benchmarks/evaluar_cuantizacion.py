@@ -0,0 +1,90 @@
+"""
+Evaluación de la puntuación con embeddings compactos (float16 e int8) frente a float32.
+
+Construye un índice sintético de `--fragmentos` embeddings agrupados por tema (como en
+evaluar_ann.py) y lo abre con cada tipo de puntuación. Para cada tipo y cada valor de
+`--reevaluar` (mejores filas por segmento que se recalculan con la matriz completa)
+muestra:
+
+  - memoria: bytes de las matrices sobre las que se puntúa
+  - recall@k: fracción de los k fragmentos más similares según float32 que se recuperan
+  - orden: fracción de consultas cuyo top-k sale en el mismo orden que con float32
+  - error: mayor diferencia absoluta entre la similitud de los top-k y la exacta
+  - latencia de `Instantanea.puntuar` (mediana y percentil 95 en ms)
+
+Uso:
+    python benchmarks/evaluar_cuantizacion.py [--fragmentos 200000] [--reevaluar 0 50 200] [--k 10]
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda.segmentos import IndiceSegmentos, TIPOS_PUNTUACION, _normalizar
+from sintetico import segmentos_sinteticos
+
+
+def ordenados(similitudes, k):
+    candidatos = np.argpartition(-similitudes, k - 1)[:k]
+    return candidatos[np.argsort(-similitudes[candidatos], kind='stable')]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--fragmentos', type=int, default=200000)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--temas', type=int, default=2000)
+    parser.add_argument('--capacidad', type=int, default=4096, help="Fragmentos del segmento en memoria")
+    parser.add_argument('--consultas', type=int, default=200)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--reevaluar', type=int, nargs='+', default=[0, 50, 200])
+    args = parser.parse_args()
+
+    logging.disable(logging.INFO)
+    with tempfile.TemporaryDirectory() as directorio:
+        indice = segmentos_sinteticos(directorio, args.fragmentos, args.dimension, args.temas, 1.0,
+                                      capacidad_memoria=args.capacidad, factor_fusion=4)
+        instantanea = indice.instantanea()
+
+        generador = np.random.default_rng(1)
+        _, matriz = instantanea.obtener_matriz()
+        filas = generador.choice(len(matriz), min(args.consultas, len(matriz)), replace=False)
+        ruido = generador.standard_normal((len(filas), matriz.shape[1])).astype(np.float32)
+        consultas = _normalizar(matriz[filas] + ruido * 2 / np.sqrt(matriz.shape[1]))
+        exactas = [instantanea.puntuar(consulta)[1] for consulta in consultas]
+        referencia = [ordenados(similitudes, args.k) for similitudes in exactas]
+
+        print(f"{'tipo':>8} {'reevaluar':>9} {'memoria MB':>10} {'recall@' + str(args.k):>10} {'orden':>6} "
+              f"{'error':>8} {'p50 ms':>8} {'p95 ms':>8}")
+        for tipo in TIPOS_PUNTUACION:
+            indice = IndiceSegmentos(directorio, tipo_puntuacion=tipo)
+            indice.cargar()
+            instantanea = indice.instantanea()
+            memoria = indice.estadisticas()["bytes_puntuacion"] / 2 ** 20
+
+            for reevaluar in (args.reevaluar if tipo != 'float32' else [0]):
+                latencias, recall, mismo_orden, error = [], [], [], 0.0
+                for consulta, esperados, similitudes_exactas in zip(consultas, referencia, exactas):
+                    inicio = time.perf_counter()
+                    _, similitudes = instantanea.puntuar(consulta, 0, reevaluar)
+                    latencias.append((time.perf_counter() - inicio) * 1000)
+
+                    obtenidos = ordenados(similitudes, args.k)
+                    recall.append(len(set(obtenidos.tolist()) & set(esperados.tolist())) / args.k)
+                    mismo_orden.append(np.array_equal(obtenidos, esperados))
+                    error = max(error, float(np.abs(similitudes[obtenidos] - similitudes_exactas[obtenidos]).max()))
+
+                print(f"{tipo:>8} {reevaluar:>9} {memoria:>10.1f} {np.mean(recall):>10.4f} "
+                      f"{np.mean(mismo_orden):>6.2f} {error:>8.5f} {np.percentile(latencias, 50):>8.2f} "
+                      f"{np.percentile(latencias, 95):>8.2f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,121 @@
+"""
+Evaluación de la búsqueda en dos etapas (preselección semántica) frente a la exhaustiva.
+
+En la búsqueda exhaustiva las palabras clave se comprueban en todo el índice; en la de
+dos etapas sólo en los N fragmentos semánticamente más similares
+(`Buscador(candidatos_semanticos=N)`). Para cada valor de `--candidatos` se muestra:
+
+  - distinto: fracción de consultas cuyo top-k no es idéntico (mismos fragmentos en el
+    mismo orden) al de la búsqueda exhaustiva
+  - solape@k: fracción media de los k fragmentos de la búsqueda exhaustiva que también
+    devuelve la de dos etapas
+  - latencia de `Buscador.buscar` (mediana y percentil 95 en ms)
+
+Sin `--directorio` se construye un índice sintético de `--documentos` documentos en el que
+texto y embedding están relacionados: cada documento trata de un tema (un subconjunto del
+vocabulario) y el embedding de un texto es la media de los vectores de sus palabras, de
+modo que los fragmentos con las palabras de la consulta suelen ser también los más
+similares, como con un modelo real. Las consultas son palabras de un tema, a veces con una
+palabra de otro. Con `--directorio` (el directorio de una generación) y `--preguntas` (un
+archivo de texto con una consulta por línea) se evalúa un índice real con el modelo
+configurado en config.py; no debe ejecutarse con la aplicación en marcha.
+
+Uso:
+    python benchmarks/evaluar_preseleccion.py [--documentos 20000] [--candidatos 20 50 100 200 500 1000]
+    python benchmarks/evaluar_preseleccion.py --directorio indexados_datos/generacion_000001 --preguntas preguntas.txt
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda import Indexador, Buscador
+from sintetico import PALABRAS, CodificadorSintetico, indice_sintetico
+
+
+def consultas_sinteticas(generador, temas, cantidad):
+    """Palabras de un tema, a veces con una palabra de otro"""
+    consultas = []
+    for _ in range(cantidad):
+        tema = temas[generador.integers(len(temas))]
+        palabras = list(generador.choice(tema, int(generador.integers(2, 5)), replace=False))
+        if generador.random() < 0.3:
+            palabras.append(generador.choice(PALABRAS))
+        consultas.append(" ".join(palabras))
+    return consultas
+
+
+def ejecutar(buscador, consultas, k):
+    """Devuelve los IDs del top-k de cada consulta y las latencias en ms"""
+    resultados, latencias = [], []
+    for consulta in consultas:
+        inicio = time.perf_counter()
+        resultado = buscador.buscar(consulta, top_k=k)
+        latencias.append((time.perf_counter() - inicio) * 1000)
+        resultados.append([fragmento["id"] for fragmento in resultado])
+    return resultados, np.array(latencias)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--directorio', help="Directorio de un índice existente (por defecto, uno sintético)")
+    parser.add_argument('--preguntas', help="Archivo con una consulta por línea (obligatorio con --directorio)")
+    parser.add_argument('--documentos', type=int, default=20000)
+    parser.add_argument('--fragmentos', type=int, default=10)
+    parser.add_argument('--dimension', type=int, default=384)
+    parser.add_argument('--temas', type=int, default=100, help="Temas del vocabulario sintético")
+    parser.add_argument('--consultas', type=int, default=300)
+    parser.add_argument('--k', type=int, default=5)
+    parser.add_argument('--candidatos', type=int, nargs='+', default=[20, 50, 100, 200, 500, 1000])
+    args = parser.parse_args()
+    if args.directorio and not args.preguntas:
+        parser.error("--directorio requiere --preguntas")
+    
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as temporal:
+        if args.directorio:
+            import config
+            indexador = Indexador(ruta_modelo=config.EMBEDDING_MODEL, directorio_datos=args.directorio,
+                                  tipo_codificador=config.ENCODER_BACKEND, ruta_modelo_onnx=config.ONNX_MODEL_PATH,
+                                  max_entradas_cache_embeddings=0, factor_fusion_segmentos=0,
+                                  umbral_compactacion=0, tipo_puntuacion=config.EMBEDDING_SCORING_DTYPE)
+            with open(args.preguntas, encoding='utf-8') as archivo:
+                consultas = [linea.strip() for linea in archivo if linea.strip()]
+            print(f"Índice: {len(indexador.documentos)} documentos, {len(indexador.segmentos)} fragmentos; "
+                  f"{len(consultas)} consultas")
+        else:
+            generador = np.random.default_rng(0)
+            temas = np.array_split(generador.permutation(PALABRAS), args.temas)
+            indexador = indice_sintetico(temporal, CodificadorSintetico(args.dimension, modo='palabras'), generador,
+                                         args.documentos, args.fragmentos, temas)
+            consultas = consultas_sinteticas(generador, temas, args.consultas)
+        
+        # Sin caché de resultados, para que cada modo busque todas las consultas; los
+        # embeddings de las consultas se calculan antes y se miden sólo las búsquedas
+        buscador = Buscador(indexador, max_bytes_cache_resultados=0)
+        buscador.codificar_consultas(consultas)
+        exhaustivos, latencias = ejecutar(buscador, consultas, args.k)
+        
+        print(f"{'candidatos':>10} {'distinto':>9} {'solape@' + str(args.k):>9} {'p50 ms':>8} {'p95 ms':>8}")
+        print(f"{'todos':>10} {0.0:>9.1%} {1.0:>9.3f} {np.percentile(latencias, 50):>8.2f} "
+              f"{np.percentile(latencias, 95):>8.2f}")
+        for candidatos in args.candidatos:
+            buscador.candidatos_semanticos = candidatos
+            resultados, latencias = ejecutar(buscador, consultas, args.k)
+            distinto = np.mean([obtenido != esperado for obtenido, esperado in zip(resultados, exhaustivos)])
+            solape = np.mean([len(set(obtenido) & set(esperado)) / len(esperado)
+                              for obtenido, esperado in zip(resultados, exhaustivos) if esperado])
+            print(f"{candidatos:>10} {distinto:>9.1%} {solape:>9.3f} {np.percentile(latencias, 50):>8.2f} "
+                  f"{np.percentile(latencias, 95):>8.2f}")
+        indexador.cerrar()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,173 @@
+"""
+Datos sintéticos comunes a los benchmarks y evaluaciones.
+
+Sustituyen al modelo y a los documentos reales para medir sólo el índice y la búsqueda:
+
+  - CodificadorSintetico: la parte de la API del modelo que usan el indexador y el
+    buscador (encode), con embeddings aleatorios, fijos por texto o por palabras
+  - indice_sintetico: un Indexador con documentos ya fragmentados de un vocabulario fijo
+  - segmentos_sinteticos: un IndiceSegmentos con embeddings agrupados por temas
+"""
+
+import os
+import sys
+import time
+import zlib
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modelo_busqueda import Indexador
+from modelo_busqueda.indexador import tokenizar
+from modelo_busqueda.segmentos import IndiceSegmentos, _normalizar
+
+PALABRAS = [f"termino{i}" for i in range(2000)]
+_VOCABULARIO = np.array(PALABRAS)  # Para no convertir la lista en cada generador.choice
+
+
+class CodificadorSintetico:
+    """
+    Sustituye al modelo con embeddings sintéticos, sin coste de inferencia
+    
+    Modos:
+      - 'aleatorio': un vector aleatorio nuevo en cada llamada, sin relación con el texto
+      - 'texto': un vector aleatorio fijo para cada texto, de modo que dos formas de buscar
+        la misma consulta obtienen el mismo embedding
+      - 'palabras': la media de vectores fijos de las palabras del texto, de modo que los
+        textos que comparten palabras son similares, como con un modelo real
+    """
+    
+    MODOS = ('aleatorio', 'texto', 'palabras')
+    
+    def __init__(self, dimension, modo='aleatorio', semilla=0):
+        if modo not in self.MODOS:
+            raise ValueError(f"Modo de codificador sintético no soportado: {modo}")
+        self.dimension = dimension
+        self.modo = modo
+        self.generador = np.random.default_rng(semilla)
+        self._vectores = {}
+    
+    def _vector_fijo(self, clave):
+        generador = np.random.default_rng(zlib.crc32(clave.encode('utf-8')))
+        return generador.standard_normal(self.dimension).astype(np.float32)
+    
+    def _codificar(self, texto):
+        if self.modo == 'texto':
+            return self._vector_fijo(texto)
+        palabras = tokenizar(texto)
+        if not palabras:
+            return np.zeros(self.dimension, dtype=np.float32)
+        for palabra in palabras:
+            if palabra not in self._vectores:
+                self._vectores[palabra] = self._vector_fijo(palabra)
+        return np.mean([self._vectores[palabra] for palabra in palabras], axis=0)
+    
+    def encode(self, textos, batch_size=32, show_progress_bar=False):
+        if self.modo == 'aleatorio':
+            forma = self.dimension if isinstance(textos, str) else (len(textos), self.dimension)
+            return self.generador.standard_normal(forma).astype(np.float32)
+        if isinstance(textos, str):
+            return self._codificar(textos)
+        return np.array([self._codificar(texto) for texto in textos], dtype=np.float32).reshape(
+            len(textos), self.dimension)
+
+
+def documentos_sinteticos(generador, inicio, cantidad, fragmentos_por_documento, temas=None):
+    """
+    Documentos ya fragmentados con 40 palabras del vocabulario por fragmento
+    
+    Con temas (listas de palabras del vocabulario), cada documento trata de uno elegido al
+    azar y tres cuartas partes de sus palabras son de ese tema.
+    """
+    documentos = []
+    for i in range(inicio, inicio + cantidad):
+        tema = temas[generador.integers(len(temas))] if temas is not None else None
+        fragmentos = []
+        for numero in range(fragmentos_por_documento):
+            if tema is None:
+                palabras = generador.choice(_VOCABULARIO, 40)
+            else:
+                palabras = np.where(generador.random(40) < 0.75, generador.choice(tema, 40),
+                                    generador.choice(_VOCABULARIO, 40))
+            fragmentos.append((" ".join(palabras), {'numero': numero + 1, 'inicio': 0, 'fin': 40, 'posicion': -1}))
+        documentos.append(({'nombre': f"documento_{i}.txt", 'extension': '.txt'}, fragmentos))
+    return documentos
+
+
+def agregar(indexador, codificador, documentos):
+    """Añade documentos ya fragmentados, codificando sus textos con el codificador sintético"""
+    textos = [texto for _, fragmentos in documentos for texto, _ in fragmentos]
+    indexador._agregar_fragmentados(documentos, codificador.encode(textos))
+
+
+def indice_sintetico(directorio, codificador, generador, num_documentos, fragmentos_por_documento,
+                     temas=None, **opciones):
+    """
+    Crea un indexador con documentos sintéticos, fusiona sus segmentos y hace un punto de control
+    
+    Args:
+        directorio (str): Directorio de datos del indexador
+        codificador (CodificadorSintetico): Codificador de los fragmentos, que queda también
+                                           como modelo del indexador
+        generador (np.random.Generator): Generador de los textos
+        num_documentos (int): Documentos del índice, llamados documento_<i>.txt
+        fragmentos_por_documento (int): Fragmentos de cada documento
+        temas (list): Temas de los documentos (ver documentos_sinteticos)
+        **opciones: Parámetros adicionales del Indexador
+    
+    Returns:
+        Indexador: Índice construido
+    """
+    inicio = time.perf_counter()
+    indexador = Indexador(directorio_datos=directorio, max_entradas_cache_embeddings=0,
+                          max_bytes_bitacora=1 << 40, max_segundos_bitacora=1e9, **opciones)
+    indexador.modelo = codificador
+    for desde in range(0, num_documentos, 1000):
+        agregar(indexador, codificador,
+                documentos_sinteticos(generador, desde, min(1000, num_documentos - desde),
+                                      fragmentos_por_documento, temas))
+    while indexador.segmentos.fusionar_pendientes():
+        pass
+    indexador._guardar_datos()
+    print(f"Índice sintético: {len(indexador.documentos)} documentos, {len(indexador.segmentos)} fragmentos, "
+          f"{len(indexador.instantanea().segmentos)} segmentos ({time.perf_counter() - inicio:.1f} s)")
+    return indexador
+
+
+def embeddings_agrupados(generador, centros, cantidad, dispersion):
+    """Embeddings normalizados repartidos entre los centros indicados"""
+    tema = generador.integers(0, len(centros), cantidad)
+    ruido = generador.standard_normal((cantidad, centros.shape[1])).astype(np.float32)
+    return _normalizar(centros[tema] + ruido * dispersion / np.sqrt(centros.shape[1]))
+
+
+def segmentos_sinteticos(directorio, num_fragmentos, dimension, temas, dispersion, **opciones):
+    """
+    Crea un índice de segmentos con embeddings agrupados alrededor de `temas` centros aleatorios
+    
+    Args:
+        directorio (str): Directorio del índice
+        num_fragmentos (int): Embeddings del índice
+        dimension (int): Dimensión de los embeddings
+        temas (int): Número de centros
+        dispersion (float): Ruido alrededor de cada centro
+        **opciones: Parámetros adicionales de IndiceSegmentos
+    
+    Returns:
+        IndiceSegmentos: Índice guardado en el directorio
+    """
+    inicio = time.perf_counter()
+    generador = np.random.default_rng(0)
+    indice = IndiceSegmentos(directorio, **opciones)
+    centros = _normalizar(generador.standard_normal((temas, dimension)))
+    for desde in range(0, num_fragmentos, 10000):
+        cantidad = min(10000, num_fragmentos - desde)
+        indice.agregar(range(desde, desde + cantidad), embeddings_agrupados(generador, centros, cantidad, dispersion),
+                       [()] * cantidad)
+        while indice.fusionar_pendientes():
+            pass
+    indice.guardar()
+    print(f"Índice sintético de {num_fragmentos} fragmentos en {len(indice.instantanea().segmentos)} segmentos "
+          f"({time.perf_counter() - inicio:.1f} s)")
+    return indice
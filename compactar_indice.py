@@ -0,0 +1,53 @@
+"""
+Script para compactar el índice de documentos desde la línea de comandos.
+Reescribe el índice activo sin los fragmentos eliminados y muestra el espacio recuperado.
+No debe ejecutarse mientras la aplicación está en marcha; con la aplicación iniciada,
+usa el endpoint POST /compactar.
+
+Uso:
+    python compactar_indice.py [directorio_datos]
+"""
+
+import sys
+import json
+import logging
+import argparse
+
+import config
+from modelo_busqueda import Indexador
+from modelo_busqueda.generaciones import GeneracionesIndice
+
+def main():
+    parser = argparse.ArgumentParser(description="Compacta el índice de documentos")
+    parser.add_argument('directorio', nargs='?', default=config.DATA_FOLDER,
+                        help=f"Directorio de datos del índice (por defecto {config.DATA_FOLDER})")
+    args = parser.parse_args()
+    
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    
+    generaciones = GeneracionesIndice(args.directorio)
+    indexador = Indexador(ruta_modelo=config.EMBEDDING_MODEL,
+                          directorio_datos=generaciones.directorio_activo(),
+                          max_bytes_bitacora=config.JOURNAL_MAX_BYTES,
+                          max_segundos_bitacora=config.JOURNAL_MAX_SECONDS,
+                          tipo_embeddings=config.EMBEDDING_STORAGE_DTYPE,
+                          comprimir_textos=config.TEXT_COMPRESSION,
+                          max_entradas_cache_embeddings=0,
+                          tipo_codificador=config.ENCODER_BACKEND,
+                          ruta_modelo_onnx=config.ONNX_MODEL_PATH,
+                          capacidad_segmento_memoria=config.SEGMENT_MEMORY_FRAGMENTS,
+                          factor_fusion_segmentos=0,
+                          umbral_compactacion=0,
+                          umbral_ann=config.ANN_MIN_FRAGMENTS,
+                          min_filas_ivf=config.ANN_SEGMENT_MIN_FRAGMENTS,
+                          tipo_puntuacion=config.EMBEDDING_SCORING_DTYPE)
+    try:
+        informe = indexador.compactar()
+    finally:
+        indexador.cerrar()
+    
+    print(json.dumps(informe, indent=2))
+    return 0
+
+if __name__ == "__main__":
+    sys.exit(main())
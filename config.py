@@ -7,8 +7,38 @@ DATA_FOLDER = 'indexados_datos'
 ALLOWED_EXTENSIONS = {'.txt', '.pdf', '.docx', '.xlsx', '.sql'}
 
 # Parámetros del indexador
+EMBEDDING_MODEL = 'paraphrase-multilingual-MiniLM-L12-v2'  # Nombre o ruta del modelo de SentenceTransformer
 DEFAULT_FRAGMENT_SIZE = 2500
 DEFAULT_OVERLAP = 300
+EMBEDDING_BATCH_SIZE = 32      # Fragmentos que se codifican juntos en cada lote del modelo
+EXTRACTION_THREADS = 2         # Hilos que extraen el texto de los archivos en la indexación masiva
+PIPELINE_QUEUE_SIZE = 16       # Capacidad de cada cola entre etapas del pipeline de indexación
+PIPELINE_BATCH_FRAGMENTS = 512 # Fragmentos de varios documentos que se codifican juntos en el pipeline
+ENCODING_PROCESSES = 1         # Procesos que generan embeddings en paralelo (1 = en el proceso principal; sólo 'sentence-transformers')
+ENCODER_BACKEND = 'sentence-transformers'  # Motor del modelo: 'sentence-transformers', 'torch-int8' u 'onnx'
+ONNX_MODEL_PATH = 'modelos/onnx'  # Directorio del modelo exportado con codificadores.exportar_onnx (motor 'onnx')
+MODEL_WARMUP = True            # Cargar el modelo en segundo plano al arrancar en lugar de en su primer uso
+JOURNAL_MAX_BYTES = 64 * 1024 * 1024  # Tamaño de la bitácora que dispara un punto de control
+JOURNAL_MAX_SECONDS = 300      # Segundos máximos con cambios en la bitácora sin punto de control
+EMBEDDING_STORAGE_DTYPE = 'float32'  # Tipo de la matriz de embeddings en disco: 'float32' o 'float16'
+TEXT_COMPRESSION = True        # Comprimir con zlib el texto de los fragmentos guardado en disco
+TEXT_CACHE_SIZE = 1024         # Textos de fragmento que se mantienen en memoria (caché LRU)
+CHUNKING_MODE = 'tokens'       # 'tokens': fragmentos a la medida de la entrada del modelo; 'caracteres': DEFAULT_FRAGMENT_SIZE
+CHUNK_OVERLAP_TOKENS = 16      # Tokens compartidos entre fragmentos sucesivos en el modo 'tokens'
+EMBEDDING_CACHE_MAX_ENTRIES = 100000  # Embeddings reutilizables por (modelo, texto); 0 desactiva la caché
+QUERY_EMBEDDING_CACHE_SIZE = 1024  # Embeddings de consultas recientes que se recuerdan en memoria (0 desactiva la caché)
+RESULT_CACHE_MAX_BYTES = 16 * 1024 * 1024  # Memoria para respuestas ya calculadas, válidas mientras el índice no cambie (0 desactiva la caché)
+RESULT_CACHE_SECONDS = 300     # Segundos que se sirve una respuesta calculada antes de volver a buscar
+BATCH_SEARCH_MAX_QUERIES = 10000  # Consultas admitidas en cada petición a /buscar_lote
+SEMANTIC_SHORTLIST_SIZE = 0    # Con N > 0 las palabras clave sólo se comprueban en los N fragmentos más similares (p. ej. 200); 0 = exhaustiva
+SEGMENT_MEMORY_FRAGMENTS = 4096  # Fragmentos nuevos que se acumulan en memoria antes de congelarlos en un segmento
+SEGMENT_MERGE_FACTOR = 4       # Segmentos del mismo tamaño que se fusionan en uno en segundo plano (0 no fusiona)
+COMPACTION_DEAD_RATIO = 0.3    # Proporción de datos eliminados que dispara una compactación automática (0 la desactiva)
+ANN_MIN_FRAGMENTS = 200000     # Fragmentos a partir de los cuales la búsqueda semántica es aproximada (0 siempre exacta)
+ANN_NPROBE = 16                # Listas del índice IVF exploradas por segmento: más listas, más recall y más latencia
+ANN_SEGMENT_MIN_FRAGMENTS = 16384  # Fragmentos a partir de los cuales un segmento lleva índice IVF
+EMBEDDING_SCORING_DTYPE = 'float32'  # Copia en memoria con la que se puntúa: 'float32' (la matriz guardada), 'float16' o 'int8'
+RESCORE_CANDIDATES = 200       # Con 'float16' o 'int8', mejores fragmentos por segmento que se recalculan con la matriz completa
 
 # Configuración de PostgreSQL
 PG_CONFIG = {
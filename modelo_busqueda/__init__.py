@@ -1,2 +1,7 @@
 from .indexador import Indexador
-from .buscador import Buscador 
\ No newline at end of file
+from .buscador import Buscador
+from .pipeline import PipelineIndexacion
+from .generaciones import GeneracionesIndice
+from .cache_embeddings import CacheEmbeddings
+from .cache_consultas import CacheConsultas, CacheResultados
+from .registro_modelos import registro_modelos
@@ -0,0 +1,295 @@
+import os
+import json
+import glob
+import pickle
+import logging
+import numpy as np
+from typing import List, Tuple, Iterable, Iterator, Any
+from .persistencia import escribir_atomico
+
+logger = logging.getLogger(__name__)
+
+class AlmacenEmbeddings:
+    """
+    Almacén de embeddings en una matriz binaria contigua
+    
+    Los embeddings se guardan normalizados (norma 1), ya que la búsqueda sólo usa la
+    similitud coseno, en un único archivo .npy acompañado de una tabla con el ID de
+    fragmento de cada fila. Al cargar, la matriz se abre con np.memmap: el arranque no
+    depende del número de fragmentos y los procesos que abren el mismo índice comparten
+    sus páginas en la caché del sistema operativo.
+    
+    Las altas y bajas se acumulan en memoria y se consolidan en una nueva matriz la próxima
+    vez que se necesita para buscar o guardar.
+    """
+    
+    TIPOS = {'float32': np.float32, 'float16': np.float16}
+    
+    # Filas que se convierten a float32 de una vez al puntuar una matriz float16
+    FILAS_POR_BLOQUE = 65536
+    
+    def __init__(self, directorio_datos: str, tipo: str = 'float32'):
+        """
+        Inicializa un almacén vacío
+        
+        Args:
+            directorio_datos (str): Directorio donde se guardan la matriz y la tabla de IDs
+            tipo (str): Tipo de dato de la matriz guardada ('float32' o 'float16')
+        """
+        if tipo not in self.TIPOS:
+            raise ValueError(f"Tipo de embedding no soportado: {tipo}")
+        
+        self.directorio_datos = directorio_datos
+        self.ruta_tabla = os.path.join(directorio_datos, "embeddings_ids.json")
+        self.tipo = np.dtype(self.TIPOS[tipo])
+        
+        self._matriz = np.zeros((0, 0), dtype=self.tipo)  # Filas consolidadas (posible memmap)
+        self._ids = []          # ID de cada fila (consolidadas y nuevas); None si se eliminó
+        self._fila_por_id = {}  # Mapa de ID de fragmento a su fila
+        self._nuevas = []       # Filas añadidas desde la última consolidación
+        self._eliminadas = 0    # Filas marcadas como eliminadas desde la última consolidación
+        self._modificado = False
+    
+    def __len__(self) -> int:
+        return len(self._fila_por_id)
+    
+    def __contains__(self, fragmento_id) -> bool:
+        return fragmento_id in self._fila_por_id
+    
+    def __getitem__(self, fragmento_id) -> np.ndarray:
+        fila = self._fila_por_id[fragmento_id]
+        if fila < len(self._matriz):
+            return np.asarray(self._matriz[fila], dtype=np.float32)
+        return self._nuevas[fila - len(self._matriz)]
+    
+    def get(self, fragmento_id, predeterminado=None):
+        """Devuelve el embedding normalizado de un fragmento o el valor predeterminado"""
+        return self[fragmento_id] if fragmento_id in self._fila_por_id else predeterminado
+    
+    def keys(self) -> Iterable[Any]:
+        return self._fila_por_id.keys()
+    
+    def items(self) -> Iterator[Tuple[Any, np.ndarray]]:
+        for fragmento_id in list(self._fila_por_id):
+            yield fragmento_id, self[fragmento_id]
+    
+    def agregar(self, fragmento_id, embedding):
+        """
+        Añade o reemplaza el embedding de un fragmento
+        
+        Args:
+            fragmento_id: ID del fragmento
+            embedding: Vector de embedding (se guarda normalizado)
+        """
+        if fragmento_id in self._fila_por_id:
+            self.eliminar(fragmento_id)
+        
+        vector = np.asarray(embedding, dtype=np.float32).ravel()
+        norma = np.linalg.norm(vector)
+        if norma > 0:
+            vector = vector / norma
+        
+        self._fila_por_id[fragmento_id] = len(self._ids)
+        self._ids.append(fragmento_id)
+        self._nuevas.append(vector)
+        self._modificado = True
+    
+    def eliminar(self, fragmento_id):
+        """
+        Elimina el embedding de un fragmento si existe
+        
+        Args:
+            fragmento_id: ID del fragmento
+        """
+        fila = self._fila_por_id.pop(fragmento_id, None)
+        if fila is not None:
+            self._ids[fila] = None
+            self._eliminadas += 1
+            self._modificado = True
+    
+    def _consolidar(self):
+        """Construye una nueva matriz contigua sin filas eliminadas y con las filas nuevas"""
+        if not self._nuevas and not self._eliminadas:
+            return
+        
+        num_consolidadas = len(self._matriz)
+        filas_vivas = [fila for fila, fragmento_id in enumerate(self._ids) if fragmento_id is not None]
+        
+        partes = []
+        filas_consolidadas = [fila for fila in filas_vivas if fila < num_consolidadas]
+        if filas_consolidadas:
+            partes.append(np.asarray(self._matriz[filas_consolidadas], dtype=self.tipo))
+        if self._nuevas:
+            filas_nuevas = [fila - num_consolidadas for fila in filas_vivas if fila >= num_consolidadas]
+            if filas_nuevas:
+                partes.append(np.stack([self._nuevas[fila] for fila in filas_nuevas]).astype(self.tipo))
+        
+        if partes:
+            self._matriz = np.ascontiguousarray(np.concatenate(partes))
+        else:
+            self._matriz = np.zeros((0, 0), dtype=self.tipo)
+        
+        self._ids = [self._ids[fila] for fila in filas_vivas]
+        self._fila_por_id = {fragmento_id: fila for fila, fragmento_id in enumerate(self._ids)}
+        self._nuevas = []
+        self._eliminadas = 0
+    
+    def obtener_matriz(self) -> Tuple[List[Any], np.ndarray]:
+        """
+        Devuelve la matriz de embeddings normalizados y los IDs de sus filas
+        
+        Returns:
+            Tuple[List, np.ndarray]: IDs de fragmento y matriz (n, dim) del tipo del almacén
+        """
+        self._consolidar()
+        return self._ids, self._matriz
+    
+    def posiciones(self, ids_fragmentos: Iterable[Any]) -> np.ndarray:
+        """
+        Traduce IDs de fragmento a sus filas en la matriz devuelta por obtener_matriz
+        
+        Args:
+            ids_fragmentos: IDs de fragmento a localizar
+            
+        Returns:
+            np.ndarray: Filas correspondientes en orden ascendente. Los IDs desconocidos se ignoran.
+        """
+        self._consolidar()
+        filas = [self._fila_por_id[fragmento_id] for fragmento_id in ids_fragmentos
+                 if fragmento_id in self._fila_por_id]
+        return np.array(sorted(filas), dtype=np.int64)
+    
+    def puntuar(self, consulta: np.ndarray) -> Tuple[List[Any], np.ndarray]:
+        """
+        Calcula el producto escalar de un vector normalizado con todas las filas
+        
+        Las matrices float16 se convierten a float32 por bloques para no duplicar en memoria
+        la matriz completa en cada consulta.
+        
+        Args:
+            consulta: Vector de la consulta ya normalizado
+            
+        Returns:
+            Tuple[List, np.ndarray]: IDs de fragmento y similitudes float32 paralelas
+        """
+        ids, matriz = self.obtener_matriz()
+        consulta = np.asarray(consulta, dtype=np.float32)
+        
+        if not ids:
+            return ids, np.zeros(0, dtype=np.float32)
+        
+        if matriz.dtype == np.float32:
+            return ids, matriz @ consulta
+        
+        similitudes = np.empty(len(ids), dtype=np.float32)
+        for inicio in range(0, len(ids), self.FILAS_POR_BLOQUE):
+            bloque = matriz[inicio:inicio + self.FILAS_POR_BLOQUE].astype(np.float32)
+            similitudes[inicio:inicio + len(bloque)] = bloque @ consulta
+        return ids, similitudes
+    
+    def cargar(self) -> bool:
+        """
+        Abre la matriz guardada con np.memmap y carga su tabla de IDs
+        
+        Returns:
+            bool: True si había un almacén guardado
+        """
+        if not os.path.exists(self.ruta_tabla):
+            return False
+        
+        with open(self.ruta_tabla, 'r', encoding='utf-8') as f:
+            tabla = json.load(f)
+        
+        matriz = np.load(os.path.join(self.directorio_datos, tabla["matriz"]), mmap_mode='r')
+        if len(matriz) != len(tabla["ids"]):
+            raise ValueError(f"La matriz {tabla['matriz']} tiene {len(matriz)} filas "
+                             f"pero la tabla de IDs tiene {len(tabla['ids'])}")
+        
+        self._matriz = matriz
+        self._ids = list(tabla["ids"])
+        self._fila_por_id = {fragmento_id: fila for fila, fragmento_id in enumerate(self._ids)}
+        self._nuevas = []
+        self._eliminadas = 0
+        self._modificado = False
+        
+        if matriz.dtype != self.tipo:
+            logger.info(f"La matriz guardada es {matriz.dtype}; se convertirá a {self.tipo} al guardar")
+            self._modificado = True
+        
+        return True
+    
+    def migrar_pickle(self, ruta_pickle: str):
+        """
+        Importa un embeddings.pkl del formato anterior (diccionario de arrays numpy)
+        
+        Guarda el almacén en el nuevo formato y elimina el archivo pickle.
+        
+        Args:
+            ruta_pickle (str): Ruta del archivo embeddings.pkl
+        """
+        with open(ruta_pickle, 'rb') as f:
+            embeddings = pickle.load(f)
+        
+        for fragmento_id, embedding in embeddings.items():
+            self.agregar(fragmento_id, embedding)
+        
+        self.guardar()
+        os.remove(ruta_pickle)
+        logger.info(f"Migrados {len(embeddings)} embeddings de {ruta_pickle} a {self.ruta_tabla}")
+    
+    def guardar(self):
+        """
+        Guarda la matriz y la tabla de IDs si hubo cambios
+        
+        Cada versión de la matriz se escribe en un archivo nuevo y la tabla de IDs, que indica
+        cuál es la vigente, se reemplaza de forma atómica al final. Así una caída nunca deja
+        una tabla que no corresponda a su matriz, y los procesos que aún tienen abierta la
+        versión anterior con memmap no se ven afectados.
+        """
+        if not self._modificado:
+            return
+        
+        self._consolidar()
+        
+        version = 1
+        if os.path.exists(self.ruta_tabla):
+            with open(self.ruta_tabla, 'r', encoding='utf-8') as f:
+                version = json.load(f).get("version", 0) + 1
+        
+        nombre_matriz = f"embeddings_{version:06d}.npy"
+        matriz = np.ascontiguousarray(self._matriz, dtype=self.tipo)
+        escribir_atomico(os.path.join(self.directorio_datos, nombre_matriz),
+                         lambda f: np.save(f, matriz), 'wb')
+        
+        tabla = {"version": version, "matriz": nombre_matriz, "tipo": str(self.tipo), "ids": self._ids}
+        escribir_atomico(self.ruta_tabla, lambda f: json.dump(tabla, f, ensure_ascii=False))
+        
+        # Reabrir con memmap para no mantener una copia privada de la matriz en memoria
+        self._matriz = np.load(os.path.join(self.directorio_datos, nombre_matriz), mmap_mode='r')
+        self._modificado = False
+        
+        self._eliminar_versiones_antiguas(conservar=nombre_matriz)
+    
+    def _eliminar_versiones_antiguas(self, conservar: str = None):
+        """Elimina las matrices guardadas que ya no son la versión vigente"""
+        for ruta in glob.glob(os.path.join(self.directorio_datos, "embeddings_*.npy")):
+            if os.path.basename(ruta) == conservar:
+                continue
+            try:
+                os.remove(ruta)
+            except OSError as e:
+                # En Windows no se puede borrar un archivo que otro proceso tiene mapeado
+                logger.warning(f"No se pudo eliminar {ruta}: {e}")
+    
+    def limpiar(self):
+        """Vacía el almacén y elimina sus archivos"""
+        self._matriz = np.zeros((0, 0), dtype=self.tipo)
+        self._ids = []
+        self._fila_por_id = {}
+        self._nuevas = []
+        self._eliminadas = 0
+        self._modificado = False
+        
+        if os.path.exists(self.ruta_tabla):
+            os.remove(self.ruta_tabla)
+        self._eliminar_versiones_antiguas()
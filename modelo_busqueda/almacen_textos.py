@@ -0,0 +1,246 @@
+import os
+import zlib
+import sqlite3
+import logging
+import threading
+from collections import OrderedDict
+from typing import Any, Iterable, Iterator, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+class AlmacenTextos:
+    """
+    Almacén en disco del texto de los fragmentos, con carga bajo demanda
+    
+    Los textos se guardan en una base de datos SQLite indexada por ID de fragmento,
+    opcionalmente comprimidos con zlib, y se leen sólo cuando se necesitan (normalmente los
+    top-k resultados de una consulta). Una pequeña caché LRU evita releer los textos que se
+    consultan con frecuencia, de modo que la memoria residente no crece con el corpus.
+    """
+    
+    # Los textos más cortos que esto no se comprimen porque zlib apenas los reduce
+    MIN_CARACTERES_COMPRESION = 256
+    
+    def __init__(self, ruta: str, comprimir: bool = True, capacidad_cache: int = 1024):
+        """
+        Abre (o crea) el almacén
+        
+        Args:
+            ruta (str): Ruta del archivo SQLite
+            comprimir (bool): Si se comprimen los textos nuevos con zlib
+            capacidad_cache (int): Número máximo de textos en la caché LRU
+        """
+        self.ruta = ruta
+        self.comprimir = comprimir
+        self.capacidad_cache = capacidad_cache
+        
+        self._cache = OrderedDict()
+        self._bloqueo = threading.RLock()
+        
+        # La conexión se comparte entre los hilos de Flask y los de indexación; el bloqueo la protege
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        # Sólo tiene efecto al crear la base de datos; las anteriores se convierten en compactar()
+        self._conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS fragmentos (id PRIMARY KEY, texto BLOB NOT NULL, comprimido INTEGER NOT NULL)"
+        )
+        self._conexion.commit()
+    
+    def _codificar(self, texto: str) -> Tuple[bytes, int]:
+        """Convierte un texto en el contenido que se guarda en la base de datos"""
+        datos = str(texto).encode('utf-8')
+        if self.comprimir and len(datos) >= self.MIN_CARACTERES_COMPRESION:
+            return zlib.compress(datos), 1
+        return datos, 0
+    
+    @staticmethod
+    def _decodificar(datos: bytes, comprimido: int) -> str:
+        """Recupera el texto a partir del contenido guardado"""
+        if comprimido:
+            datos = zlib.decompress(datos)
+        return bytes(datos).decode('utf-8')
+    
+    def _recordar(self, fragmento_id, texto: str):
+        """Añade un texto a la caché LRU, descartando el menos usado si está llena"""
+        self._cache[fragmento_id] = texto
+        self._cache.move_to_end(fragmento_id)
+        while len(self._cache) > self.capacidad_cache:
+            self._cache.popitem(last=False)
+    
+    def agregar(self, fragmento_id, texto: str):
+        """
+        Añade o reemplaza el texto de un fragmento
+        
+        El cambio queda pendiente hasta la siguiente llamada a confirmar().
+        
+        Args:
+            fragmento_id: ID del fragmento
+            texto (str): Texto del fragmento
+        """
+        datos, comprimido = self._codificar(texto)
+        with self._bloqueo:
+            self._conexion.execute("INSERT OR REPLACE INTO fragmentos (id, texto, comprimido) VALUES (?, ?, ?)",
+                                   (fragmento_id, datos, comprimido))
+            self._cache.pop(fragmento_id, None)
+    
+    def agregar_varios(self, textos: Iterable[Tuple[Any, str]]):
+        """
+        Añade varios textos en una sola operación
+        
+        Args:
+            textos: Pares (fragmento_id, texto)
+        """
+        filas = [(fragmento_id,) + self._codificar(texto) for fragmento_id, texto in textos]
+        with self._bloqueo:
+            self._conexion.executemany("INSERT OR REPLACE INTO fragmentos (id, texto, comprimido) VALUES (?, ?, ?)",
+                                       filas)
+            for fragmento_id, _, _ in filas:
+                self._cache.pop(fragmento_id, None)
+    
+    def eliminar(self, fragmento_id):
+        """
+        Elimina el texto de un fragmento si existe
+        
+        Args:
+            fragmento_id: ID del fragmento
+        """
+        with self._bloqueo:
+            self._conexion.execute("DELETE FROM fragmentos WHERE id = ?", (fragmento_id,))
+            self._cache.pop(fragmento_id, None)
+    
+    def eliminar_varios(self, ids_fragmentos: Iterable[Any]):
+        """
+        Elimina los textos de varios fragmentos en una sola operación
+        
+        Args:
+            ids_fragmentos: IDs de los fragmentos
+        """
+        ids_fragmentos = list(ids_fragmentos)
+        with self._bloqueo:
+            self._conexion.executemany("DELETE FROM fragmentos WHERE id = ?",
+                                       [(fragmento_id,) for fragmento_id in ids_fragmentos])
+            for fragmento_id in ids_fragmentos:
+                self._cache.pop(fragmento_id, None)
+    
+    def confirmar(self):
+        """Confirma en disco los cambios pendientes"""
+        with self._bloqueo:
+            self._conexion.commit()
+    
+    def get(self, fragmento_id, predeterminado=None):
+        """
+        Obtiene el texto de un fragmento, leyéndolo de disco si no está en la caché
+        
+        Args:
+            fragmento_id: ID del fragmento
+            predeterminado: Valor devuelto si el fragmento no existe
+        
+        Returns:
+            str: Texto del fragmento o el valor predeterminado
+        """
+        with self._bloqueo:
+            if fragmento_id in self._cache:
+                self._cache.move_to_end(fragmento_id)
+                return self._cache[fragmento_id]
+            
+            fila = self._conexion.execute("SELECT texto, comprimido FROM fragmentos WHERE id = ?",
+                                          (fragmento_id,)).fetchone()
+            if fila is None:
+                return predeterminado
+            
+            texto = self._decodificar(*fila)
+            self._recordar(fragmento_id, texto)
+            return texto
+    
+    def __getitem__(self, fragmento_id) -> str:
+        texto = self.get(fragmento_id)
+        if texto is None:
+            raise KeyError(fragmento_id)
+        return texto
+    
+    def __contains__(self, fragmento_id) -> bool:
+        with self._bloqueo:
+            if fragmento_id in self._cache:
+                return True
+            return self._conexion.execute("SELECT 1 FROM fragmentos WHERE id = ?",
+                                          (fragmento_id,)).fetchone() is not None
+    
+    def __len__(self) -> int:
+        with self._bloqueo:
+            return self._conexion.execute("SELECT COUNT(*) FROM fragmentos").fetchone()[0]
+    
+    def keys(self) -> List[Any]:
+        with self._bloqueo:
+            return [fila[0] for fila in self._conexion.execute("SELECT id FROM fragmentos")]
+    
+    def items(self, filas_por_lectura: int = 1000) -> Iterator[Tuple[Any, str]]:
+        """
+        Recorre todos los textos sin pasar por la caché (p. ej. para reconstruir índices)
+        
+        Los textos se leen por tandas para no cargar el corpus completo en memoria.
+        
+        Args:
+            filas_por_lectura (int): Número de textos leídos en cada consulta
+        """
+        ultima_fila = 0
+        while True:
+            with self._bloqueo:
+                filas = self._conexion.execute(
+                    "SELECT rowid, id, texto, comprimido FROM fragmentos WHERE rowid > ? ORDER BY rowid LIMIT ?",
+                    (ultima_fila, filas_por_lectura)).fetchall()
+            if not filas:
+                return
+            for fila, fragmento_id, datos, comprimido in filas:
+                ultima_fila = fila
+                yield fragmento_id, self._decodificar(datos, comprimido)
+    
+    def proporcion_libre(self) -> float:
+        """Fracción de las páginas del archivo que están libres (espacio de textos eliminados)"""
+        with self._bloqueo:
+            libres = self._conexion.execute("PRAGMA freelist_count").fetchone()[0]
+            total = self._conexion.execute("PRAGMA page_count").fetchone()[0]
+        return libres / total if total else 0.0
+    
+    def compactar(self, paginas_por_paso: int = 1024):
+        """
+        Devuelve al sistema el espacio de los textos eliminados
+        
+        Las páginas libres se liberan por tandas con incremental_vacuum, soltando el bloqueo
+        entre una y otra para que las búsquedas puedan seguir leyendo textos. Una base de
+        datos creada sin auto_vacuum incremental se convierte la primera vez con un VACUUM
+        completo, durante el cual las lecturas esperan.
+        
+        Args:
+            paginas_por_paso (int): Páginas liberadas en cada tanda
+        """
+        with self._bloqueo:
+            self._conexion.commit()
+            if self._conexion.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                logger.info(f"Convirtiendo {self.ruta} a auto_vacuum incremental (VACUUM completo)...")
+                self._conexion.execute("PRAGMA auto_vacuum=INCREMENTAL")
+                self._conexion.execute("VACUUM")
+        
+        while True:
+            with self._bloqueo:
+                if self._conexion.execute("PRAGMA freelist_count").fetchone()[0] == 0:
+                    break
+                self._conexion.execute(f"PRAGMA incremental_vacuum({int(paginas_por_paso)})").fetchall()
+                self._conexion.commit()
+        
+        # Aplicar la WAL al archivo principal y truncarla para que el espacio se libere en disco.
+        # Un indexador puede haber añadido textos entretanto; con una transacción abierta en la
+        # conexión el punto de control falla, y confirmarlos no cambia nada (se escriben con
+        # INSERT OR REPLACE y la bitácora sigue decidiendo qué fragmentos existen)
+        with self._bloqueo:
+            self._conexion.commit()
+            self._conexion.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchall()
+    
+    def limpiar(self):
+        """Elimina todos los textos y libera el espacio en disco"""
+        with self._bloqueo:
+            self._conexion.execute("DELETE FROM fragmentos")
+            self._conexion.commit()
+            self._conexion.execute("VACUUM")
+            self._cache.clear()
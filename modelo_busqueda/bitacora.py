@@ -0,0 +1,126 @@
+import os
+import json
+import time
+import base64
+import logging
+import numpy as np
+from typing import List, Dict, Any, Iterator
+
+logger = logging.getLogger(__name__)
+
+class Bitacora:
+    """
+    Registro de solo-anexado (write-ahead log) con los cambios del índice
+    
+    Cada cambio (alta de un documento y sus fragmentos, o su eliminación) se añade al final
+    del archivo como líneas JSON, de modo que guardar un documento cuesta sólo lo que ocupan
+    sus fragmentos. Los archivos base del índice se reescriben únicamente en los puntos de
+    control, tras los cuales la bitácora se vacía.
+    """
+    
+    def __init__(self, ruta: str, max_bytes: int = 64 * 1024 * 1024, max_segundos: float = 300):
+        """
+        Inicializa la bitácora
+        
+        Args:
+            ruta (str): Ruta del archivo de la bitácora
+            max_bytes (int): Tamaño a partir del cual se debe hacer un punto de control
+            max_segundos (float): Antigüedad máxima de un cambio sin punto de control
+        """
+        self.ruta = ruta
+        self.max_bytes = max_bytes
+        self.max_segundos = max_segundos
+        self.ultimo_punto_control = time.time()
+    
+    def registrar(self, entradas: List[Dict[str, Any]]):
+        """
+        Añade entradas a la bitácora y las fuerza a disco
+        
+        Args:
+            entradas: Diccionarios serializables a JSON con la clave "op". Si una entrada
+                      tiene la clave "embedding" (np.ndarray), se guarda como float32 en base64.
+        """
+        lineas = []
+        for entrada in entradas:
+            if "embedding" in entrada:
+                embedding = np.asarray(entrada["embedding"], dtype=np.float32)
+                entrada = dict(entrada, embedding=base64.b64encode(embedding.tobytes()).decode('ascii'))
+            lineas.append(json.dumps(entrada, ensure_ascii=False))
+        self._anexar(lineas)
+    
+    def _anexar(self, lineas: List[str]):
+        """Escribe las líneas al final del archivo y las fuerza a disco"""
+        if not lineas:
+            return
+        
+        with open(self.ruta, 'a', encoding='utf-8') as f:
+            f.write("\n".join(lineas) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+    
+    def leer(self) -> Iterator[Dict[str, Any]]:
+        """
+        Recorre las entradas de la bitácora en el orden en que se escribieron
+        
+        Una última línea incompleta (p. ej. por una caída durante la escritura) se descarta
+        del archivo para que las siguientes entradas se anexen a continuación de la última
+        entrada válida.
+        
+        Yields:
+            dict: Entrada con la clave "op". Las entradas con embedding lo incluyen ya
+            decodificado como np.ndarray float32.
+        """
+        if not os.path.exists(self.ruta):
+            return
+        
+        fin_valido = 0
+        truncar = False
+        
+        with open(self.ruta, 'rb') as f:
+            for num_linea, linea in enumerate(f, 1):
+                try:
+                    entrada = json.loads(linea.decode('utf-8')) if linea.strip() else None
+                    if not linea.endswith(b"\n"):
+                        raise ValueError("línea sin terminar")
+                except ValueError:
+                    logger.warning(f"Entrada incompleta en la bitácora (línea {num_linea}), se descarta")
+                    truncar = True
+                    break
+                
+                fin_valido += len(linea)
+                if entrada is None:
+                    continue
+                
+                if "embedding" in entrada:
+                    entrada["embedding"] = np.frombuffer(base64.b64decode(entrada["embedding"]),
+                                                         dtype=np.float32).copy()
+                yield entrada
+        
+        if truncar:
+            with open(self.ruta, 'r+b') as f:
+                f.truncate(fin_valido)
+    
+    def tamano(self) -> int:
+        """Devuelve el tamaño actual de la bitácora en bytes"""
+        try:
+            return os.path.getsize(self.ruta)
+        except OSError:
+            return 0
+    
+    def requiere_punto_control(self) -> bool:
+        """
+        Indica si la bitácora superó el umbral de tamaño o de tiempo
+        
+        Returns:
+            bool: True si conviene compactar la bitácora en los archivos base
+        """
+        tamano = self.tamano()
+        if tamano == 0:
+            return False
+        return tamano >= self.max_bytes or time.time() - self.ultimo_punto_control >= self.max_segundos
+    
+    def vaciar(self):
+        """Descarta las entradas tras un punto de control"""
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+        self.ultimo_punto_control = time.time()
@@ -1,11 +1,15 @@
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from typing import List, Dict, Any, Tuple
 import logging
 import re
+from .cache_consultas import CacheConsultas, CacheResultados, normalizar_consulta
+from .indexador import tokenizar
 
 logger = logging.getLogger(__name__)
 
+# Similitudes (consultas x fragmentos) que buscar_lote calcula a la vez; limita su memoria
+MAX_SIMILITUDES_LOTE = 16 * 1024 * 1024
+
 class Buscador:
     """
     Clase que implementa búsqueda semántica híbrida en documentos indexados
@@ -15,19 +19,107 @@ class Buscador:
     más relevantes de los documentos indexados que respondan a una consulta.
     """
     
-    def __init__(self, indexador, modelo=None):
+    def __init__(self, indexador, modelo=None, capacidad_cache_consultas=1024, cache_consultas=None,
+                 max_bytes_cache_resultados=16 * 1024 * 1024, segundos_cache_resultados=300,
+                 cache_resultados=None, candidatos_semanticos=0):
         """
         Inicializa el buscador con un indexador y opcionalmente un modelo de embeddings
         
         Args:
             indexador: Instancia del indexador que contiene los documentos y embeddings
-            modelo: Modelo de SentenceTransformer para generar embeddings (opcional)
-                   Si no se proporciona, usa el mismo modelo del indexador
+            modelo: Codificador que genera los embeddings de las consultas (opcional)
+                   Si no se proporciona, usa el mismo codificador del indexador
+            capacidad_cache_consultas: Embeddings de consultas que se recuerdan (0 desactiva la caché)
+            cache_consultas: Caché de embeddings de consultas ya creada, para compartirla con
+                            otros buscadores; si se indica, se ignora capacidad_cache_consultas
+            max_bytes_cache_resultados: Memoria para respuestas ya calculadas (0 desactiva la caché)
+            segundos_cache_resultados: Tiempo que se sirve una respuesta calculada
+            cache_resultados: Caché de respuestas ya creada, para compartirla con otros
+                             buscadores; si se indica, se ignoran los dos parámetros anteriores
+            candidatos_semanticos: Con N > 0, búsqueda en dos etapas: las palabras clave sólo se
+                                  comprueban en los N fragmentos semánticamente más similares;
+                                  con 0 se comprueban en todo el índice
         """
         self.indexador = indexador
-        self.modelo = modelo if modelo is not None else indexador.modelo
+        self._modelo = modelo
+        if cache_consultas is None and capacidad_cache_consultas > 0:
+            cache_consultas = CacheConsultas(capacidad_cache_consultas)
+        self.cache_consultas = cache_consultas
+        if cache_resultados is None and max_bytes_cache_resultados > 0:
+            cache_resultados = CacheResultados(max_bytes_cache_resultados, segundos_cache_resultados)
+        self.cache_resultados = cache_resultados
+        self.candidatos_semanticos = candidatos_semanticos
         logger.info("Buscador inicializado con éxito")
     
+    @property
+    def modelo(self):
+        """Codificador de las consultas; el del indexador se carga en su primer uso"""
+        return self._modelo if self._modelo is not None else self.indexador.modelo
+    
+    def _nombre_modelo(self) -> str:
+        """Identidad del codificador de las consultas, sin cargarlo"""
+        if self._modelo is not None:
+            return getattr(self._modelo, 'nombre', None) or f"{type(self._modelo).__name__}@{id(self._modelo):x}"
+        return self.indexador.nombre_modelo
+    
+    def codificar_consulta(self, consulta: str) -> np.ndarray:
+        """
+        Genera el embedding de una consulta, reutilizándolo si ya se calculó
+        
+        Las consultas repetidas (con el mismo texto normalizado y el mismo codificador) se
+        sirven desde la caché sin pasar por el modelo.
+        
+        Args:
+            consulta: Consulta o pregunta del usuario
+        
+        Returns:
+            Embedding de la consulta (de sólo lectura si procede de la caché)
+        """
+        texto = normalizar_consulta(consulta)
+        if self.cache_consultas is None:
+            return self.modelo.encode(texto)
+        
+        clave = (self._nombre_modelo(), texto)
+        embedding = self.cache_consultas.obtener(clave)
+        if embedding is None:
+            embedding = self.cache_consultas.guardar(clave, self.modelo.encode(texto))
+        return embedding
+    
+    def codificar_consultas(self, consultas: List[str]) -> np.ndarray:
+        """
+        Genera los embeddings de varias consultas con una sola llamada al modelo
+        
+        Sólo se codifican las consultas que no están en la caché, y cada texto distinto
+        una única vez.
+        
+        Args:
+            consultas: Consultas o preguntas del usuario
+        
+        Returns:
+            Matriz float32 con el embedding de cada consulta, en el mismo orden
+        """
+        textos = [normalizar_consulta(consulta) for consulta in consultas]
+        nombre_modelo = self._nombre_modelo()
+        embeddings = {}
+        if self.cache_consultas is not None:
+            for texto in set(textos):
+                embedding = self.cache_consultas.obtener((nombre_modelo, texto))
+                if embedding is not None:
+                    embeddings[texto] = embedding
+        
+        pendientes = list(dict.fromkeys(texto for texto in textos if texto not in embeddings))
+        if pendientes:
+            nuevos = np.atleast_2d(self.modelo.encode(pendientes, batch_size=self.indexador.tamano_lote,
+                                                      show_progress_bar=False))
+            for texto, embedding in zip(pendientes, nuevos):
+                if self.cache_consultas is not None:
+                    embedding = self.cache_consultas.guardar((nombre_modelo, texto), embedding)
+                embeddings[texto] = embedding
+        
+        if not textos:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.array([embeddings[texto] for texto in textos], dtype=np.float32)
+    
     def buscar(self, consulta: str, top_k: int = 5) -> List[Dict[str, Any]]:
         """
         Realiza una búsqueda híbrida (semántica + palabras clave) en los documentos indexados
@@ -39,17 +131,92 @@ class Buscador:
         Requisito: Los resultados deben contener al menos una palabra clave de la consulta
         para ser incluidos, a menos que no haya ninguna coincidencia exacta.
         
+        Toda la búsqueda usa una misma instantánea del índice, por lo que no se bloquea ni
+        ve estados intermedios mientras otros hilos indexan o eliminan documentos.
+        
         Args:
             consulta: Consulta o pregunta del usuario
             top_k: Número máximo de resultados a devolver
-            
+        
         Returns:
             Lista de resultados ordenados por relevancia combinada
         """
-        if not self.indexador.embeddings:
+        instantanea = self.indexador.instantanea()
+        if not len(instantanea):
             logger.warning("No hay documentos indexados para buscar")
             return []
         
+        try:
+            embedding_consulta = self.codificar_consulta(consulta)
+        except Exception as e:
+            logger.error(f"Error al generar embedding de la consulta: {e}")
+            return []
+        
+        ids, similitudes = self._puntuar_fragmentos(embedding_consulta, instantanea)
+        return self._clasificar(consulta, embedding_consulta, ids, similitudes, top_k, instantanea)
+    
+    def buscar_lote(self, consultas: List[str], top_k: int = 5) -> List[List[Dict[str, Any]]]:
+        """
+        Realiza la búsqueda híbrida de varias consultas a la vez
+        
+        Todas las consultas se codifican con una sola llamada al modelo y se puntúan con un
+        producto matriz-matriz sobre la misma instantánea del índice; el filtrado por
+        palabras clave y la combinación de puntuaciones se aplican después a cada consulta
+        como en buscar(). La puntuación es siempre exacta (sin IVF), por lo que con la
+        búsqueda aproximada activada los resultados pueden ser mejores que los de buscar().
+        
+        Args:
+            consultas: Consultas o preguntas del usuario
+            top_k: Número máximo de resultados de cada consulta
+        
+        Returns:
+            Lista con los resultados de cada consulta, en el mismo orden que consultas
+        """
+        consultas = list(consultas)
+        instantanea = self.indexador.instantanea()
+        if not len(instantanea):
+            logger.warning("No hay documentos indexados para buscar")
+            return [[] for _ in consultas]
+        
+        try:
+            embeddings = self.codificar_consultas(consultas)
+        except Exception as e:
+            logger.error(f"Error al generar los embeddings de las consultas: {e}")
+            return [[] for _ in consultas]
+        
+        resultados = []
+        consultas_por_bloque = max(1, MAX_SIMILITUDES_LOTE // len(instantanea))
+        for inicio in range(0, len(consultas), consultas_por_bloque):
+            bloque = slice(inicio, inicio + consultas_por_bloque)
+            ids, similitudes = self.indexador.puntuar_lote(embeddings[bloque], instantanea)
+            for consulta, embedding_consulta, similitudes_consulta in zip(consultas[bloque], embeddings[bloque],
+                                                                            similitudes):
+                resultados.append(self._clasificar(consulta, embedding_consulta, ids, similitudes_consulta,
+                                                   top_k, instantanea))
+        return resultados
+    
+    def _clasificar(self, consulta: str, embedding_consulta, ids: List[int], similitudes: np.ndarray,
+                    top_k: int, instantanea) -> List[Dict[str, Any]]:
+        """
+        Combina las similitudes semánticas de una consulta con sus palabras clave
+        
+        En el modo exhaustivo (candidatos_semanticos = 0) se consideran todos los fragmentos
+        con alguna palabra clave exacta del índice. En el modo en dos etapas sólo se
+        consideran los candidatos_semanticos fragmentos más similares: el impulso por
+        palabras clave, el de los documentos Excel y num_coincidencias se calculan sólo
+        sobre ellos, y si ninguno tiene palabras clave se recurre a la búsqueda flexible.
+        
+        Args:
+            consulta: Consulta original
+            embedding_consulta: Embedding ya calculado de la consulta
+            ids: IDs de fragmento de la instantánea
+            similitudes: Similitudes paralelas a ids, de _puntuar_fragmentos
+            top_k: Número máximo de resultados
+            instantanea: Instantánea del índice de la búsqueda
+        
+        Returns:
+            Lista de resultados ordenados por relevancia combinada
+        """
         terminos_especificos = self._extraer_terminos_especificos(consulta)
         palabras_clave = self._extraer_palabras_clave(consulta)
         
@@ -57,118 +224,181 @@ class Buscador:
             logger.warning("No se encontraron palabras clave en la consulta")
             palabras_clave = terminos_especificos
         
-        try:
-            embedding_consulta = self.modelo.encode(consulta)
-        except Exception as e:
-            logger.error(f"Error al generar embedding de la consulta: {e}")
-            return []
+        if self.candidatos_semanticos > 0:
+            posiciones, coincidencias = self._coincidencias_en_candidatos(palabras_clave, similitudes, instantanea)
+        else:
+            # Sólo se conservan los fragmentos con al menos una palabra clave exacta: la unión
+            # de las listas de apariciones de las palabras clave en el índice invertido
+            coincidencias_por_fragmento = self._encontrar_coincidencias_palabras(palabras_clave, instantanea)
+            posiciones = self.indexador.posiciones_en_matriz(coincidencias_por_fragmento.keys(), instantanea)
+            coincidencias = [coincidencias_por_fragmento[ids[posicion]] for posicion in posiciones]
+        
+        if len(posiciones) == 0:
+            logger.info("No se encontraron resultados con palabras clave exactas, probando búsqueda flexible")
+            return self._busqueda_flexible(consulta, embedding_consulta, palabras_clave, top_k, instantanea,
+                                           ids, similitudes)
+        
+        num_coincidencias = np.array([len(c) for c in coincidencias], dtype=np.float32)
+        max_coincidencias = min(len(palabras_clave), 5)
+        boost_coincidencias = np.minimum(num_coincidencias / max_coincidencias, 1.0) * 0.4
+        
+        similitudes_semanticas = self._similitudes_en(embedding_consulta, similitudes, posiciones, instantanea)
+        similitudes_combinadas = (similitudes_semanticas * 0.7) + boost_coincidencias
+        
+        es_excel = np.array([
+            self.indexador.obtener_documento(ids[posicion]).get('extension', '').lower() == '.xlsx'
+            for posicion in posiciones
+        ])
+        similitudes_combinadas = np.where(es_excel, similitudes_combinadas * 1.1, similitudes_combinadas)
         
         resultados = []
         
-        for fragmento_id, embedding_fragmento in self.indexador.embeddings.items():
-            similitud_semantica = self._calcular_similitud(embedding_consulta, embedding_fragmento)
-            
-            texto_fragmento = self.indexador.fragmentos.get(fragmento_id, "")
-            metadatos = self.indexador.metadatos.get(fragmento_id, {})
-            
-            coincidencias_palabras = self._encontrar_coincidencias_palabras(texto_fragmento, palabras_clave)
-            
-            if not coincidencias_palabras:
-                continue
-            
-            num_coincidencias = len(coincidencias_palabras)
-            max_coincidencias = min(len(palabras_clave), 5)
-            boost_coincidencias = min(num_coincidencias / max_coincidencias, 1.0) * 0.4
-            
-            similitud_combinada = (similitud_semantica * 0.7) + boost_coincidencias
-            
-            es_excel = metadatos.get('extension', '').lower() == '.xlsx'
-            if es_excel and num_coincidencias > 0:
-                similitud_combinada *= 1.1
+        for indice in self._seleccionar_top_k(similitudes_combinadas, top_k):
+            fragmento_id = ids[posiciones[indice]]
             
             resultados.append({
                 "id": fragmento_id,
-                "texto": texto_fragmento,
-                "similitud": float(similitud_combinada),
-                "similitud_semantica": float(similitud_semantica),
-                "metadatos": metadatos,
-                "palabras_clave": coincidencias_palabras,
-                "num_coincidencias": num_coincidencias
+                "texto": self.indexador.fragmentos.get(fragmento_id, ""),
+                "similitud": float(similitudes_combinadas[indice]),
+                "similitud_semantica": float(similitudes_semanticas[indice]),
+                "metadatos": self.indexador.obtener_metadatos(fragmento_id),
+                "palabras_clave": coincidencias[indice],
+                "num_coincidencias": len(coincidencias[indice])
             })
         
-        if not resultados:
-            logger.info("No se encontraron resultados con palabras clave exactas, probando búsqueda flexible")
-            return self._busqueda_flexible(consulta, embedding_consulta, palabras_clave, top_k)
-        
-        resultados_ordenados = sorted(resultados, key=lambda x: x["similitud"], reverse=True)
-        
-        return resultados_ordenados[:top_k]
+        return resultados
     
-    def _busqueda_flexible(self, consulta: str, embedding_consulta, palabras_clave: List[str], top_k: int) -> List[Dict[str, Any]]:
+    def _busqueda_flexible(self, consulta: str, embedding_consulta, palabras_clave: List[str], top_k: int,
+                           instantanea=None, ids: List[int] = None,
+                           similitudes: np.ndarray = None) -> List[Dict[str, Any]]:
         """
         Realiza una búsqueda más flexible cuando no hay coincidencias exactas de palabras clave.
         
         Esta función se ejecuta como respaldo cuando la búsqueda principal no encuentra 
-        resultados con coincidencias exactas. Prueba coincidencias parciales y, si aún no
-        hay resultados, recurre a la similitud semántica pura.
+        resultados con coincidencias exactas. Si algún fragmento tiene una similitud de al
+        menos 0.3 se devuelven los más similares por encima de ese umbral, con sus
+        coincidencias parciales de palabras clave; si no, recurre a la similitud semántica
+        pura con el umbral 0.2. Los dos niveles se deciden sobre las mismas similitudes,
+        las que ya calculó la búsqueda principal, sin volver a puntuar el índice.
         
         Args:
             consulta: Consulta original
             embedding_consulta: Embedding ya calculado de la consulta
             palabras_clave: Lista de palabras clave
             top_k: Número máximo de resultados
-            
+            instantanea: Instantánea del índice de la búsqueda (por defecto la actual)
+            ids: IDs de fragmento de la instantánea, de _puntuar_fragmentos
+            similitudes: Similitudes paralelas a ids (si no se indican, se calculan)
+        
         Returns:
             Lista de resultados ordenados por relevancia
         """
+        if similitudes is None:
+            if instantanea is None:
+                instantanea = self.indexador.instantanea()
+            ids, similitudes = self._puntuar_fragmentos(embedding_consulta, instantanea)
+        if len(similitudes) == 0:
+            return []
+        
+        # Todos los fragmentos por encima del umbral superan a los demás, así que los mejores
+        # del umbral son los mejores del índice completo que lo alcanzan
+        buscar_parciales = similitudes.max() >= 0.3
+        umbral = 0.3 if buscar_parciales else 0.2
+        seleccionados = self._seleccionar_top_k(similitudes, top_k)
+        seleccionados = seleccionados[similitudes[seleccionados] >= umbral]
+        
         resultados = []
         
-        for fragmento_id, embedding_fragmento in self.indexador.embeddings.items():
-            similitud_semantica = self._calcular_similitud(embedding_consulta, embedding_fragmento)
-            
-            if similitud_semantica < 0.3:
-                continue
-                
-            texto_fragmento = self.indexador.fragmentos.get(fragmento_id, "")
-            metadatos = self.indexador.metadatos.get(fragmento_id, {})
-            
-            coincidencias_parciales = []
-            for palabra in palabras_clave:
-                if len(palabra) > 3 and palabra.lower() in texto_fragmento.lower():
-                    coincidencias_parciales.append(palabra)
+        for posicion in seleccionados:
+            fragmento_id = ids[posicion]
+            similitud_semantica = float(similitudes[posicion])
+            texto = self.indexador.fragmentos.get(fragmento_id, "")
+            palabras_encontradas = self._coincidencias_parciales(texto, palabras_clave) if buscar_parciales else []
             
             resultados.append({
                 "id": fragmento_id,
-                "texto": texto_fragmento,
-                "similitud": float(similitud_semantica),
-                "similitud_semantica": float(similitud_semantica),
-                "metadatos": metadatos,
-                "palabras_clave": coincidencias_parciales,
-                "num_coincidencias": len(coincidencias_parciales)
+                "texto": texto,
+                "similitud": similitud_semantica,
+                "similitud_semantica": similitud_semantica,
+                "metadatos": self.indexador.obtener_metadatos(fragmento_id),
+                "palabras_clave": palabras_encontradas,
+                "num_coincidencias": len(palabras_encontradas)
             })
         
-        if not resultados:
-            for fragmento_id, embedding_fragmento in self.indexador.embeddings.items():
-                similitud_semantica = self._calcular_similitud(embedding_consulta, embedding_fragmento)
-                
-                if similitud_semantica < 0.2:
-                    continue
-                    
-                texto_fragmento = self.indexador.fragmentos.get(fragmento_id, "")
-                metadatos = self.indexador.metadatos.get(fragmento_id, {})
-                
-                resultados.append({
-                    "id": fragmento_id,
-                    "texto": texto_fragmento,
-                    "similitud": float(similitud_semantica),
-                    "similitud_semantica": float(similitud_semantica),
-                    "metadatos": metadatos,
-                    "palabras_clave": [],
-                    "num_coincidencias": 0
-                })
-        
-        resultados_ordenados = sorted(resultados, key=lambda x: x["similitud"], reverse=True)
-        return resultados_ordenados[:top_k]
+        return resultados
+    
+    def _puntuar_fragmentos(self, embedding_consulta, instantanea=None) -> Tuple[List[int], np.ndarray]:
+        """
+        Calcula la similitud coseno de la consulta contra todos los fragmentos indexados
+        
+        Usa la matriz de embeddings normalizados del indexador, de modo que todas las
+        similitudes se obtienen con un único producto matriz-vector.
+        
+        Args:
+            embedding_consulta: Vector de embedding de la consulta
+            instantanea: Instantánea del índice de la búsqueda (por defecto la actual)
+        
+        Returns:
+            Tupla (ids, similitudes) con los IDs de fragmento y un array float32 paralelo
+        """
+        if instantanea is None:
+            return self.indexador.puntuar(embedding_consulta)
+        return self.indexador.puntuar(embedding_consulta, instantanea)
+    
+    def _similitudes_en(self, embedding_consulta, similitudes: np.ndarray, posiciones: np.ndarray,
+                        instantanea=None) -> np.ndarray:
+        """
+        Obtiene la similitud semántica de los fragmentos en las posiciones indicadas
+        
+        En la búsqueda aproximada los fragmentos fuera de las listas exploradas no tienen
+        similitud (-inf); los que coinciden con las palabras clave se puntúan de forma
+        exacta para que la combinación con las palabras clave no los descarte.
+        
+        Args:
+            embedding_consulta: Vector de embedding de la consulta
+            similitudes: Similitudes devueltas por _puntuar_fragmentos
+            posiciones: Posiciones ascendentes de los fragmentos
+            instantanea: Instantánea del índice de la búsqueda (por defecto la actual)
+        
+        Returns:
+            Array float32 con la similitud de cada posición
+        """
+        seleccionadas = similitudes[posiciones]
+        sin_puntuar = np.flatnonzero(np.isneginf(seleccionadas))
+        if len(sin_puntuar):
+            seleccionadas[sin_puntuar] = self.indexador.puntuar_posiciones(
+                embedding_consulta, posiciones[sin_puntuar], instantanea)
+        return seleccionadas
+    
+    def _seleccionar_top_k(self, puntuaciones: np.ndarray, top_k: int) -> np.ndarray:
+        """
+        Obtiene los índices de las top_k puntuaciones más altas en orden descendente
+        
+        Usa argpartition para no ordenar el array completo. Los empates se resuelven por
+        posición, igual que un ordenamiento estable de todos los resultados.
+        
+        Args:
+            puntuaciones: Array de puntuaciones
+            top_k: Número máximo de índices a devolver
+        
+        Returns:
+            Array de índices ordenados por puntuación descendente
+        """
+        n = len(puntuaciones)
+        
+        if top_k <= 0 or n == 0:
+            return np.zeros(0, dtype=np.int64)
+        
+        if top_k >= n:
+            return np.argsort(-puntuaciones, kind='stable')
+        
+        # Incluir todos los empates con la k-ésima puntuación para conservar el orden estable
+        particion = np.argpartition(-puntuaciones, top_k - 1)[:top_k]
+        umbral = puntuaciones[particion].min()
+        candidatos = np.flatnonzero(puntuaciones >= umbral)
+        orden = np.argsort(-puntuaciones[candidatos], kind='stable')
+        
+        return candidatos[orden][:top_k]
     
     def _extraer_terminos_especificos(self, texto: str) -> List[str]:
         """
@@ -180,7 +410,7 @@ class Buscador:
         
         Args:
             texto: Texto de la consulta del usuario
-            
+        
         Returns:
             Lista de términos específicos encontrados
         """
@@ -192,7 +422,7 @@ class Buscador:
             
             if len(palabra_limpia) < 2:
                 continue
-                
+            
             if palabra_limpia[0].isupper():
                 terminos.append(palabra_limpia)
             
@@ -200,7 +430,7 @@ class Buscador:
                 terminos.append(palabra_limpia)
         
         return terminos
-
+    
     def _extraer_palabras_clave(self, texto: str) -> List[str]:
         """
         Extrae todas las palabras clave importantes de una consulta
@@ -210,7 +440,7 @@ class Buscador:
         
         Args:
             texto: Texto de la consulta del usuario
-            
+        
         Returns:
             Lista de palabras clave encontradas
         """
@@ -264,28 +494,84 @@ class Buscador:
         
         return palabras_clave
     
-    def _encontrar_coincidencias_palabras(self, texto: str, palabras_clave: List[str]) -> List[str]:
+    def _encontrar_coincidencias_palabras(self, palabras_clave: List[str], instantanea=None) -> Dict[int, List[str]]:
         """
-        Encuentra coincidencias exactas de palabras clave en un texto
+        Encuentra los fragmentos con coincidencias exactas de palabras clave
         
-        Busca coincidencias exactas de palabras completas, utilizando límites
-        de palabra en expresiones regulares para evitar coincidencias parciales.
+        Busca coincidencias de palabras completas consultando el índice invertido del
+        indexador, sin recorrer el texto de los fragmentos.
         
         Args:
-            texto: Texto del fragmento donde buscar
             palabras_clave: Lista de palabras clave a buscar
-            
+            instantanea: Instantánea del índice de la búsqueda (por defecto la actual)
+        
         Returns:
-            Lista de palabras clave encontradas en el texto
+            Diccionario de ID de fragmento a la lista de palabras clave encontradas en él
         """
-        coincidencias = []
+        coincidencias = {}
         
         for palabra in palabras_clave:
-            if self._es_coincidencia_exacta(texto, palabra):
-                coincidencias.append(palabra)
+            for fragmento_id in self.indexador.fragmentos_con_termino(palabra, instantanea):
+                coincidencias.setdefault(fragmento_id, []).append(palabra)
         
         return coincidencias
     
+    def _coincidencias_en_candidatos(self, palabras_clave: List[str], similitudes: np.ndarray,
+                                     instantanea) -> Tuple[np.ndarray, List[List[str]]]:
+        """
+        Encuentra las palabras clave exactas de los fragmentos semánticamente más similares
+        
+        Primera etapa de la búsqueda en dos etapas: se eligen los candidatos_semanticos
+        fragmentos con mayor similitud y sólo en ellos se buscan las palabras clave.
+        
+        Args:
+            palabras_clave: Lista de palabras clave a buscar
+            similitudes: Similitudes de todos los fragmentos, de _puntuar_fragmentos
+            instantanea: Instantánea del índice de la búsqueda
+        
+        Returns:
+            Tupla (posiciones, coincidencias) con las posiciones ascendentes de los candidatos
+            con alguna palabra clave y la lista de palabras clave encontradas en cada uno
+        """
+        candidatos = self._seleccionar_top_k(similitudes, self.candidatos_semanticos)
+        # En la búsqueda aproximada los fragmentos sin puntuar (-inf) no son candidatos
+        candidatos = np.sort(candidatos[~np.isneginf(similitudes[candidatos])])
+        
+        coincidencias = [[] for _ in candidatos]
+        for palabra in palabras_clave:
+            for indice in np.flatnonzero(self.indexador.contienen_termino(palabra, candidatos, instantanea)):
+                coincidencias[indice].append(palabra)
+        
+        con_palabras = [indice for indice, palabras in enumerate(coincidencias) if palabras]
+        return candidatos[con_palabras], [coincidencias[indice] for indice in con_palabras]
+    
+    def _coincidencias_parciales(self, texto: str, palabras_clave: List[str]) -> List[str]:
+        """
+        Obtiene las palabras clave con una coincidencia parcial en el texto de un fragmento
+        
+        Una palabra clave de más de 3 caracteres coincide parcialmente si cada uno de sus
+        tokens aparece dentro de algún token del texto (el mismo criterio que
+        Indexador.fragmentos_con_subcadena, pero sólo sobre un fragmento ya elegido).
+        
+        Args:
+            texto: Texto del fragmento
+            palabras_clave: Lista de palabras clave a buscar
+        
+        Returns:
+            Lista de las palabras clave encontradas, en el orden de palabras_clave
+        """
+        tokens_texto = set(tokenizar(texto))
+        encontradas = []
+        
+        for palabra in palabras_clave:
+            tokens = tokenizar(palabra)
+            if len(palabra) <= 3 or not tokens:
+                continue
+            if all(any(token in token_texto for token_texto in tokens_texto) for token in tokens):
+                encontradas.append(palabra)
+        
+        return encontradas
+    
     def _calcular_boost_terminos(self, texto: str, terminos: List[str]) -> float:
         """
         Calcula un factor de impulso basado en la presencia de términos específicos
@@ -295,7 +581,7 @@ class Buscador:
         Args:
             texto: Texto del fragmento donde buscar los términos
             terminos: Lista de términos específicos a buscar
-            
+        
         Returns:
             Factor de boost normalizado entre 0 y 0.5
         """
@@ -327,7 +613,7 @@ class Buscador:
         Args:
             texto: Texto donde buscar
             termino: Término específico a buscar
-            
+        
         Returns:
             True si existe al menos una coincidencia exacta
         """
@@ -344,7 +630,7 @@ class Buscador:
         Args:
             embedding1: Vector de embedding de la consulta
             embedding2: Vector de embedding del fragmento
-            
+        
         Returns:
             Valor de similitud coseno entre 0 y 1
         """
@@ -362,18 +648,31 @@ class Buscador:
         
         Busca los fragmentos más similares a la pregunta, priorizando aquellos con
         coincidencias de palabras clave, y construye una respuesta a partir de ellos.
+        Las respuestas se guardan en la caché de resultados con la versión del índice, de
+        modo que una pregunta repetida se responde sin buscar mientras el índice no cambie.
         
         Args:
             pregunta: Pregunta o consulta del usuario
             num_fragmentos: Número máximo de fragmentos a utilizar
             umbral_similitud: Umbral mínimo de similitud (actualmente no se usa debido 
                              al filtrado por palabras clave)
-            
+        
         Returns:
             Diccionario con la respuesta generada y los fragmentos utilizados
         """
+        clave = None
+        if self.cache_resultados is not None:
+            # La versión se lee antes de buscar: si el índice cambia durante la búsqueda, la
+            # respuesta queda guardada con la versión anterior y no se vuelve a servir
+            clave = (self.indexador.version, self._nombre_modelo(), self.candidatos_semanticos,
+                     normalizar_consulta(pregunta), num_fragmentos, umbral_similitud)
+            resultado = self.cache_resultados.obtener(clave)
+            if resultado is not None:
+                return resultado
+        
         fragmentos_relevantes = self.buscar(pregunta, top_k=num_fragmentos)
         
+        # Sin resultados no se guarda nada: también es lo que devuelve buscar() si falla el modelo
         if not fragmentos_relevantes:
             return {
                 "respuesta": "No se encontraron documentos relevantes para responder esta pregunta.",
@@ -417,8 +716,11 @@ class Buscador:
         for ctx in contexto_fragmentos:
             respuesta += f"Del documento '{ctx['documento']}':\n{ctx['texto']}\n\n"
         
-        return {
+        resultado = {
             "respuesta": respuesta,
             "fragmentos_utilizados": contexto_fragmentos,
             "palabras_clave": palabras_clave
-        } 
\ No newline at end of file
+        }
+        if clave is not None:
+            self.cache_resultados.guardar(clave, resultado)
+        return resultado 
\ No newline at end of file
@@ -0,0 +1,178 @@
+import sys
+import copy
+import time
+import threading
+import unicodedata
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+def normalizar_consulta(consulta: str) -> str:
+    """Forma canónica de una consulta: Unicode NFC y espacios colapsados"""
+    return " ".join(unicodedata.normalize("NFC", str(consulta)).split())
+
+class CacheConsultas:
+    """
+    Caché LRU en memoria de los embeddings de las consultas
+    
+    La clave es la identidad del codificador (modelo y motor) junto con el texto
+    normalizado de la consulta, de modo que una consulta repetida no vuelve a pasar por el
+    modelo. Se puede compartir entre buscadores (por ejemplo, entre generaciones del
+    índice), ya que los embeddings de las consultas no dependen de los documentos.
+    """
+    
+    def __init__(self, capacidad: int = 1024):
+        """
+        Args:
+            capacidad (int): Número máximo de embeddings guardados
+        """
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._bloqueo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+    
+    def __len__(self) -> int:
+        return len(self._entradas)
+    
+    def obtener(self, clave: Hashable) -> Optional[np.ndarray]:
+        """
+        Busca un embedding en la caché
+        
+        Args:
+            clave: (identidad del codificador, consulta normalizada)
+        
+        Returns:
+            np.ndarray: Embedding de sólo lectura, o None si no está
+        """
+        with self._bloqueo:
+            embedding = self._entradas.get(clave)
+            if embedding is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return embedding
+    
+    def guardar(self, clave: Hashable, embedding) -> np.ndarray:
+        """
+        Añade un embedding, descartando el usado hace más tiempo si la caché está llena
+        
+        Returns:
+            np.ndarray: Copia de sólo lectura guardada, que se comparte con los siguientes aciertos
+        """
+        embedding = np.array(embedding, dtype=np.float32)
+        embedding.setflags(write=False)
+        if self.capacidad <= 0:
+            return embedding
+        
+        with self._bloqueo:
+            self._entradas[clave] = embedding
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+        return embedding
+    
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores"""
+        with self._bloqueo:
+            self._entradas.clear()
+            self.aciertos = 0
+            self.fallos = 0
+    
+    def estadisticas(self) -> Dict[str, Any]:
+        """Entradas, capacidad, aciertos, fallos y tasa de aciertos"""
+        consultas = self.aciertos + self.fallos
+        return {"entradas": len(self._entradas), "capacidad": self.capacidad,
+                "aciertos": self.aciertos, "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0}
+
+def _tamano_aproximado(valor) -> int:
+    """Bytes que ocupa en memoria un resultado (diccionarios, listas y valores simples)"""
+    if isinstance(valor, dict):
+        return sys.getsizeof(valor) + sum(_tamano_aproximado(k) + _tamano_aproximado(v) for k, v in valor.items())
+    if isinstance(valor, (list, tuple)):
+        return sys.getsizeof(valor) + sum(_tamano_aproximado(elemento) for elemento in valor)
+    return sys.getsizeof(valor)
+
+class CacheResultados:
+    """
+    Caché en memoria de resultados completos, con caducidad y límite de memoria
+    
+    Las claves deben incluir la versión del índice (Indexador.version), que cambia con
+    cada indexación, eliminación o limpieza: un resultado calculado sobre una versión
+    anterior nunca se vuelve a servir y acaba descartándose. Además, cada entrada caduca a
+    los segundos indicados y, si los resultados guardados superan max_bytes, se descartan
+    los usados hace más tiempo.
+    """
+    
+    def __init__(self, max_bytes: int = 16 * 1024 * 1024, segundos: float = 300):
+        """
+        Args:
+            max_bytes (int): Memoria aproximada máxima de los resultados guardados
+            segundos (float): Tiempo de vida de cada resultado
+        """
+        self.max_bytes = max_bytes
+        self.segundos = segundos
+        self._entradas = OrderedDict()  # clave -> (caducidad, bytes, resultado)
+        self._bytes = 0
+        self._bloqueo = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+    
+    def __len__(self) -> int:
+        return len(self._entradas)
+    
+    def _descartar(self, clave: Hashable):
+        _, tamano, _ = self._entradas.pop(clave)
+        self._bytes -= tamano
+    
+    def obtener(self, clave: Hashable) -> Optional[Any]:
+        """
+        Busca un resultado vigente
+        
+        Returns:
+            Copia del resultado guardado, o None si no está o ha caducado
+        """
+        with self._bloqueo:
+            entrada = self._entradas.get(clave)
+            if entrada is not None and entrada[0] <= time.monotonic():
+                self._descartar(clave)
+                entrada = None
+            if entrada is None:
+                self.fallos += 1
+                return None
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            resultado = entrada[2]
+        return copy.deepcopy(resultado)
+    
+    def guardar(self, clave: Hashable, resultado: Any):
+        """Guarda una copia de un resultado, descartando los más antiguos si no cabe"""
+        resultado = copy.deepcopy(resultado)
+        tamano = _tamano_aproximado(resultado)
+        if tamano > self.max_bytes:
+            return
+        
+        with self._bloqueo:
+            if clave in self._entradas:
+                self._descartar(clave)
+            self._entradas[clave] = (time.monotonic() + self.segundos, tamano, resultado)
+            self._bytes += tamano
+            while self._bytes > self.max_bytes:
+                self._descartar(next(iter(self._entradas)))
+    
+    def limpiar(self):
+        """Vacía la caché y reinicia los contadores"""
+        with self._bloqueo:
+            self._entradas.clear()
+            self._bytes = 0
+            self.aciertos = 0
+            self.fallos = 0
+    
+    def estadisticas(self) -> Dict[str, Any]:
+        """Entradas, bytes ocupados, aciertos, fallos y tasa de aciertos"""
+        consultas = self.aciertos + self.fallos
+        return {"entradas": len(self._entradas), "bytes": self._bytes, "max_bytes": self.max_bytes,
+                "aciertos": self.aciertos, "fallos": self.fallos,
+                "tasa_aciertos": self.aciertos / consultas if consultas else 0.0}
@@ -0,0 +1,148 @@
+import hashlib
+import sqlite3
+import logging
+import threading
+import numpy as np
+from typing import Dict, List
+
+logger = logging.getLogger(__name__)
+
+class CacheEmbeddings:
+    """
+    Caché persistente de embeddings direccionada por contenido
+    
+    La clave de cada entrada es el hash SHA-256 del nombre del modelo y del texto del
+    fragmento, de modo que volver a indexar un texto idéntico (otra vez el mismo archivo,
+    una copia con otro nombre o tras limpiar el índice) reutiliza su embedding sin pasar
+    por el modelo. Las entradas se guardan en SQLite con un contador de último uso y, al
+    superar el máximo de entradas, se descartan las usadas hace más tiempo (LRU).
+    """
+    
+    def __init__(self, ruta: str, nombre_modelo: str, max_entradas: int = 100000):
+        """
+        Abre (o crea) la caché
+        
+        Args:
+            ruta (str): Ruta del archivo SQLite
+            nombre_modelo (str): Nombre o ruta del modelo cuyos embeddings se guardan
+            max_entradas (int): Número máximo de embeddings guardados
+        """
+        self.ruta = ruta
+        self.nombre_modelo = nombre_modelo
+        self.max_entradas = max_entradas
+        
+        # Aciertos y fallos desde la última llamada a reiniciar_estadisticas()
+        self.aciertos = 0
+        self.fallos = 0
+        
+        self._bloqueo = threading.RLock()
+        self._conexion = sqlite3.connect(ruta, check_same_thread=False)
+        self._conexion.execute("PRAGMA journal_mode=WAL")
+        self._conexion.execute("PRAGMA synchronous=NORMAL")
+        self._conexion.execute(
+            "CREATE TABLE IF NOT EXISTS embeddings (clave BLOB PRIMARY KEY, embedding BLOB NOT NULL, uso INTEGER NOT NULL)"
+        )
+        self._conexion.execute("CREATE INDEX IF NOT EXISTS embeddings_uso ON embeddings (uso)")
+        self._conexion.commit()
+        
+        ultimo_uso, entradas = self._conexion.execute("SELECT MAX(uso), COUNT(*) FROM embeddings").fetchone()
+        self._uso = ultimo_uso or 0
+        self._entradas = entradas
+    
+    def clave(self, texto: str) -> bytes:
+        """
+        Calcula la clave de un texto para el modelo de la caché
+        
+        Args:
+            texto (str): Texto del fragmento
+        
+        Returns:
+            bytes: Hash SHA-256 de (modelo, texto)
+        """
+        resumen = hashlib.sha256(self.nombre_modelo.encode('utf-8'))
+        resumen.update(b'\0')
+        resumen.update(texto.encode('utf-8'))
+        return resumen.digest()
+    
+    def obtener_varios(self, claves: List[bytes]) -> Dict[bytes, np.ndarray]:
+        """
+        Busca varios embeddings y marca como recién usados los encontrados
+        
+        Args:
+            claves: Claves calculadas con clave()
+        
+        Returns:
+            dict: Embeddings float32 encontrados, por clave
+        """
+        encontrados = {}
+        unicas = list(dict.fromkeys(claves))
+        
+        with self._bloqueo:
+            # SQLite limita el número de parámetros de una consulta
+            for inicio in range(0, len(unicas), 500):
+                tanda = unicas[inicio:inicio + 500]
+                marcadores = ",".join("?" * len(tanda))
+                for clave, datos in self._conexion.execute(
+                        f"SELECT clave, embedding FROM embeddings WHERE clave IN ({marcadores})", tanda):
+                    encontrados[bytes(clave)] = np.frombuffer(datos, dtype=np.float32).copy()
+            
+            if encontrados:
+                self._uso += 1
+                self._conexion.executemany("UPDATE embeddings SET uso = ? WHERE clave = ?",
+                                           [(self._uso, clave) for clave in encontrados])
+                self._conexion.commit()
+            
+            self.aciertos += sum(1 for clave in claves if clave in encontrados)
+            self.fallos += sum(1 for clave in claves if clave not in encontrados)
+        
+        return encontrados
+    
+    def guardar_varios(self, claves: List[bytes], embeddings):
+        """
+        Guarda varios embeddings y descarta los menos usados si se supera el máximo
+        
+        Args:
+            claves: Claves calculadas con clave()
+            embeddings: Embeddings en el mismo orden que las claves
+        """
+        if self.max_entradas <= 0 or not len(claves):
+            return
+        
+        with self._bloqueo:
+            self._uso += 1
+            filas = [(clave, np.asarray(embedding, dtype=np.float32).tobytes(), self._uso)
+                     for clave, embedding in zip(claves, embeddings)]
+            self._conexion.executemany("INSERT OR REPLACE INTO embeddings (clave, embedding, uso) VALUES (?, ?, ?)",
+                                       filas)
+            self._entradas = self._conexion.execute("SELECT COUNT(*) FROM embeddings").fetchone()[0]
+            
+            sobrantes = self._entradas - self.max_entradas
+            if sobrantes > 0:
+                self._conexion.execute(
+                    "DELETE FROM embeddings WHERE clave IN (SELECT clave FROM embeddings ORDER BY uso LIMIT ?)",
+                    (sobrantes,))
+                self._entradas -= sobrantes
+                logger.info(f"Caché de embeddings: descartadas {sobrantes} entradas menos usadas")
+            
+            self._conexion.commit()
+    
+    def __len__(self) -> int:
+        return self._entradas
+    
+    def tasa_aciertos(self) -> float:
+        """Proporción de aciertos desde la última llamada a reiniciar_estadisticas()"""
+        total = self.aciertos + self.fallos
+        return self.aciertos / total if total else 0.0
+    
+    def reiniciar_estadisticas(self):
+        """Pone a cero los contadores de aciertos y fallos"""
+        self.aciertos = 0
+        self.fallos = 0
+    
+    def limpiar(self):
+        """Elimina todas las entradas y libera el espacio en disco"""
+        with self._bloqueo:
+            self._conexion.execute("DELETE FROM embeddings")
+            self._conexion.commit()
+            self._conexion.execute("VACUUM")
+            self._entradas = 0
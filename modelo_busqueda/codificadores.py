@@ -0,0 +1,295 @@
+import os
+import json
+import logging
+import numpy as np
+from typing import List, Optional, Union
+
+logger = logging.getLogger(__name__)
+
+# Archivos de un modelo exportado con exportar_onnx()
+ARCHIVO_MODELO_ONNX = "model.onnx"
+ARCHIVO_CONFIGURACION_ONNX = "codificador.json"
+
+class Codificador:
+    """
+    Interfaz común de los modelos que generan los embeddings
+    
+    Expone la parte de la API de SentenceTransformer que usan el indexador y el buscador
+    (encode, tokenizer, max_seq_length y el pool multiproceso), de modo que el motor de
+    inferencia se elige en config.py sin tocar el resto del código.
+    """
+    
+    # Identificador del motor, usado en la configuración y en las claves de la caché de embeddings
+    tipo = None
+    # Si el codificador puede repartir lotes entre varios procesos (start_multi_process_pool)
+    admite_multiproceso = False
+    
+    def __init__(self, ruta_modelo: str):
+        self.ruta_modelo = ruta_modelo
+        self.tokenizer = None
+        self.max_seq_length = 128
+    
+    @classmethod
+    def nombre_para(cls, ruta_modelo: str) -> str:
+        """Identifica el modelo y el motor: embeddings de motores distintos no son intercambiables"""
+        return f"{ruta_modelo}#{cls.tipo}"
+    
+    @property
+    def nombre(self) -> str:
+        return self.nombre_para(self.ruta_modelo)
+    
+    def encode(self, textos: Union[str, List[str]], batch_size: int = 32,
+               show_progress_bar: bool = False) -> np.ndarray:
+        """
+        Genera los embeddings de uno o varios textos
+        
+        Args:
+            textos: Texto o lista de textos
+            batch_size (int): Textos que se codifican juntos en cada lote
+            show_progress_bar (bool): Si se muestra una barra de progreso
+        
+        Returns:
+            np.ndarray: Vector del texto, o matriz con una fila por texto
+        """
+        raise NotImplementedError
+    
+    def start_multi_process_pool(self, target_devices=None):
+        raise NotImplementedError(f"El codificador {self.tipo} no admite varios procesos")
+    
+    def encode_multi_process(self, textos, pool, batch_size: int = 32, chunk_size: Optional[int] = None):
+        raise NotImplementedError(f"El codificador {self.tipo} no admite varios procesos")
+    
+    def stop_multi_process_pool(self, pool):
+        raise NotImplementedError(f"El codificador {self.tipo} no admite varios procesos")
+
+class CodificadorSentenceTransformers(Codificador):
+    """Modelo de SentenceTransformer en float32, el motor original del proyecto"""
+    
+    tipo = 'sentence-transformers'
+    admite_multiproceso = True
+    
+    def __init__(self, ruta_modelo: str):
+        """
+        Carga el modelo
+        
+        Args:
+            ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+        """
+        super().__init__(ruta_modelo)
+        from sentence_transformers import SentenceTransformer
+        self.modelo = SentenceTransformer(ruta_modelo)
+        self.tokenizer = self.modelo.tokenizer
+        self.max_seq_length = self.modelo.max_seq_length
+    
+    @classmethod
+    def nombre_para(cls, ruta_modelo: str) -> str:
+        # Sin sufijo, para conservar las entradas de la caché creadas antes de existir otros motores
+        return ruta_modelo
+    
+    def encode(self, textos, batch_size=32, show_progress_bar=False):
+        return self.modelo.encode(textos, batch_size=batch_size, show_progress_bar=show_progress_bar)
+    
+    def start_multi_process_pool(self, target_devices=None):
+        return self.modelo.start_multi_process_pool(target_devices=target_devices)
+    
+    def encode_multi_process(self, textos, pool, batch_size=32, chunk_size=None):
+        return self.modelo.encode_multi_process(textos, pool, batch_size=batch_size, chunk_size=chunk_size)
+    
+    def stop_multi_process_pool(self, pool):
+        self.modelo.stop_multi_process_pool(pool)
+
+class CodificadorTorchInt8(CodificadorSentenceTransformers):
+    """
+    El mismo modelo con cuantización dinámica int8 de PyTorch
+    
+    Los pesos de las capas lineales se guardan en int8 y las activaciones se cuantizan al
+    vuelo en cada llamada, lo que reduce la memoria del modelo y acelera la inferencia en
+    CPU a cambio de una pequeña pérdida de precisión en los embeddings.
+    """
+    
+    tipo = 'torch-int8'
+    # El pool multiproceso serializa el modelo hacia procesos nuevos, y no está comprobado
+    # que los módulos cuantizados dinámicamente conserven la cuantización en ese viaje
+    admite_multiproceso = False
+    
+    def __init__(self, ruta_modelo: str):
+        """
+        Carga el modelo y cuantiza sus capas lineales
+        
+        Args:
+            ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+        """
+        super().__init__(ruta_modelo)
+        import torch
+        self.modelo = torch.quantization.quantize_dynamic(self.modelo, {torch.nn.Linear}, dtype=torch.qint8)
+    
+    @classmethod
+    def nombre_para(cls, ruta_modelo: str) -> str:
+        return f"{ruta_modelo}#{cls.tipo}"
+
+class CodificadorOnnx(Codificador):
+    """
+    Modelo exportado a ONNX y ejecutado con ONNX Runtime
+    
+    Se carga desde un directorio local creado con exportar_onnx(), que contiene el grafo
+    del transformer, su tokenizador y la configuración de pooling del modelo original.
+    """
+    
+    tipo = 'onnx'
+    
+    def __init__(self, ruta_modelo: str, hilos: int = 0):
+        """
+        Carga el modelo exportado
+        
+        Args:
+            ruta_modelo (str): Directorio creado con exportar_onnx()
+            hilos (int): Hilos de ONNX Runtime por operación (0 deja que elija ONNX Runtime)
+        """
+        super().__init__(ruta_modelo)
+        try:
+            import onnxruntime
+            from transformers import AutoTokenizer
+        except ImportError as e:
+            raise ImportError("El codificador 'onnx' necesita los paquetes onnxruntime y transformers") from e
+        
+        ruta_grafo = os.path.join(ruta_modelo, ARCHIVO_MODELO_ONNX)
+        if not os.path.exists(ruta_grafo):
+            raise FileNotFoundError(f"No existe {ruta_grafo}; exporte el modelo con exportar_onnx()")
+        
+        with open(os.path.join(ruta_modelo, ARCHIVO_CONFIGURACION_ONNX), 'r', encoding='utf-8') as f:
+            configuracion = json.load(f)
+        self.max_seq_length = configuracion["max_seq_length"]
+        self.pooling = configuracion.get("pooling", "mean")
+        self.normalizar = configuracion.get("normalizar", False)
+        
+        opciones = onnxruntime.SessionOptions()
+        opciones.intra_op_num_threads = hilos
+        self.sesion = onnxruntime.InferenceSession(ruta_grafo, opciones, providers=['CPUExecutionProvider'])
+        self._entradas = [entrada.name for entrada in self.sesion.get_inputs()]
+        self.tokenizer = AutoTokenizer.from_pretrained(ruta_modelo)
+    
+    def encode(self, textos, batch_size=32, show_progress_bar=False):
+        un_texto = isinstance(textos, str)
+        if un_texto:
+            textos = [textos]
+        if not textos:
+            return np.zeros((0, 0), dtype=np.float32)
+        
+        # Ordenar por longitud, como SentenceTransformer, para que cada lote tenga poco relleno
+        orden = np.argsort([-len(texto) for texto in textos], kind='stable')
+        lotes = []
+        for inicio in range(0, len(textos), batch_size):
+            lote = [textos[i] for i in orden[inicio:inicio + batch_size]]
+            lotes.append(self._codificar_lote(lote))
+        
+        embeddings = np.empty((len(textos), lotes[0].shape[1]), dtype=np.float32)
+        embeddings[orden] = np.concatenate(lotes)
+        return embeddings[0] if un_texto else embeddings
+    
+    def _codificar_lote(self, textos: List[str]) -> np.ndarray:
+        """Ejecuta el modelo sobre un lote y aplica el pooling del modelo original"""
+        entrada = self.tokenizer(textos, padding=True, truncation=True,
+                                 max_length=self.max_seq_length, return_tensors='np')
+        alimentacion = {nombre: entrada[nombre].astype(np.int64) for nombre in self._entradas if nombre in entrada}
+        if 'token_type_ids' in self._entradas and 'token_type_ids' not in alimentacion:
+            alimentacion['token_type_ids'] = np.zeros_like(entrada['input_ids'], dtype=np.int64)
+        
+        tokens = self.sesion.run(None, alimentacion)[0]
+        if self.pooling == 'cls':
+            embeddings = tokens[:, 0]
+        else:
+            mascara = entrada['attention_mask'][:, :, None].astype(np.float32)
+            embeddings = (tokens * mascara).sum(axis=1) / np.clip(mascara.sum(axis=1), 1e-9, None)
+        
+        if self.normalizar:
+            embeddings = embeddings / np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+        return embeddings.astype(np.float32)
+
+# Motores disponibles, por el nombre usado en config.py
+CODIFICADORES = {clase.tipo: clase for clase in (CodificadorSentenceTransformers, CodificadorTorchInt8, CodificadorOnnx)}
+
+def crear_codificador(tipo: str, ruta_modelo: str, ruta_onnx: Optional[str] = None) -> Codificador:
+    """
+    Crea el codificador del motor indicado
+    
+    Args:
+        tipo (str): 'sentence-transformers', 'torch-int8' u 'onnx'
+        ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+        ruta_onnx (str): Directorio del modelo exportado, necesario para el motor 'onnx'
+    
+    Returns:
+        Codificador: Codificador con el modelo cargado
+    """
+    if tipo not in CODIFICADORES:
+        raise ValueError(f"Codificador no soportado: {tipo}")
+    if tipo == 'onnx':
+        if not ruta_onnx:
+            raise ValueError("El codificador 'onnx' necesita la ruta del modelo exportado")
+        return CodificadorOnnx(ruta_onnx)
+    return CODIFICADORES[tipo](ruta_modelo)
+
+def nombre_codificador(tipo: str, ruta_modelo: str, ruta_onnx: Optional[str] = None) -> str:
+    """
+    Devuelve el nombre que tendrá un codificador sin necesidad de cargar el modelo
+    
+    Args:
+        tipo (str): Motor del codificador
+        ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+        ruta_onnx (str): Directorio del modelo exportado, para el motor 'onnx'
+    
+    Returns:
+        str: Nombre usado en las claves de la caché de embeddings
+    """
+    if tipo not in CODIFICADORES:
+        raise ValueError(f"Codificador no soportado: {tipo}")
+    return CODIFICADORES[tipo].nombre_para(ruta_onnx if tipo == 'onnx' else ruta_modelo)
+
+def exportar_onnx(ruta_modelo: str, directorio_salida: str, opset: int = 14):
+    """
+    Exporta el transformer de un modelo de SentenceTransformer a ONNX
+    
+    Guarda en el directorio el grafo (con dimensiones de lote y secuencia variables), el
+    tokenizador y la longitud máxima y el pooling del modelo, todo lo que CodificadorOnnx
+    necesita para reproducir sus embeddings sin sentence-transformers ni PyTorch.
+    
+    Args:
+        ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+        directorio_salida (str): Directorio donde se guarda el modelo exportado
+        opset (int): Versión del conjunto de operadores ONNX
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+    
+    modelo = SentenceTransformer(ruta_modelo, device='cpu')
+    transformer = modelo[0].auto_model.eval()
+    os.makedirs(directorio_salida, exist_ok=True)
+    
+    # Pooling y normalización de los módulos que siguen al transformer
+    pooling = 'mean'
+    normalizar = False
+    for modulo in list(modelo)[1:]:
+        clase = type(modulo).__name__
+        if clase == 'Pooling' and getattr(modulo, 'pooling_mode_cls_token', False):
+            pooling = 'cls'
+        elif clase == 'Normalize':
+            normalizar = True
+        elif clase != 'Pooling':
+            logger.warning(f"El módulo {clase} del modelo no se reproduce en ONNX")
+    
+    ejemplo = modelo.tokenizer(["texto de ejemplo"], return_tensors='pt')
+    entradas = ['input_ids', 'attention_mask']
+    ejes = {nombre: {0: 'lote', 1: 'secuencia'} for nombre in entradas}
+    ejes['token_embeddings'] = {0: 'lote', 1: 'secuencia'}
+    
+    logger.info(f"Exportando {ruta_modelo} a {directorio_salida}...")
+    with torch.no_grad():
+        torch.onnx.export(transformer, (ejemplo['input_ids'], ejemplo['attention_mask']),
+                          os.path.join(directorio_salida, ARCHIVO_MODELO_ONNX),
+                          input_names=entradas, output_names=['token_embeddings'],
+                          dynamic_axes=ejes, opset_version=opset)
+    
+    modelo.tokenizer.save_pretrained(directorio_salida)
+    with open(os.path.join(directorio_salida, ARCHIVO_CONFIGURACION_ONNX), 'w', encoding='utf-8') as f:
+        json.dump({"modelo": ruta_modelo, "max_seq_length": modelo.max_seq_length,
+                   "pooling": pooling, "normalizar": normalizar}, f, ensure_ascii=False, indent=2)
+    logger.info("Modelo exportado correctamente")
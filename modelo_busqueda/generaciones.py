@@ -0,0 +1,158 @@
+import os
+import re
+import shutil
+import logging
+import threading
+from typing import List, Optional
+from .persistencia import escribir_atomico
+
+logger = logging.getLogger(__name__)
+
+# Archivo con el nombre de la generación activa
+ARCHIVO_ACTIVA = "GENERACION_ACTIVA"
+# Archivos del directorio raíz comunes a todas las generaciones
+ARCHIVOS_COMPARTIDOS = ("cache_embeddings.db", "cache_embeddings.db-wal", "cache_embeddings.db-shm")
+PATRON_GENERACION = re.compile(r'^generacion_(\d+)$')
+
+class GeneracionesIndice:
+    """
+    Generaciones del índice en disco, para reconstruirlo sin dejar de servir búsquedas
+    
+    Cada generación es un subdirectorio completo con los datos de un indexador. Una
+    reconstrucción escribe en una generación nueva mientras la activa sigue sirviendo
+    consultas; al terminar, activar() cambia el puntero a la nueva (escrito de forma
+    atómica, por lo que tras una caída se abre siempre una generación completa) y la
+    anterior se elimina. Las generaciones que no son la activa al arrancar proceden de
+    reconstrucciones interrumpidas y se descartan con limpiar_huerfanas().
+    """
+    
+    def __init__(self, directorio_raiz: str):
+        """
+        Abre las generaciones de un directorio de datos
+        
+        Si el directorio tiene los archivos de un índice anterior a las generaciones, se
+        mueven a la primera generación.
+        
+        Args:
+            directorio_raiz (str): Directorio de datos del índice
+        """
+        self.directorio_raiz = directorio_raiz
+        self._lock = threading.Lock()
+        os.makedirs(directorio_raiz, exist_ok=True)
+        
+        self.activa = self._leer_activa()
+        if self.activa is None:
+            self.activa = self._crear_primera()
+    
+    def _leer_activa(self) -> Optional[str]:
+        ruta = os.path.join(self.directorio_raiz, ARCHIVO_ACTIVA)
+        if not os.path.exists(ruta):
+            return None
+        with open(ruta, 'r', encoding='utf-8') as f:
+            nombre = f.read().strip()
+        if not os.path.isdir(os.path.join(self.directorio_raiz, nombre)):
+            logger.error(f"La generación activa {nombre} no existe; se empieza con un índice vacío")
+            return None
+        return nombre
+    
+    def _crear_primera(self) -> str:
+        """Crea la primera generación con los archivos de índice que haya en la raíz"""
+        nombre = self._nombre(self._ultimo_numero() + 1)
+        directorio = os.path.join(self.directorio_raiz, nombre)
+        os.makedirs(directorio)
+        
+        movidos = 0
+        for entrada in os.listdir(self.directorio_raiz):
+            if (entrada in ARCHIVOS_COMPARTIDOS or entrada == ARCHIVO_ACTIVA
+                    or PATRON_GENERACION.match(entrada)):
+                continue
+            os.replace(os.path.join(self.directorio_raiz, entrada), os.path.join(directorio, entrada))
+            movidos += 1
+        if movidos:
+            logger.info(f"Movidos {movidos} archivos del índice existente a la generación {nombre}")
+        
+        self._escribir_activa(nombre)
+        return nombre
+    
+    @staticmethod
+    def _nombre(numero: int) -> str:
+        return f"generacion_{numero:06d}"
+    
+    def _ultimo_numero(self) -> int:
+        numeros = [int(coincidencia.group(1)) for coincidencia in map(PATRON_GENERACION.match,
+                                                                     os.listdir(self.directorio_raiz))
+                   if coincidencia]
+        return max(numeros, default=0)
+    
+    def _escribir_activa(self, nombre: str):
+        escribir_atomico(os.path.join(self.directorio_raiz, ARCHIVO_ACTIVA), lambda f: f.write(nombre))
+    
+    def directorio_activo(self) -> str:
+        """Devuelve el directorio de la generación activa"""
+        return os.path.join(self.directorio_raiz, self.activa)
+    
+    def ruta_compartida(self, nombre: str) -> str:
+        """Devuelve la ruta de un archivo común a todas las generaciones"""
+        return os.path.join(self.directorio_raiz, nombre)
+    
+    def generaciones(self) -> List[str]:
+        """Devuelve los directorios de todas las generaciones en disco"""
+        return sorted(os.path.join(self.directorio_raiz, entrada) for entrada in os.listdir(self.directorio_raiz)
+                      if PATRON_GENERACION.match(entrada))
+    
+    def nueva(self) -> str:
+        """
+        Crea el directorio vacío de una nueva generación
+        
+        Returns:
+            str: Directorio de la generación, todavía inactiva
+        """
+        with self._lock:
+            directorio = os.path.join(self.directorio_raiz, self._nombre(self._ultimo_numero() + 1))
+            os.makedirs(directorio)
+        logger.info(f"Creada la generación {os.path.basename(directorio)} del índice")
+        return directorio
+    
+    def activar(self, directorio: str) -> str:
+        """
+        Convierte una generación en la activa
+        
+        Args:
+            directorio (str): Directorio de la generación, creado con nueva()
+        
+        Returns:
+            str: Directorio de la generación que estaba activa
+        """
+        with self._lock:
+            anterior = self.directorio_activo()
+            nombre = os.path.basename(os.path.normpath(directorio))
+            self._escribir_activa(nombre)
+            self.activa = nombre
+        logger.info(f"Generación activa del índice: {nombre}")
+        return anterior
+    
+    def eliminar(self, directorio: str):
+        """
+        Borra una generación inactiva
+        
+        En Linux los archivos que aún tengan abiertos las búsquedas en curso siguen siendo
+        legibles hasta que se cierran. Si no se puede borrar (por ejemplo, en Windows con
+        archivos abiertos), limpiar_huerfanas() lo reintentará en el siguiente arranque.
+        
+        Args:
+            directorio (str): Directorio de la generación
+        """
+        if os.path.normpath(directorio) == os.path.normpath(self.directorio_activo()):
+            raise ValueError("No se puede eliminar la generación activa")
+        try:
+            shutil.rmtree(directorio)
+            logger.info(f"Eliminada la generación {os.path.basename(directorio)} del índice")
+        except Exception as e:
+            logger.error(f"Error al eliminar la generación {directorio}: {e}")
+    
+    def limpiar_huerfanas(self):
+        """Borra las generaciones que no son la activa (reconstrucciones interrumpidas)"""
+        activo = os.path.normpath(self.directorio_activo())
+        for directorio in self.generaciones():
+            if os.path.normpath(directorio) != activo:
+                self.eliminar(directorio)
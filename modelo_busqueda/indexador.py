@@ -1,21 +1,61 @@
 import os
+import re
 import json
-import pickle
-from sentence_transformers import SentenceTransformer
 import numpy as np
-from typing import List, Dict, Any, Tuple
+from typing import List, Dict, Any, Tuple, Set, Iterable
 import logging
+import time
 import datetime
+import atexit
+import itertools
+import threading
+from .bitacora import Bitacora
+from .almacen_embeddings import AlmacenEmbeddings
+from .segmentos import IndiceSegmentos, Instantanea
+from .almacen_textos import AlmacenTextos
+from .persistencia import escribir_atomico
+from .tabla_fragmentos import TablaFragmentos
+from .manifiesto import Manifiesto
+from .cache_embeddings import CacheEmbeddings
+from .codificadores import nombre_codificador
+from .registro_modelos import registro_modelos
+from . import migracion
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Un token es una secuencia de caracteres de palabra, igual que lo que delimita \b en una regex
+PATRON_TOKEN = re.compile(r'\w+')
+
+# Versiones del contenido de los índices, únicas en todo el proceso: un indexador nuevo (por
+# ejemplo, tras cambiar de generación) nunca repite la versión de otro
+_versiones = itertools.count(1)
+
+def tokenizar(texto: str) -> List[str]:
+    """
+    Normaliza y divide un texto en los tokens usados por el índice invertido
+    
+    Args:
+        texto (str): Texto a tokenizar
+    
+    Returns:
+        List[str]: Tokens en minúsculas, en el orden en que aparecen
+    """
+    return PATRON_TOKEN.findall(texto.lower())
+
 class Indexador:
     """Clase encargada de indexar documentos y crear embeddings para búsqueda"""
     
     def __init__(self, ruta_modelo="paraphrase-multilingual-MiniLM-L12-v2", 
-                 directorio_datos="indexados_datos", tamano_fragmento=300, solapamiento=50):
+                 directorio_datos="indexados_datos", tamano_fragmento=300, solapamiento=50,
+                 tamano_lote=32, max_bytes_bitacora=64 * 1024 * 1024, max_segundos_bitacora=300,
+                 tipo_embeddings='float32', comprimir_textos=True, capacidad_cache_textos=1024,
+                 max_entradas_cache_embeddings=100000, modo_fragmentacion='caracteres',
+                 solapamiento_tokens=16, procesos_codificacion=1, tipo_codificador='sentence-transformers',
+                 ruta_modelo_onnx=None, cache_embeddings=None, capacidad_segmento_memoria=4096,
+                 factor_fusion_segmentos=4, umbral_compactacion=0.3, umbral_ann=0, nprobe_ann=16,
+                 min_filas_ivf=16384, tipo_puntuacion='float32', filas_reevaluadas=200):
         """
         Inicializa el indexador
         
@@ -24,127 +64,856 @@ class Indexador:
             directorio_datos (str): Directorio donde guardar los datos indexados
             tamano_fragmento (int): Tamaño aproximado de cada fragmento de texto en caracteres
             solapamiento (int): Cantidad de solapamiento entre fragmentos sucesivos
+            tamano_lote (int): Número de fragmentos que se codifican juntos en cada lote
+            max_bytes_bitacora (int): Tamaño de la bitácora que dispara un punto de control
+            max_segundos_bitacora (float): Tiempo máximo entre puntos de control con cambios pendientes
+            tipo_embeddings (str): Tipo de dato de la matriz de embeddings guardada ('float32' o 'float16')
+            comprimir_textos (bool): Si el texto de los fragmentos se guarda comprimido con zlib
+            capacidad_cache_textos (int): Número de textos de fragmento que se mantienen en memoria
+            max_entradas_cache_embeddings (int): Embeddings guardados en la caché por contenido (0 la desactiva)
+            modo_fragmentacion (str): 'caracteres' usa tamano_fragmento y solapamiento; 'tokens' llena
+                                      cada fragmento hasta la longitud máxima de entrada del modelo
+            solapamiento_tokens (int): Tokens compartidos entre fragmentos sucesivos en el modo 'tokens'
+            procesos_codificacion (int): Procesos que generan embeddings en las indexaciones masivas
+                                         (1 codifica en el proceso actual)
+            tipo_codificador (str): Motor de inferencia: 'sentence-transformers', 'torch-int8' u 'onnx'
+            ruta_modelo_onnx (str): Directorio del modelo exportado a ONNX (sólo para 'onnx')
+            cache_embeddings (CacheEmbeddings): Caché de embeddings ya abierta, para compartirla con
+                                                otros indexadores; si no se indica se usa la del
+                                                directorio de datos
+            capacidad_segmento_memoria (int): Fragmentos nuevos que se acumulan en memoria antes
+                                              de congelarlos en un segmento
+            factor_fusion_segmentos (int): Segmentos del mismo tamaño que el hilo de fusión
+                                           combina en uno (0 desactiva la fusión)
+            umbral_compactacion (float): Proporción de datos eliminados a partir de la cual el
+                                         índice se compacta solo en segundo plano (0 lo desactiva)
+            umbral_ann (int): Fragmentos a partir de los cuales la etapa semántica usa la búsqueda
+                              aproximada (IVF) en lugar de la exacta (0 la desactiva)
+            nprobe_ann (int): Listas del IVF exploradas en cada segmento en la búsqueda aproximada;
+                              más listas dan más exhaustividad y más latencia
+            min_filas_ivf (int): Filas a partir de las cuales un segmento lleva índice IVF
+            tipo_puntuacion (str): Tipo de la copia en memoria con la que se puntúan las consultas:
+                                   'float32' (la matriz guardada), 'float16' o 'int8'
+            filas_reevaluadas (int): Con 'float16' o 'int8', mejores fragmentos de cada segmento
+                                     cuya similitud se recalcula con la matriz completa
         """
+        if modo_fragmentacion not in ('caracteres', 'tokens'):
+            raise ValueError(f"Modo de fragmentación no soportado: {modo_fragmentacion}")
+        
+        self.ruta_modelo = ruta_modelo
+        self.tipo_codificador = tipo_codificador
+        self.ruta_modelo_onnx = ruta_modelo_onnx
+        self._modelo = None  # Codificador propio; si no se asigna, el del registro de modelos
+        self._presupuesto_tokens = None  # Se calcula con el tokenizador del modelo en su primer uso
         self.tamano_fragmento = tamano_fragmento
         self.solapamiento = solapamiento
+        self.modo_fragmentacion = modo_fragmentacion
+        self.solapamiento_tokens = solapamiento_tokens
+        self.tamano_lote = tamano_lote
+        self.procesos_codificacion = procesos_codificacion
+        self._pool = None  # Pool multiproceso del modelo, creado en la primera indexación que lo necesite
+        self.tipo_embeddings = tipo_embeddings
         self.directorio_datos = directorio_datos
         
         # Crear directorio de datos si no existe
         if not os.path.exists(directorio_datos):
             os.makedirs(directorio_datos)
-            
-        # Cargar el modelo de embeddings
-        try:
-            logger.info(f"Cargando modelo de embeddings {ruta_modelo}...")
-            self.modelo = SentenceTransformer(ruta_modelo)
-            logger.info("Modelo cargado correctamente")
-        except Exception as e:
-            logger.error(f"Error al cargar el modelo: {e}")
-            raise
-            
-        # Diccionarios para almacenar datos
-        self.embeddings = {}  # Mapa de ID de fragmento a su embedding
-        self.fragmentos = {}  # Mapa de ID de fragmento a su texto
-        self.metadatos = {}   # Mapa de ID de fragmento a sus metadatos
-
+        
+        # Tokens de los fragmentos generados y cuántos de ellos quedan fuera de la entrada del modelo
+        self.estadisticas_fragmentacion = {"fragmentos": 0, "fragmentos_truncados": 0,
+                                           "tokens": 0, "tokens_truncados": 0}
+        
+        # Los escritores (indexación, eliminación, puntos de control) se excluyen entre sí;
+        # las búsquedas no lo toman y leen una instantánea de los segmentos
+        self._bloqueo = threading.RLock()
+        self._bloqueo_compactacion = threading.Lock()  # Una sola compactación a la vez
+        self._hilo_compactacion = None
+        self.umbral_compactacion = umbral_compactacion
+        
+        # Estructuras para almacenar datos
+        self._capacidad_segmento_memoria = capacidad_segmento_memoria
+        self._factor_fusion_segmentos = factor_fusion_segmentos
+        self.umbral_ann = umbral_ann
+        self.nprobe_ann = nprobe_ann
+        # Los segmentos sólo llevan IVF si la búsqueda aproximada está activada
+        self._min_filas_ivf = min_filas_ivf if umbral_ann > 0 else 0
+        self.tipo_puntuacion = tipo_puntuacion
+        self.filas_reevaluadas = filas_reevaluadas
+        # Embeddings normalizados y términos de los fragmentos, en segmentos inmutables
+        self.segmentos = IndiceSegmentos(directorio_datos, tipo_embeddings, capacidad_segmento_memoria,
+                                         factor_fusion_segmentos, self._min_filas_ivf, tipo_puntuacion)
+        # Texto de cada fragmento, guardado en disco y leído bajo demanda
+        self.fragmentos = AlmacenTextos(os.path.join(directorio_datos, "fragmentos.db"),
+                                        comprimir=comprimir_textos,
+                                        capacidad_cache=capacidad_cache_textos)
+        self.tabla = TablaFragmentos()  # Columnas por fragmento; el ID de fragmento es su fila
+        self.documentos = {}  # Mapa de ID de documento a sus metadatos
+        self._documentos_por_nombre = {}  # Mapa de nombre de documento a su ID
+        self.fragmentos_por_documento = {}  # Mapa de ID de documento a los IDs de sus fragmentos
+        self._siguiente_documento = 0
+        
+        # Bitácora de cambios desde el último punto de control
+        self.bitacora = Bitacora(os.path.join(directorio_datos, "bitacora.jsonl"),
+                                 max_bytes=max_bytes_bitacora,
+                                 max_segundos=max_segundos_bitacora)
+        
+        # Embeddings ya calculados por (modelo y motor, texto); se conserva al limpiar el índice
+        self.cache_embeddings = cache_embeddings
+        if cache_embeddings is None and max_entradas_cache_embeddings > 0:
+            self.cache_embeddings = CacheEmbeddings(os.path.join(directorio_datos, "cache_embeddings.db"),
+                                                    nombre_codificador(tipo_codificador, ruta_modelo, ruta_modelo_onnx),
+                                                    max_entradas=max_entradas_cache_embeddings)
+        
+        # Archivos fuente indexados, para reindexar sólo los que cambien
+        self.manifiesto = Manifiesto(os.path.join(directorio_datos, "manifiesto.json"))
+        
         # Cargar datos existentes
         self._cargar_datos()
+        self.segmentos.iniciar_fusion()
+        self.version = next(_versiones)
+    
+    @property
+    def modelo(self):
+        """
+        Codificador de embeddings, compartido con el resto del proceso
+        
+        El modelo no se carga al crear el indexador sino la primera vez que se necesita (o
+        antes, si se precarga con registro_modelos.precargar()), de modo que el índice
+        está disponible mientras el modelo se carga.
+        """
+        if self._modelo is not None:
+            return self._modelo
+        return registro_modelos.obtener(self.tipo_codificador, self.ruta_modelo, self.ruta_modelo_onnx)
+    
+    @modelo.setter
+    def modelo(self, modelo):
+        # Permite usar un codificador ajeno al registro (p. ej. uno sintético en los benchmarks)
+        self._modelo = modelo
+        self._presupuesto_tokens = None
+    
+    @property
+    def nombre_modelo(self) -> str:
+        """Identidad del codificador (modelo y motor), sin cargarlo; se usa en las claves de las cachés"""
+        if self._modelo is not None:
+            return getattr(self._modelo, 'nombre', None) or f"{type(self._modelo).__name__}@{id(self._modelo):x}"
+        return nombre_codificador(self.tipo_codificador, self.ruta_modelo, self.ruta_modelo_onnx)
+    
+    def _nueva_version(self):
+        """
+        Cambia la versión del índice tras publicar un cambio en su contenido
+        
+        Las cachés de resultados incluyen la versión en sus claves; quien la use debe leerla
+        antes de tomar la instantánea, de modo que un resultado calculado antes de un cambio
+        nunca quede guardado con la versión posterior.
+        """
+        self.version = next(_versiones)
+    
+    @property
+    def presupuesto_tokens(self) -> int:
+        """Tokens que caben en una entrada del modelo, descontando los especiales ([CLS], [SEP]...)"""
+        if self._presupuesto_tokens is None:
+            modelo = self.modelo
+            tokenizador = modelo.tokenizer
+            especiales = tokenizador.num_special_tokens_to_add() if hasattr(tokenizador, 'num_special_tokens_to_add') else 2
+            self._presupuesto_tokens = max(1, modelo.max_seq_length - especiales)
+        return self._presupuesto_tokens
+    
+    def reconfigurar(self, tamano_fragmento: int = None, solapamiento: int = None,
+                     modo_fragmentacion: str = None, solapamiento_tokens: int = None):
+        """
+        Cambia los parámetros de fragmentación sin recargar el modelo ni el índice
+        
+        Sólo afecta a los documentos que se indexen a partir de ahora: para aplicarlos a
+        todo el índice hay que reindexarlo (los embeddings de los fragmentos que no cambien
+        se reutilizan desde la caché de embeddings).
+        
+        Args:
+            tamano_fragmento (int): Nuevo tamaño de fragmento en caracteres
+            solapamiento (int): Nuevo solapamiento en caracteres
+            modo_fragmentacion (str): 'caracteres' o 'tokens'
+            solapamiento_tokens (int): Nuevo solapamiento en tokens
+        """
+        if modo_fragmentacion is not None and modo_fragmentacion not in ('caracteres', 'tokens'):
+            raise ValueError(f"Modo de fragmentación no soportado: {modo_fragmentacion}")
+        
+        if tamano_fragmento is not None:
+            self.tamano_fragmento = tamano_fragmento
+        if solapamiento is not None:
+            self.solapamiento = solapamiento
+        if modo_fragmentacion is not None:
+            self.modo_fragmentacion = modo_fragmentacion
+        if solapamiento_tokens is not None:
+            self.solapamiento_tokens = solapamiento_tokens
+        logger.info(f"Fragmentación: modo {self.modo_fragmentacion}, tamaño {self.tamano_fragmento}, "
+                    f"solapamiento {self.solapamiento} caracteres / {self.solapamiento_tokens} tokens")
     
     def _cargar_datos(self):
-        """Carga datos indexados previamente si existen"""
-        ruta_embeddings = os.path.join(self.directorio_datos, "embeddings.pkl")
-        ruta_fragmentos = os.path.join(self.directorio_datos, "fragmentos.json")
-        ruta_metadatos = os.path.join(self.directorio_datos, "metadatos.json")
+        """
+        Carga datos indexados previamente si existen
+        
+        Tras leer los archivos base se reaplican las entradas de la bitácora, de modo que
+        no se pierde ningún cambio posterior al último punto de control. Los índices del
+        formato anterior (metadatos completos por fragmento) se migran una única vez, y los
+        guardados antes de los segmentos (una matriz y un índice invertido JSON) se
+        importan como un único segmento.
+        """
+        ruta_documentos = os.path.join(self.directorio_datos, "documentos.json")
+        ruta_tabla = os.path.join(self.directorio_datos, "tabla_fragmentos.npz")
         
         try:
-            if os.path.exists(ruta_embeddings):
-                with open(ruta_embeddings, 'rb') as f:
-                    self.embeddings = pickle.load(f)
-                logger.info(f"Embeddings cargados: {len(self.embeddings)} fragmentos")
-                
-            if os.path.exists(ruta_fragmentos):
-                with open(ruta_fragmentos, 'r', encoding='utf-8') as f:
-                    self.fragmentos = json.load(f)
-                    
-            if os.path.exists(ruta_metadatos):
-                with open(ruta_metadatos, 'r', encoding='utf-8') as f:
-                    self.metadatos = json.load(f)
+            if migracion.hay_formato_anterior(self.directorio_datos):
+                self._migrar_formato_anterior()
+                return
+            
+            if os.path.exists(ruta_documentos):
+                with open(ruta_documentos, 'r', encoding='utf-8') as f:
+                    datos = json.load(f)
+                for doc_id, metadatos in datos["documentos"].items():
+                    self._aplicar_documento(int(doc_id), metadatos)
+                self._siguiente_documento = max(self._siguiente_documento, datos["siguiente_id"])
+            
+            if os.path.exists(ruta_tabla):
+                self.tabla.cargar(ruta_tabla)
+            
+            if os.path.exists(ruta_documentos) and "fragmentos" in datos:
+                self.fragmentos_por_documento.update(
+                    (int(doc_id), ids) for doc_id, ids in datos["fragmentos"].items())
+            else:
+                # Índices guardados antes de persistir el mapa documento -> fragmentos
+                self.fragmentos_por_documento.update(self.tabla.agrupar_por_documento())
+            
+            importado = False
+            if self.segmentos.cargar():
+                logger.info(f"Segmentos cargados: {len(self.segmentos)} fragmentos")
+            else:
+                importado = self._importar_almacen_anterior()
+            
+            # Reaplicar los cambios registrados después del último punto de control; las
+            # altas consecutivas se añaden a los segmentos en un solo lote
+            entradas = 0
+            altas = []
+            for entrada in self.bitacora.leer():
+                if entrada["op"] == "documento":
+                    self._aplicar_documento(entrada["id"], entrada["metadatos"])
+                elif entrada["op"] == "alta":
+                    altas.append((entrada["id"], entrada["documento"], entrada["numero"],
+                                  entrada["inicio"], entrada["fin"], entrada["posicion"],
+                                  entrada["texto"], entrada["embedding"]))
+                elif entrada["op"] == "baja_documento":
+                    self._aplicar_altas(altas, reaplicando=True)
+                    altas = []
+                    self._aplicar_baja_documento(entrada["id"], entrada["ids"])
+                entradas += 1
+            self._aplicar_altas(altas, reaplicando=True)
+            self.fragmentos.confirmar()
+            
+            if entradas:
+                logger.info(f"Bitácora reaplicada: {entradas} entradas. Total fragmentos: {len(self.segmentos)}")
+            
+            if importado:
+                self._guardar_datos()
+                self._eliminar_almacen_anterior()
         except Exception as e:
             logger.error(f"Error al cargar datos indexados: {e}")
             # Reiniciar para evitar problemas
-            self.embeddings = {}
-            self.fragmentos = {}
-            self.metadatos = {}
+            self.segmentos = IndiceSegmentos(self.directorio_datos, self.tipo_embeddings,
+                                             self._capacidad_segmento_memoria, self._factor_fusion_segmentos,
+                                             self._min_filas_ivf, self.tipo_puntuacion)
+            self.fragmentos.limpiar()
+            self.tabla = TablaFragmentos()
+            self.documentos = {}
+            self._documentos_por_nombre = {}
+            self.fragmentos_por_documento = {}
+            self._siguiente_documento = 0
+            # Los archivos del manifiesto ya no están en el índice
+            self.manifiesto.limpiar()
+    
+    def _importar_almacen_anterior(self) -> bool:
+        """
+        Importa como un segmento la matriz única de embeddings y el índice invertido JSON
+        
+        Returns:
+            bool: True si había un almacén anterior a los segmentos
+        """
+        embeddings = AlmacenEmbeddings(self.directorio_datos, self.tipo_embeddings)
+        if not embeddings.cargar():
+            return False
+        
+        ids, matriz = embeddings.obtener_matriz()
+        ruta_indice = os.path.join(self.directorio_datos, "indice_invertido.json")
+        if os.path.exists(ruta_indice):
+            with open(ruta_indice, 'r', encoding='utf-8') as f:
+                terminos = json.load(f)
+        else:
+            # Índices guardados antes de existir el índice invertido
+            logger.info("Construyendo índice invertido a partir de los fragmentos existentes...")
+            terminos = {}
+            for fragmento_id, texto in self.fragmentos.items():
+                for token in set(tokenizar(texto)):
+                    terminos.setdefault(token, []).append(fragmento_id)
+        
+        self.segmentos.importar(ids, matriz, terminos)
+        logger.info(f"Importados {len(ids)} embeddings del almacén anterior a los segmentos")
+        return True
+    
+    def _eliminar_almacen_anterior(self):
+        """Elimina la matriz única de embeddings y el índice invertido JSON anteriores a los segmentos"""
+        AlmacenEmbeddings(self.directorio_datos, self.tipo_embeddings).limpiar()
+        ruta_indice = os.path.join(self.directorio_datos, "indice_invertido.json")
+        if os.path.exists(ruta_indice):
+            os.remove(ruta_indice)
+    
+    def _migrar_formato_anterior(self):
+        """
+        Convierte un índice con metadatos completos por fragmento al formato columnar
+        
+        Los fragmentos se agrupan por documento y se vuelven a dar de alta con IDs enteros
+        reutilizando sus embeddings, sin volver a codificar ningún texto.
+        """
+        logger.info("Migrando índice con IDs de texto a la tabla de fragmentos...")
+        embeddings = AlmacenEmbeddings(self.directorio_datos, self.tipo_embeddings)
+        documentos = migracion.leer_formato_anterior(self.directorio_datos, embeddings,
+                                                     self.fragmentos, self.bitacora)
+        
+        embeddings.limpiar()
+        self.fragmentos.limpiar()
+        
+        altas = []
+        for metadatos, fragmentos_documento in documentos:
+            doc_id = self._siguiente_documento
+            self._aplicar_documento(doc_id, metadatos)
+            for campos, texto, embedding in fragmentos_documento:
+                altas.append((self.tabla.num_filas + len(altas), doc_id, campos['numero'], campos['inicio'],
+                              campos['fin'], campos['posicion'], texto, embedding))
+        self._aplicar_altas(altas)
+        
+        self._guardar_datos()
+        migracion.eliminar_formato_anterior(self.directorio_datos)
+        logger.info(f"Migración completada: {len(self.documentos)} documentos, {len(self.tabla)} fragmentos")
+    
+    def instantanea(self) -> Instantanea:
+        """
+        Devuelve el estado actual de los embeddings y términos del índice
+        
+        Una búsqueda debe tomar una sola instantánea y usarla en todas sus fases (puntuar,
+        posiciones_en_matriz, fragmentos_con_termino...), de modo que vea un estado
+        coherente aunque otros hilos estén indexando o eliminando documentos.
+        
+        Returns:
+            Instantanea: Vista inmutable de los segmentos
+        """
+        return self.segmentos.instantanea()
+    
+    def obtener_matriz(self) -> Tuple[List[int], np.ndarray]:
+        """
+        Devuelve la matriz de embeddings normalizados junto con los IDs de sus filas
+        
+        La matriz se construye concatenando las filas vivas de todos los segmentos; para
+        puntuar una consulta es preferible puntuar(), que no la copia.
+        
+        Returns:
+            Tuple[List[int], np.ndarray]: IDs de fragmento y matriz de forma (n, dim) cuyas
+            filas tienen norma 1 (o 0 si el embedding original era nulo)
+        """
+        return self.instantanea().obtener_matriz()
+    
+    def posiciones_en_matriz(self, ids_fragmentos: Iterable[int], instantanea: Instantanea = None) -> np.ndarray:
+        """
+        Traduce IDs de fragmento a sus posiciones en el resultado de puntuar
+        
+        Args:
+            ids_fragmentos: IDs de fragmento a localizar
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+        
+        Returns:
+            np.ndarray: Posiciones correspondientes, ordenadas de forma ascendente. Los IDs
+            que no están en el índice se ignoran.
+        """
+        if instantanea is None:
+            instantanea = self.instantanea()
+        return instantanea.posiciones(ids_fragmentos)
+    
+    def puntuar(self, embedding_consulta, instantanea: Instantanea = None,
+                nprobe: int = None) -> Tuple[List[int], np.ndarray]:
+        """
+        Calcula la similitud coseno de una consulta con todos los fragmentos
+        
+        Con un índice de al menos umbral_ann fragmentos la búsqueda es aproximada: en los
+        segmentos con IVF sólo se puntúan las filas de las nprobe_ann listas más cercanas
+        y el resto recibe -inf (ver puntuar_posiciones para completarlas). Con tipo_puntuacion
+        'float16' o 'int8' las similitudes son aproximadas salvo las de los filas_reevaluadas
+        mejores fragmentos de cada segmento.
+        
+        Args:
+            embedding_consulta: Vector de embedding de la consulta
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+            nprobe (int): Listas del IVF a explorar; 0 fuerza la búsqueda exacta (por defecto
+                          se decide con umbral_ann y nprobe_ann)
+        
+        Returns:
+            Tuple[List[int], np.ndarray]: IDs de fragmento y similitudes float32 paralelas
+        """
+        if instantanea is None:
+            instantanea = self.instantanea()
+        if nprobe is None:
+            nprobe = self.nprobe_ann if 0 < self.umbral_ann <= len(instantanea) else 0
+        
+        consulta = np.asarray(embedding_consulta, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        
+        if norma == 0:
+            ids = instantanea.ids
+            return ids, np.zeros(len(ids), dtype=np.float32)
+        
+        return instantanea.puntuar(consulta / norma, nprobe, self.filas_reevaluadas)
+    
+    def puntuar_lote(self, embeddings_consultas, instantanea: Instantanea = None) -> Tuple[List[int], np.ndarray]:
+        """
+        Calcula la similitud coseno de varias consultas con todos los fragmentos
+        
+        Todas las consultas se puntúan con un producto matriz-matriz por segmento. La
+        búsqueda es siempre exacta, aunque el índice supere umbral_ann; con tipo_puntuacion
+        'float16' o 'int8' se recalculan los filas_reevaluadas mejores fragmentos de cada
+        segmento para cada consulta.
+        
+        Args:
+            embeddings_consultas: Embeddings de las consultas, uno por fila
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+        
+        Returns:
+            Tuple[List[int], np.ndarray]: IDs de fragmento y similitudes float32 de forma
+            (consultas, fragmentos)
+        """
+        if instantanea is None:
+            instantanea = self.instantanea()
+        
+        consultas = np.atleast_2d(np.asarray(embeddings_consultas, dtype=np.float32))
+        normas = np.linalg.norm(consultas, axis=1, keepdims=True)
+        # Una consulta nula tiene similitud 0 con todos los fragmentos, como en puntuar()
+        return instantanea.puntuar_lote(consultas / np.where(normas > 0, normas, 1), self.filas_reevaluadas)
+    
+    def puntuar_posiciones(self, embedding_consulta, posiciones: np.ndarray,
+                           instantanea: Instantanea = None) -> np.ndarray:
+        """
+        Calcula la similitud coseno exacta de una consulta con algunos fragmentos
+        
+        Args:
+            embedding_consulta: Vector de embedding de la consulta
+            posiciones (np.ndarray): Posiciones ascendentes en el resultado de puntuar
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+        
+        Returns:
+            np.ndarray: Similitudes float32 paralelas a posiciones
+        """
+        if instantanea is None:
+            instantanea = self.instantanea()
+        
+        consulta = np.asarray(embedding_consulta, dtype=np.float32)
+        norma = np.linalg.norm(consulta)
+        
+        if norma == 0:
+            return np.zeros(len(posiciones), dtype=np.float32)
+        return instantanea.puntuar_posiciones(consulta / norma, posiciones)
+    
+    def _aplicar_documento(self, doc_id: int, metadatos: Dict[str, Any]):
+        """Registra un documento y sus metadatos en la tabla de documentos"""
+        self.documentos[doc_id] = metadatos
+        self._documentos_por_nombre[metadatos['nombre']] = doc_id
+        self.fragmentos_por_documento.setdefault(doc_id, [])
+        self._siguiente_documento = max(self._siguiente_documento, doc_id + 1)
+    
+    def _aplicar_altas(self, altas: List[Tuple[int, int, int, int, int, int, str, Any]],
+                       reaplicando: bool = False):
+        """
+        Añade (o reemplaza) un lote de fragmentos en las estructuras del índice
+        
+        Los fragmentos se publican en los segmentos después de añadirse a la tabla, de modo
+        que una búsqueda nunca encuentra un fragmento sin su fila. El texto queda pendiente
+        en el almacén de textos hasta que se llama a confirmar().
+        
+        Args:
+            altas: Tuplas (fragmento_id, doc_id, numero, inicio, fin, posicion, texto, embedding)
+            reaplicando (bool): Si las altas vienen de la bitácora al cargar el índice
+        """
+        if not altas:
+            return
+        
+        # Sólo ocurre al reaplicar una bitácora cuyos cambios ya estaban en los archivos base
+        reemplazados = [alta[0] for alta in altas if self.tabla.es_vivo(alta[0])]
+        if reaplicando:
+            # Un punto de control interrumpido puede haber guardado los segmentos o la tabla
+            # sin vaciar la bitácora, así que la tabla no dice qué fragmentos tienen ya los
+            # segmentos: se retiran todos (los ausentes se ignoran) antes de volver a añadirlos
+            self.segmentos.eliminar([alta[0] for alta in altas])
+        elif reemplazados:
+            self.segmentos.eliminar(reemplazados)
+        for fragmento_id in reemplazados:
+            documento_anterior = int(self.tabla.documento[fragmento_id])
+            ids_anteriores = self.fragmentos_por_documento.get(documento_anterior, [])
+            if fragmento_id in ids_anteriores:
+                ids_anteriores.remove(fragmento_id)
+        
+        for fragmento_id, doc_id, numero, inicio, fin, posicion, texto, _ in altas:
+            self.tabla.agregar(doc_id, numero, inicio, fin, posicion, fila=fragmento_id)
+            self.fragmentos_por_documento.setdefault(doc_id, []).append(fragmento_id)
+            self.fragmentos.agregar(fragmento_id, texto)
+        
+        self.segmentos.agregar([alta[0] for alta in altas], [alta[7] for alta in altas],
+                               [set(tokenizar(alta[6])) for alta in altas])
+    
+    def _aplicar_baja_documento(self, doc_id: int, ids_fragmentos: Iterable[int]):
+        """Quita un documento y los fragmentos indicados de las estructuras del índice"""
+        ids_fragmentos = [int(fragmento_id) for fragmento_id in ids_fragmentos]
+        
+        # Primero se retiran de los segmentos, para que las búsquedas dejen de encontrarlos
+        self.segmentos.eliminar(ids_fragmentos)
+        for fragmento_id in ids_fragmentos:
+            self.fragmentos.eliminar(fragmento_id)
+            self.tabla.eliminar(fragmento_id)
+        
+        self.fragmentos_por_documento.pop(doc_id, None)
+        metadatos = self.documentos.pop(doc_id, None)
+        if metadatos is not None and self._documentos_por_nombre.get(metadatos['nombre']) == doc_id:
+            del self._documentos_por_nombre[metadatos['nombre']]
+    
+    def obtener_documento(self, fragmento_id: int) -> Dict[str, Any]:
+        """
+        Obtiene los metadatos del documento al que pertenece un fragmento
+        
+        El diccionario devuelto es compartido por todos los fragmentos del documento y no
+        debe modificarse.
+        
+        Args:
+            fragmento_id (int): ID del fragmento
+        
+        Returns:
+            dict: Metadatos del documento, o un diccionario vacío si el fragmento no existe
+        """
+        if not self.tabla.es_vivo(fragmento_id):
+            return {}
+        return self.documentos.get(int(self.tabla.documento[fragmento_id]), {})
+    
+    def obtener_metadatos(self, fragmento_id: int) -> Dict[str, Any]:
+        """
+        Obtiene los metadatos completos de un fragmento
+        
+        Combina los metadatos de su documento con los campos propios del fragmento
+        (número, palabras inicial y final, y página o línea).
+        
+        Args:
+            fragmento_id (int): ID del fragmento
+        
+        Returns:
+            dict: Metadatos nuevos del fragmento, o un diccionario vacío si no existe
+        """
+        documento = self.obtener_documento(fragmento_id)
+        if not documento:
+            return {}
+        
+        fila = self.tabla.fila(fragmento_id)
+        metadatos = dict(documento)
+        metadatos["fragmento_num"] = fila['numero']
+        metadatos["fragmento_inicio"] = fila['inicio']
+        metadatos["fragmento_fin"] = fila['fin']
+        
+        if fila['posicion'] >= 0:
+            if documento.get('extension') == '.pdf':
+                metadatos["pagina"] = fila['posicion']
+            else:
+                metadatos["linea"] = fila['posicion']
+        
+        return metadatos
+    
+    def nombres_documentos(self) -> List[str]:
+        """Devuelve los nombres de todos los documentos indexados"""
+        return list(self._documentos_por_nombre)
+    
+    def fragmentos_de_documento(self, nombre_documento: str) -> List[int]:
+        """
+        Obtiene los fragmentos de un documento sin recorrer el resto del índice
+        
+        Args:
+            nombre_documento (str): Nombre del documento
+        
+        Returns:
+            List[int]: IDs de sus fragmentos en orden, o lista vacía si no está indexado
+        """
+        doc_id = self._documentos_por_nombre.get(nombre_documento)
+        if doc_id is None:
+            return []
+        return list(self.fragmentos_por_documento.get(doc_id, []))
+    
+    def fragmentos_con_termino(self, termino: str, instantanea: Instantanea = None) -> Set[int]:
+        """
+        Obtiene los fragmentos que contienen un término como palabra completa
+        
+        Equivale a buscar el término con límites de palabra (\\b) sin distinguir mayúsculas.
+        Si el término contiene varios tokens (p. ej. "covid-19") se exige que aparezcan todos.
+        
+        Args:
+            termino (str): Término a buscar
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+        
+        Returns:
+            Set[int]: IDs de fragmento que contienen el término
+        """
+        tokens = tokenizar(termino)
+        if not tokens:
+            return set()
+        
+        if instantanea is None:
+            instantanea = self.instantanea()
+        return instantanea.fragmentos_con_tokens(tokens)
+    
+    def contienen_termino(self, termino: str, posiciones: np.ndarray, instantanea: Instantanea = None) -> np.ndarray:
+        """
+        Indica qué fragmentos de los indicados contienen un término como palabra completa
+        
+        Aplica el criterio de fragmentos_con_termino sólo a unas posiciones (por ejemplo,
+        los candidatos de la etapa semántica), sin recorrer todas las apariciones del término.
+        
+        Args:
+            termino (str): Término a buscar
+            posiciones (np.ndarray): Posiciones ascendentes en el resultado de puntuar
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+        
+        Returns:
+            np.ndarray: Máscara booleana paralela a posiciones
+        """
+        tokens = tokenizar(termino)
+        if not tokens:
+            return np.zeros(len(posiciones), dtype=bool)
+        
+        if instantanea is None:
+            instantanea = self.instantanea()
+        return instantanea.contienen_tokens(posiciones, tokens)
+    
+    def fragmentos_con_subcadena(self, termino: str, instantanea: Instantanea = None) -> Set[int]:
+        """
+        Obtiene los fragmentos con algún token que contiene el término como subcadena
+        
+        Recorre el vocabulario del índice en lugar del texto de cada fragmento.
+        
+        Args:
+            termino (str): Término a buscar
+            instantanea (Instantanea): Estado del índice de la búsqueda (por defecto el actual)
+        
+        Returns:
+            Set[int]: IDs de fragmento con una coincidencia parcial del término
+        """
+        tokens = tokenizar(termino)
+        if not tokens:
+            return set()
+        
+        if instantanea is None:
+            instantanea = self.instantanea()
+        return instantanea.fragmentos_con_subcadenas(tokens)
     
     def _guardar_datos(self):
         """
-        Guarda los datos indexados en disco
+        Guarda los datos indexados en disco (punto de control)
+        
+        Reescribe los archivos base con el estado completo en memoria y, una vez escritos,
+        vacía la bitácora porque sus cambios ya están incluidos en ellos. El manifiesto de
+        los segmentos es lo último que se escribe antes de vaciarla; si el proceso se
+        interrumpe antes, al cargar se reaplica la bitácora completa sobre los segmentos
+        anteriores (ver _aplicar_altas).
         """
-        ruta_embeddings = os.path.join(self.directorio_datos, "embeddings.pkl")
-        ruta_fragmentos = os.path.join(self.directorio_datos, "fragmentos.json")
-        ruta_metadatos = os.path.join(self.directorio_datos, "metadatos.json")
+        ruta_documentos = os.path.join(self.directorio_datos, "documentos.json")
+        ruta_tabla = os.path.join(self.directorio_datos, "tabla_fragmentos.npz")
         
         try:
-            # Crear directorio si no existe
-            os.makedirs(self.directorio_datos, exist_ok=True)
-            
-            # Guardar embeddings (usando pickle por ser arrays numpy)
-            with open(ruta_embeddings, 'wb') as f:
-                pickle.dump(self.embeddings, f)
-            
-            # Para fragmentos, simplemente asegurar que sean strings
-            fragmentos_serializables = {}
-            for fragmento_id, texto in self.fragmentos.items():
-                fragmentos_serializables[fragmento_id] = str(texto)
-            
-            with open(ruta_fragmentos, 'w', encoding='utf-8') as f:
-                json.dump(fragmentos_serializables, f, ensure_ascii=False, indent=2)
-            
-            # Para metadatos, asegurar que todos los valores sean serializables
-            metadatos_serializables = {}
-            for doc_id, metadatos in self.metadatos.items():
-                # Crear una copia de los metadatos para no modificar el original
-                metadatos_doc = {}
+            with self._bloqueo:
+                # Crear directorio si no existe
+                os.makedirs(self.directorio_datos, exist_ok=True)
                 
-                # Asegurar que todos los valores sean serializables
-                for key, value in metadatos.items():
-                    if isinstance(value, (datetime.datetime, datetime.date)):
-                        metadatos_doc[key] = str(value)
-                    elif not isinstance(value, (str, int, float, bool, list, dict, type(None))):
-                        try:
-                            # Intentar serializar a JSON como prueba
-                            json.dumps(value)
-                            metadatos_doc[key] = value
-                        except (TypeError, OverflowError):
-                            metadatos_doc[key] = str(value)
-                    else:
-                        metadatos_doc[key] = value
+                # Los textos ya están en su almacén; sólo hay que confirmar los cambios pendientes
+                self.fragmentos.confirmar()
                 
-                metadatos_serializables[doc_id] = metadatos_doc
-            
-            with open(ruta_metadatos, 'w', encoding='utf-8') as f:
-                json.dump(metadatos_serializables, f, ensure_ascii=False, indent=2)
+                # Columnas por fragmento y metadatos de cada documento (una sola vez por documento)
+                self.tabla.guardar(ruta_tabla)
+                documentos = {"siguiente_id": self._siguiente_documento, "documentos": self.documentos,
+                              "fragmentos": self.fragmentos_por_documento}
+                escribir_atomico(ruta_documentos, lambda f: json.dump(documentos, f, ensure_ascii=False))
+                
+                # Guardar los segmentos nuevos, las marcas de borrado y, al final, su manifiesto
+                self.segmentos.guardar()
                 
-            logger.info(f"Datos guardados correctamente. Total fragmentos: {len(self.embeddings)}")
+                # Los cambios de la bitácora ya están en los archivos base
+                self.bitacora.vaciar()
+            
+            logger.info(f"Datos guardados correctamente. Total fragmentos: {len(self.segmentos)}")
         except Exception as e:
             logger.error(f"Error al guardar datos indexados: {e}")
             import traceback
             logger.error(traceback.format_exc())
     
-    def _fragmentar_texto(self, texto: str, metadatos: Dict[str, Any]) -> List[Tuple[str, Dict]]:
+    def _guardar_si_necesario(self):
+        """Hace un punto de control si la bitácora superó su umbral de tamaño o tiempo"""
+        if self.bitacora.requiere_punto_control():
+            logger.info(f"Punto de control: compactando bitácora de {self.bitacora.tamano()} bytes")
+            self._guardar_datos()
+    
+    def proporcion_eliminada(self) -> float:
+        """
+        Proporción del índice ocupada por datos eliminados que aún no se han descartado
+        
+        Es la mayor entre la de filas eliminadas en los segmentos y la de páginas libres en
+        el almacén de textos.
+        """
+        estadisticas = self.segmentos.estadisticas()
+        proporcion = estadisticas["filas_eliminadas"] / max(estadisticas["filas"], 1)
+        return max(proporcion, self.fragmentos.proporcion_libre())
+    
+    def _compactar_si_necesario(self):
+        """Compacta el índice en segundo plano si los datos eliminados superan el umbral"""
+        if self.umbral_compactacion <= 0 or self._bloqueo_compactacion.locked():
+            return
+        
+        proporcion = self.proporcion_eliminada()
+        if proporcion < self.umbral_compactacion:
+            return
+        
+        logger.info(f"Datos eliminados: {proporcion:.0%} del índice; compactando en segundo plano")
+        self._hilo_compactacion = threading.Thread(target=self.compactar, daemon=True, name="compactacion-indice")
+        self._hilo_compactacion.start()
+    
+    def _tamano_en_disco(self) -> int:
+        """Bytes que ocupan los archivos del índice (sin la caché de embeddings)"""
+        total = 0
+        for entrada in os.scandir(self.directorio_datos):
+            if entrada.is_file() and not entrada.name.startswith("cache_embeddings.db"):
+                total += entrada.stat().st_size
+        return total
+    
+    def _eliminar_huerfanos(self) -> int:
+        """
+        Elimina los fragmentos que siguen vivos sin pertenecer a ningún documento
+        
+        Returns:
+            int: Número de fragmentos eliminados
+        """
+        for doc_id in [doc_id for doc_id in self.fragmentos_por_documento if doc_id not in self.documentos]:
+            del self.fragmentos_por_documento[doc_id]
+        
+        referenciados = np.zeros(self.tabla.num_filas, dtype=bool)
+        for ids_fragmentos in self.fragmentos_por_documento.values():
+            referenciados[ids_fragmentos] = True
+        huerfanos = np.flatnonzero(self.tabla.vivo & ~referenciados).tolist()
+        
+        # Filas de los segmentos cuyo fragmento ya no está vivo en la tabla
+        ids = np.asarray(self.instantanea().ids, dtype=np.int64)
+        vivos = np.zeros(len(ids), dtype=bool)
+        en_tabla = ids < self.tabla.num_filas
+        vivos[en_tabla] = self.tabla.vivo[ids[en_tabla]]
+        muertos = ids[~vivos]
+        
+        self.segmentos.eliminar(huerfanos + muertos.tolist())
+        for fragmento_id in huerfanos:
+            self.tabla.eliminar(fragmento_id)
+        self.fragmentos.eliminar_varios(huerfanos)
+        return len(huerfanos) + len(muertos)
+    
+    def compactar(self) -> Dict[str, Any]:
+        """
+        Reescribe el índice sin fragmentos eliminados ni huérfanos y libera su espacio
+        
+        Fusiona todos los segmentos en uno sin las filas eliminadas (matriz y términos),
+        elimina los fragmentos que no pertenecen a ningún documento y los textos que ya no
+        corresponden a ningún fragmento vivo, hace un punto de control y devuelve al sistema
+        el espacio libre del almacén de textos. Las búsquedas continúan durante toda la
+        compactación; las indexaciones sólo esperan en el barrido inicial y en el punto de
+        control. Los IDs de fragmento no cambian.
+        
+        Returns:
+            dict: Informe con los bytes en disco antes y después, los recuperados, los
+            fragmentos descartados y la duración
+        """
+        with self._bloqueo_compactacion:
+            inicio = time.perf_counter()
+            bytes_antes = self._tamano_en_disco()
+            segmentos_antes = self.segmentos.estadisticas()["segmentos"]
+            
+            with self._bloqueo:
+                huerfanos = self._eliminar_huerfanos()
+                if huerfanos:
+                    # Los fragmentos huérfanos todavía podían aparecer en las búsquedas
+                    self._nueva_version()
+            filas_descartadas = self.segmentos.compactar()
+            
+            with self._bloqueo:
+                self._guardar_datos()
+                vivos = set(np.flatnonzero(self.tabla.vivo).tolist())
+                textos_sobrantes = [fragmento_id for fragmento_id in self.fragmentos.keys()
+                                    if fragmento_id not in vivos]
+                self.fragmentos.eliminar_varios(textos_sobrantes)
+                self.fragmentos.confirmar()
+            self.fragmentos.compactar()
+            
+            bytes_despues = self._tamano_en_disco()
+            informe = {
+                "bytes_antes": bytes_antes,
+                "bytes_despues": bytes_despues,
+                "bytes_recuperados": bytes_antes - bytes_despues,
+                "filas_descartadas": filas_descartadas,
+                "fragmentos_huerfanos": huerfanos,
+                "textos_sobrantes": len(textos_sobrantes),
+                "segmentos_antes": segmentos_antes,
+                "segmentos_despues": self.segmentos.estadisticas()["segmentos"],
+                "segundos": round(time.perf_counter() - inicio, 3),
+            }
+        
+        logger.info(f"Índice compactado en {informe['segundos']} s: {informe['bytes_recuperados']} bytes "
+                    f"recuperados, {filas_descartadas} filas eliminadas descartadas, {huerfanos} fragmentos "
+                    f"huérfanos y {len(textos_sobrantes)} textos sobrantes")
+        return informe
+    
+    @staticmethod
+    def _serializar_metadatos(metadatos: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Crea una copia de los metadatos en la que todos los valores son serializables a JSON
+        
+        Args:
+            metadatos (dict): Metadatos originales
+        
+        Returns:
+            dict: Copia serializable de los metadatos
+        """
+        metadatos_serializables = {}
+        
+        for key, value in metadatos.items():
+            if isinstance(value, (datetime.datetime, datetime.date)):
+                metadatos_serializables[key] = str(value)
+            elif not isinstance(value, (str, int, float, bool, list, dict, type(None))):
+                try:
+                    # Intentar serializar a JSON como prueba
+                    json.dumps(value)
+                    metadatos_serializables[key] = value
+                except (TypeError, OverflowError):
+                    metadatos_serializables[key] = str(value)
+            else:
+                metadatos_serializables[key] = value
+        
+        return metadatos_serializables
+    
+    def _fragmentar_texto(self, texto: str, metadatos: Dict[str, Any]) -> List[Tuple[str, Dict[str, int]]]:
         """
         Divide el texto en fragmentos más pequeños para indexar, conservando información de página o línea
         
+        Los límites de los fragmentos dependen de modo_fragmentacion (ver _rangos_por_caracteres
+        y _rangos_por_tokens); en ambos modos se acumulan las estadísticas de truncamiento.
+        
         Args:
             texto (str): Texto completo a fragmentar
             metadatos (dict): Metadatos del documento original
-            
+        
         Returns:
-            List[Tuple[str, Dict]]: Lista de tuplas (fragmento, metadatos_fragment)
+            List[Tuple[str, Dict[str, int]]]: Lista de tuplas (fragmento, campos) donde campos
+            contiene 'numero', 'inicio', 'fin' y 'posicion' (página o línea, -1 si no se conoce)
         """
         if not texto or len(texto.strip()) == 0:
             return []
-            
+        
         fragmentos = []
         
         # Detectar y procesar marcadores de posición (página o línea)
@@ -183,135 +952,408 @@ class Indexador:
             # Incrementar línea si no es PDF
             if metadatos['extension'] != '.pdf':
                 linea_actual += 1
-                
+        
         # Ahora fragmentar el texto procesado
         palabras = texto_procesado
         
         if len(palabras) == 0:
             return []
-            
-        # Estimar cuántas palabras equivalen al tamaño de fragmento deseado
-        palabras_por_fragmento = max(1, self.tamano_fragmento // (len(texto) // max(len(palabras), 1) if len(palabras) > 0 else 1))
-        palabras_solapamiento = max(1, self.solapamiento // (len(texto) // max(len(palabras), 1) if len(palabras) > 0 else 1))
         
-        inicio = 0
-        while inicio < len(palabras):
-            fin = min(inicio + palabras_por_fragmento, len(palabras))
+        # Tokens acumulados al inicio de cada palabra: los de un fragmento son una resta
+        acumulados = np.concatenate(([0], np.cumsum(self._contar_tokens(palabras))))
+        
+        if self.modo_fragmentacion == 'tokens':
+            rangos = self._rangos_por_tokens(acumulados)
+        else:
+            rangos = self._rangos_por_caracteres(texto, len(palabras))
+        
+        for inicio, fin in rangos:
             fragmento = " ".join(palabras[inicio:fin])
             
-            # Crear metadatos específicos para este fragmento
-            metadatos_fragmento = metadatos.copy()
-            metadatos_fragmento["fragmento_num"] = len(fragmentos) + 1
-            metadatos_fragmento["fragmento_inicio"] = inicio
-            metadatos_fragmento["fragmento_fin"] = fin
-            metadatos_fragmento["fragmento_text"] = fragmento[:100] + "..." if len(fragmento) > 100 else fragmento
+            # Campos propios de este fragmento; los metadatos del documento se guardan aparte
+            campos = {
+                "numero": len(fragmentos) + 1,
+                "inicio": inicio,
+                "fin": fin,
+                # Página o línea en la que empieza el fragmento
+                "posicion": posiciones[inicio] if inicio < len(posiciones) else -1,
+            }
             
-            # Agregar información de posición (página o línea)
-            if posiciones and inicio < len(posiciones):
-                if metadatos['extension'] == '.pdf':
-                    metadatos_fragmento["pagina"] = posiciones[inicio]
-                else:
-                    metadatos_fragmento["linea"] = posiciones[inicio]
-            
-            fragmentos.append((fragmento, metadatos_fragmento))
+            fragmentos.append((fragmento, campos))
+            self._registrar_tokens(int(acumulados[fin] - acumulados[inicio]))
+        
+        return fragmentos
+    
+    def _registrar_truncamiento(self, estadisticas_previas: Dict[str, int]):
+        """Escribe en el log los tokens truncados por el modelo desde las estadísticas indicadas"""
+        delta = {clave: valor - estadisticas_previas[clave] for clave, valor in self.estadisticas_fragmentacion.items()}
+        if not delta["fragmentos"]:
+            return
+        
+        logger.info(f"Fragmentación ({self.modo_fragmentacion}): {delta['fragmentos']} fragmentos, "
+                    f"{delta['fragmentos_truncados']} truncados; {delta['tokens_truncados']} de "
+                    f"{delta['tokens']} tokens quedan fuera del modelo "
+                    f"({delta['tokens_truncados'] / max(delta['tokens'], 1):.1%})")
+    
+    def _codificar(self, textos: List[str]) -> List[np.ndarray]:
+        """
+        Genera los embeddings de varios textos en lotes, reutilizando los de la caché
+        
+        Sólo los textos que no están en la caché de embeddings pasan por el modelo, y sus
+        embeddings se añaden a la caché para las siguientes indexaciones.
+        
+        Args:
+            textos: Textos de los fragmentos
+        
+        Returns:
+            List[np.ndarray]: Un embedding por texto, en el mismo orden
+        """
+        if not textos:
+            return []
+        
+        if self.cache_embeddings is None:
+            return list(self._codificar_modelo(textos))
+        
+        claves = [self.cache_embeddings.clave(texto) for texto in textos]
+        encontrados = self.cache_embeddings.obtener_varios(claves)
+        
+        # Codificar una sola vez cada texto que falte, aunque aparezca varias veces
+        pendientes = {}
+        for clave, texto in zip(claves, textos):
+            if clave not in encontrados and clave not in pendientes:
+                pendientes[clave] = texto
+        
+        if pendientes:
+            nuevos = self._codificar_modelo(list(pendientes.values()))
+            self.cache_embeddings.guardar_varios(list(pendientes), nuevos)
+            encontrados.update(zip(pendientes, nuevos))
+        
+        logger.info(f"Caché de embeddings: {len(textos) - len(pendientes)} de {len(textos)} fragmentos "
+                    f"reutilizados ({(len(textos) - len(pendientes)) / len(textos):.0%})")
+        return [encontrados[clave] for clave in claves]
+    
+    def _codificar_modelo(self, textos: List[str]) -> np.ndarray:
+        """
+        Genera embeddings con el modelo, repartiendo los lotes entre varios procesos si procede
+        
+        El pool sólo se usa cuando hay al menos un lote completo para cada proceso; con menos
+        textos el coste de enviarlos a los procesos supera al de codificarlos aquí. Los
+        codificadores sin pool (ONNX Runtime ya reparte cada lote entre sus hilos) codifican
+        siempre en el proceso actual.
+        
+        Args:
+            textos: Textos a codificar
+        
+        Returns:
+            np.ndarray: Embeddings en el mismo orden que los textos
+        """
+        if (self.procesos_codificacion <= 1 or not self.modelo.admite_multiproceso
+                or len(textos) < self.procesos_codificacion * self.tamano_lote):
+            return self.modelo.encode(textos, batch_size=self.tamano_lote, show_progress_bar=False)
+        
+        if self._pool is None:
+            self._iniciar_pool()
+        
+        # Trozos de varios lotes por proceso, para repartir bien la carga sin demasiados mensajes
+        tamano_trozo = max(self.tamano_lote, len(textos) // (self.procesos_codificacion * 4))
+        return self.modelo.encode_multi_process(textos, self._pool, batch_size=self.tamano_lote,
+                                                chunk_size=tamano_trozo)
+    
+    def _iniciar_pool(self):
+        """Arranca los procesos de codificación repartiendo entre ellos los núcleos disponibles"""
+        hilos_por_proceso = max(1, (os.cpu_count() or 1) // self.procesos_codificacion)
+        logger.info(f"Iniciando {self.procesos_codificacion} procesos de codificación "
+                    f"con {hilos_por_proceso} hilos cada uno...")
+        
+        # Los procesos hijos leen el número de hilos de torch de la variable de entorno al arrancar
+        anterior = os.environ.get('OMP_NUM_THREADS')
+        os.environ['OMP_NUM_THREADS'] = str(hilos_por_proceso)
+        try:
+            self._pool = self.modelo.start_multi_process_pool(target_devices=['cpu'] * self.procesos_codificacion)
+        finally:
+            if anterior is None:
+                del os.environ['OMP_NUM_THREADS']
+            else:
+                os.environ['OMP_NUM_THREADS'] = anterior
+        
+        atexit.register(self.cerrar)
+    
+    def cerrar(self):
+        """Detiene los hilos de fusión y compactación y los procesos de codificación, si se iniciaron"""
+        hilo = self._hilo_compactacion
+        if hilo is not None:
+            hilo.join()
+        self.segmentos.detener_fusion()
+        if self._pool is not None:
+            self.modelo.stop_multi_process_pool(self._pool)
+            self._pool = None
+            atexit.unregister(self.cerrar)
+    
+    def _contar_tokens(self, palabras: List[str]) -> np.ndarray:
+        """
+        Cuenta los tokens del modelo de cada palabra
+        
+        Cada palabra distinta se tokeniza una sola vez. Como los tokenizadores del modelo
+        separan primero por espacios, la suma de los tokens de las palabras de un fragmento
+        coincide con los tokens del fragmento (sin contar los especiales).
+        
+        Args:
+            palabras: Palabras del texto en orden
+        
+        Returns:
+            np.ndarray: Número de tokens de cada palabra
+        """
+        unicas = list(set(palabras))
+        ids = self.modelo.tokenizer(unicas, add_special_tokens=False)['input_ids']
+        tokens_por_palabra = {palabra: len(ids_palabra) for palabra, ids_palabra in zip(unicas, ids)}
+        return np.array([tokens_por_palabra[palabra] for palabra in palabras], dtype=np.int64)
+    
+    def _rangos_por_caracteres(self, texto: str, num_palabras: int) -> List[Tuple[int, int]]:
+        """
+        Calcula los fragmentos a partir del tamaño y solapamiento en caracteres
+        
+        El número de palabras por fragmento se estima con la longitud media de las palabras
+        del documento completo.
+        
+        Args:
+            texto (str): Texto original del documento
+            num_palabras (int): Número de palabras del texto procesado
+        
+        Returns:
+            List[Tuple[int, int]]: Pares (palabra inicial, palabra final exclusiva)
+        """
+        # Estimar cuántas palabras equivalen al tamaño de fragmento deseado
+        palabras_por_fragmento = max(1, self.tamano_fragmento // (len(texto) // max(num_palabras, 1) if num_palabras > 0 else 1))
+        palabras_solapamiento = max(1, self.solapamiento // (len(texto) // max(num_palabras, 1) if num_palabras > 0 else 1))
+        
+        rangos = []
+        inicio = 0
+        while inicio < num_palabras:
+            fin = min(inicio + palabras_por_fragmento, num_palabras)
+            rangos.append((inicio, fin))
             
             # Avanzar con solapamiento
             inicio += palabras_por_fragmento - palabras_solapamiento
             if inicio >= fin:  # Por si acaso, para evitar ciclos infinitos
                 inicio = fin
         
-        return fragmentos
+        return rangos
     
-    def indexar_documento(self, texto: str, metadatos: Dict[str, Any]) -> List[str]:
+    def _rangos_por_tokens(self, acumulados: np.ndarray) -> List[Tuple[int, int]]:
         """
-        Indexa un documento completo dividiéndolo en fragmentos
+        Calcula fragmentos que llenan la entrada del modelo sin sobrepasarla
+        
+        Cada fragmento toma tantas palabras completas como quepan en presupuesto_tokens, y
+        el siguiente empieza en la primera palabra que deja como mucho solapamiento_tokens
+        tokens compartidos. Una palabra que por sí sola supera el presupuesto forma un
+        fragmento propio.
         
         Args:
-            texto (str): Contenido del documento a indexar
-            metadatos (dict): Metadatos del documento
-            
+            acumulados (np.ndarray): Tokens acumulados al inicio de cada palabra, con un
+                                     elemento final igual al total
+        
         Returns:
-            List[str]: Lista de IDs de fragmentos creados
+            List[Tuple[int, int]]: Pares (palabra inicial, palabra final exclusiva)
         """
-        fragmentos_metadatos = self._fragmentar_texto(texto, metadatos)
-        ids_fragmentos = []
+        num_palabras = len(acumulados) - 1
+        rangos = []
+        inicio = 0
         
-        for i, (fragmento, meta) in enumerate(fragmentos_metadatos):
-            # Crear ID único para el fragmento
-            fragmento_id = f"{metadatos['nombre']}_{i}"
-            
-            # Guardar fragmento y sus metadatos
-            self.fragmentos[fragmento_id] = fragmento
-            self.metadatos[fragmento_id] = meta
-            
-            # Generar embedding del fragmento
-            embedding = self.modelo.encode(fragmento)
+        while inicio < num_palabras:
+            fin = int(np.searchsorted(acumulados, acumulados[inicio] + self.presupuesto_tokens, side='right')) - 1
+            fin = min(max(fin, inicio + 1), num_palabras)
+            rangos.append((inicio, fin))
             
-            # Almacenar embedding
-            self.embeddings[fragmento_id] = embedding
+            if fin >= num_palabras:
+                break
             
-            ids_fragmentos.append(fragmento_id)
-            
-        logger.info(f"Documento indexado: {metadatos['nombre']}, {len(ids_fragmentos)} fragmentos")
+            # Retroceder hasta compartir como mucho solapamiento_tokens tokens con el fragmento anterior
+            siguiente = int(np.searchsorted(acumulados, acumulados[fin] - self.solapamiento_tokens, side='left'))
+            inicio = max(siguiente, inicio + 1)
         
-        # Guardar después de indexar
-        self._guardar_datos()
+        return rangos
+    
+    def _registrar_tokens(self, tokens: int):
+        """Acumula las estadísticas de tokens de un fragmento generado"""
+        truncados = max(0, tokens - self.presupuesto_tokens)
+        self.estadisticas_fragmentacion["fragmentos"] += 1
+        self.estadisticas_fragmentacion["tokens"] += tokens
+        self.estadisticas_fragmentacion["tokens_truncados"] += truncados
+        self.estadisticas_fragmentacion["fragmentos_truncados"] += 1 if truncados else 0
+    
+    def indexar_documento(self, texto: str, metadatos: Dict[str, Any]) -> List[int]:
+        """
+        Indexa un documento completo dividiéndolo en fragmentos
         
-        return ids_fragmentos
+        Args:
+            texto (str): Contenido del documento a indexar
+            metadatos (dict): Metadatos del documento
+        
+        Returns:
+            List[int]: Lista de IDs de fragmentos creados
+        """
+        return self.indexar_documentos([(texto, metadatos)]).get(metadatos['nombre'], [])
     
-    def eliminar_documento(self, nombre_documento: str) -> bool:
+    def indexar_documentos(self, documentos: List[Tuple[str, Dict[str, Any]]]) -> Dict[str, List[int]]:
         """
-        Elimina un documento y sus fragmentos del índice
+        Indexa varios documentos a la vez, codificando sus fragmentos en lotes compartidos
+        
+        Los fragmentos de todos los documentos se reúnen en una sola lista antes de generar
+        los embeddings, de modo que los documentos cortos no desperdician lotes del modelo
+        y los datos se guardan en disco una única vez al final. Un documento cuyo nombre ya
+        estaba indexado reemplaza por completo a la versión anterior.
         
         Args:
-            nombre_documento (str): Nombre del documento a eliminar
-            
+            documentos: Lista de tuplas (texto, metadatos) de los documentos a indexar
+        
         Returns:
-            bool: True si se eliminó correctamente, False en caso contrario
+            Dict[str, List[int]]: IDs de los fragmentos creados para cada nombre de documento
         """
-        fragmentos_a_eliminar = []
+        fragmentados = []  # Tuplas (metadatos, [(texto, campos), ...]) de los documentos con contenido
+        estadisticas_previas = dict(self.estadisticas_fragmentacion)
         
-        # Encontrar fragmentos que pertenecen al documento
-        for fragmento_id in self.fragmentos.keys():
-            if fragmento_id.startswith(nombre_documento + "_"):
-                fragmentos_a_eliminar.append(fragmento_id)
+        for texto, metadatos in documentos:
+            fragmentos_documento = self._fragmentar_texto(texto, metadatos)
+            if fragmentos_documento:
+                fragmentados.append((metadatos, fragmentos_documento))
         
-        # Eliminar fragmentos
-        for fragmento_id in fragmentos_a_eliminar:
-            self.fragmentos.pop(fragmento_id, None)
-            self.metadatos.pop(fragmento_id, None)
-            self.embeddings.pop(fragmento_id, None)
+        self._registrar_truncamiento(estadisticas_previas)
         
-        logger.info(f"Documento eliminado: {nombre_documento}, {len(fragmentos_a_eliminar)} fragmentos")
+        embeddings = self._codificar([fragmento for _, fragmentos_documento in fragmentados
+                                      for fragmento, _ in fragmentos_documento])
+        return self._agregar_fragmentados(fragmentados, embeddings)
+    
+    def _agregar_fragmentados(self, fragmentados: List[Tuple[Dict[str, Any], List[Tuple[str, Dict[str, int]]]]],
+                              embeddings) -> Dict[str, List[int]]:
+        """
+        Añade al índice documentos ya fragmentados y codificados, y registra el cambio en la bitácora
         
-        # Guardar cambios
-        self._guardar_datos()
+        Args:
+            fragmentados: Tuplas (metadatos, fragmentos) con los fragmentos de _fragmentar_texto
+            embeddings: Un embedding por fragmento, en el orden de los documentos y sus fragmentos
         
-        return len(fragmentos_a_eliminar) > 0
+        Returns:
+            Dict[str, List[int]]: IDs de los fragmentos creados para cada nombre de documento
+        """
+        ids_por_documento = {}
+        entradas = []
+        posicion_embedding = 0
+        
+        with self._bloqueo:
+            # Los fragmentos de todos los documentos se publican en los segmentos en un solo lote
+            altas = []
+            for metadatos, fragmentos_documento in fragmentados:
+                nombre = metadatos['nombre']
+                
+                # Reindexar un documento sustituye todos sus fragmentos anteriores
+                if nombre in self._documentos_por_nombre:
+                    self._aplicar_altas(altas)
+                    altas = []
+                    entradas.append(self._eliminar_documento(self._documentos_por_nombre[nombre]))
+                
+                doc_id = self._siguiente_documento
+                metadatos_documento = self._serializar_metadatos(metadatos)
+                self._aplicar_documento(doc_id, metadatos_documento)
+                entradas.append({"op": "documento", "id": doc_id, "metadatos": metadatos_documento})
+                
+                ids_fragmentos = []
+                for fragmento, campos in fragmentos_documento:
+                    fragmento_id = self.tabla.num_filas + len(altas)
+                    embedding = embeddings[posicion_embedding]
+                    posicion_embedding += 1
+                    
+                    # Guardar fragmento, su fila en la tabla y su embedding
+                    altas.append((fragmento_id, doc_id, campos['numero'], campos['inicio'],
+                                  campos['fin'], campos['posicion'], fragmento, embedding))
+                    entradas.append({"op": "alta", "id": fragmento_id, "documento": doc_id, **campos,
+                                     "texto": fragmento, "embedding": embedding})
+                    ids_fragmentos.append(fragmento_id)
+                
+                ids_por_documento[nombre] = ids_fragmentos
+                logger.info(f"Documento indexado: {nombre}, {len(ids_fragmentos)} fragmentos")
+            self._aplicar_altas(altas)
+            
+            # Registrar sólo los cambios nuevos; los archivos base se reescriben en los puntos de control
+            self.bitacora.registrar(entradas)
+            self.fragmentos.confirmar()
+            self._nueva_version()
+            self._guardar_si_necesario()
+            self._compactar_si_necesario()
+        
+        return ids_por_documento
     
-    def limpiar_indice(self):
-        """Elimina todos los datos indexados y limpia las estructuras de datos"""
-        # Limpiar las estructuras de datos en memoria
-        self.embeddings = {}
-        self.fragmentos = {}
-        self.metadatos = {}
+    def _eliminar_documento(self, doc_id: int) -> Dict[str, Any]:
+        """
+        Quita un documento y sus fragmentos del índice en memoria
         
-        # Eliminar archivos de datos si existen
-        ruta_embeddings = os.path.join(self.directorio_datos, "embeddings.pkl")
-        ruta_fragmentos = os.path.join(self.directorio_datos, "fragmentos.json")
-        ruta_metadatos = os.path.join(self.directorio_datos, "metadatos.json")
+        Args:
+            doc_id (int): ID del documento
         
-        archivos = [ruta_embeddings, ruta_fragmentos, ruta_metadatos]
+        Returns:
+            dict: Entrada de bitácora que registra la eliminación
+        """
+        ids_fragmentos = list(self.fragmentos_por_documento.get(doc_id, []))
+        self._aplicar_baja_documento(doc_id, ids_fragmentos)
+        return {"op": "baja_documento", "id": doc_id, "ids": ids_fragmentos}
+    
+    def eliminar_documento(self, nombre_documento: str) -> bool:
+        """
+        Elimina un documento y sus fragmentos del índice
         
-        for archivo in archivos:
-            if os.path.exists(archivo):
-                try:
-                    os.remove(archivo)
-                    logger.info(f"Archivo eliminado: {archivo}")
-                except Exception as e:
-                    logger.error(f"Error al eliminar archivo {archivo}: {e}")
+        Args:
+            nombre_documento (str): Nombre del documento a eliminar
         
-        logger.info("Índice limpiado correctamente")
+        Returns:
+            bool: True si se eliminó correctamente, False en caso contrario
+        """
+        with self._bloqueo:
+            doc_id = self._documentos_por_nombre.get(nombre_documento)
+            if doc_id is None:
+                logger.info(f"Documento eliminado: {nombre_documento}, 0 fragmentos")
+                return False
+            
+            entrada = self._eliminar_documento(doc_id)
+            logger.info(f"Documento eliminado: {nombre_documento}, {len(entrada['ids'])} fragmentos")
+            
+            # Registrar la eliminación en la bitácora
+            self.bitacora.registrar([entrada])
+            self.fragmentos.confirmar()
+            self._nueva_version()
+            self._guardar_si_necesario()
+            self._compactar_si_necesario()
         
-        # Guardar el estado vacío
-        self._guardar_datos() 
\ No newline at end of file
+        return True
+    
+    def limpiar_indice(self):
+        """Elimina todos los datos indexados y limpia las estructuras de datos"""
+        with self._bloqueo:
+            # Limpiar las estructuras de datos en memoria y los archivos de embeddings
+            self.segmentos.limpiar()
+            self.fragmentos.limpiar()
+            self.tabla = TablaFragmentos()
+            self.documentos = {}
+            self._documentos_por_nombre = {}
+            self.fragmentos_por_documento = {}
+            self._siguiente_documento = 0
+            self.manifiesto.limpiar()
+            
+            # Eliminar archivos de datos si existen (incluidos los de formatos anteriores)
+            self._eliminar_almacen_anterior()
+            nombres = ["documentos.json", "tabla_fragmentos.npz"]
+            nombres.extend(migracion.ARCHIVOS_FORMATO_ANTERIOR)
+            archivos = [os.path.join(self.directorio_datos, nombre) for nombre in nombres]
+            archivos.append(self.bitacora.ruta)
+            
+            for archivo in archivos:
+                if os.path.exists(archivo):
+                    try:
+                        os.remove(archivo)
+                        logger.info(f"Archivo eliminado: {archivo}")
+                    except Exception as e:
+                        logger.error(f"Error al eliminar archivo {archivo}: {e}")
+            
+            logger.info("Índice limpiado correctamente")
+            self._nueva_version()
+            
+            # Guardar el estado vacío
+            self._guardar_datos()
\ No newline at end of file
@@ -0,0 +1,117 @@
+import numpy as np
+from typing import Dict, Optional
+
+# Filas que se asignan a sus listas de una vez (limita la memoria de la matriz de distancias)
+FILAS_POR_BLOQUE = 16384
+# Filas de entrenamiento por lista que se muestrean para el k-means
+MUESTRA_POR_LISTA = 64
+
+class IndiceIVF:
+    """
+    Índice de listas invertidas (IVF) para la búsqueda aproximada de vecinos más cercanos
+    
+    Agrupa las filas de una matriz de embeddings normalizados con un k-means esférico en
+    num_listas listas, cada una representada por su centroide. Una consulta sólo puntúa
+    las filas de las nprobe listas con el centroide más parecido, de modo que el coste de
+    la búsqueda pasa de todas las filas a aproximadamente nprobe / num_listas de ellas. Más
+    listas exploradas dan más exhaustividad (recall) a cambio de más latencia; con nprobe
+    igual a num_listas el resultado es el de la búsqueda exacta.
+    
+    El índice es inmutable y describe una matriz concreta: se crea junto con cada segmento
+    y se descarta con él.
+    """
+    
+    def __init__(self, centroides: np.ndarray, filas: np.ndarray, limites: np.ndarray):
+        """
+        Args:
+            centroides (np.ndarray): Centroide normalizado de cada lista (float32)
+            filas (np.ndarray): Filas de la matriz agrupadas por lista (int32)
+            limites (np.ndarray): Inicio de cada lista en filas, más el final (num_listas + 1)
+        """
+        self.centroides = centroides
+        self.filas = filas
+        self.limites = limites
+    
+    @property
+    def num_listas(self) -> int:
+        return len(self.centroides)
+    
+    @staticmethod
+    def num_listas_para(filas: int) -> int:
+        """Número de listas recomendado para una matriz: la raíz cuadrada de sus filas"""
+        return max(1, int(round(np.sqrt(filas))))
+    
+    @classmethod
+    def entrenar(cls, matriz: np.ndarray, num_listas: Optional[int] = None, iteraciones: int = 10,
+                 semilla: int = 0) -> 'IndiceIVF':
+        """
+        Calcula las listas de una matriz de embeddings normalizados
+        
+        Los centroides se entrenan sobre una muestra de la matriz y después se asignan
+        todas las filas a su centroide más parecido.
+        
+        Args:
+            matriz (np.ndarray): Embeddings normalizados, una fila por fragmento
+            num_listas (int): Número de listas (por defecto num_listas_para(filas))
+            iteraciones (int): Iteraciones del k-means
+            semilla (int): Semilla del muestreo, para que el índice sea reproducible
+        
+        Returns:
+            IndiceIVF: Índice de la matriz
+        """
+        n = len(matriz)
+        num_listas = min(num_listas or cls.num_listas_para(n), n)
+        generador = np.random.default_rng(semilla)
+        
+        tamano_muestra = min(n, num_listas * MUESTRA_POR_LISTA)
+        muestra = np.sort(generador.choice(n, tamano_muestra, replace=False))
+        muestra = np.asarray(matriz[muestra], dtype=np.float32)
+        
+        centroides = muestra[generador.choice(len(muestra), num_listas, replace=False)].copy()
+        for _ in range(iteraciones):
+            asignacion = np.argmax(muestra @ centroides.T, axis=1)
+            sumas = np.zeros_like(centroides)
+            np.add.at(sumas, asignacion, muestra)
+            normas = np.linalg.norm(sumas, axis=1, keepdims=True)
+            # Una lista vacía conserva su centroide anterior
+            centroides = np.where(normas > 0, sumas / np.where(normas > 0, normas, 1), centroides)
+        
+        asignacion = np.empty(n, dtype=np.int32)
+        for inicio in range(0, n, FILAS_POR_BLOQUE):
+            bloque = np.asarray(matriz[inicio:inicio + FILAS_POR_BLOQUE], dtype=np.float32)
+            asignacion[inicio:inicio + len(bloque)] = np.argmax(bloque @ centroides.T, axis=1)
+        
+        filas = np.argsort(asignacion, kind='stable').astype(np.int32)
+        limites = np.zeros(num_listas + 1, dtype=np.int64)
+        np.cumsum(np.bincount(asignacion, minlength=num_listas), out=limites[1:])
+        return cls(centroides.astype(np.float32), filas, limites)
+    
+    def candidatas(self, consulta: np.ndarray, nprobe: int) -> np.ndarray:
+        """
+        Filas de las nprobe listas más cercanas a una consulta
+        
+        Args:
+            consulta (np.ndarray): Vector de la consulta normalizado (float32)
+            nprobe (int): Número de listas a explorar
+        
+        Returns:
+            np.ndarray: Filas candidatas en orden ascendente
+        """
+        if nprobe >= self.num_listas:
+            return np.sort(self.filas)
+        
+        listas = np.argpartition(-(self.centroides @ consulta), nprobe - 1)[:nprobe]
+        filas = np.concatenate([self.filas[self.limites[lista]:self.limites[lista + 1]] for lista in listas])
+        # En orden ascendente el acceso a la matriz (a menudo un memmap) es secuencial
+        return np.sort(filas)
+    
+    def a_arrays(self) -> Dict[str, np.ndarray]:
+        """Arrays con los que se guarda el índice junto a su segmento"""
+        return {"ivf_centroides": self.centroides, "ivf_filas": self.filas, "ivf_limites": self.limites}
+    
+    @classmethod
+    def desde_arrays(cls, datos) -> Optional['IndiceIVF']:
+        """Reconstruye el índice guardado con a_arrays(), o None si los datos no lo incluyen"""
+        if "ivf_centroides" not in datos:
+            return None
+        return cls(datos["ivf_centroides"], datos["ivf_filas"], datos["ivf_limites"])
@@ -0,0 +1,172 @@
+import os
+import json
+import hashlib
+import logging
+import threading
+from typing import Dict, List, Optional
+from .persistencia import escribir_atomico
+
+logger = logging.getLogger(__name__)
+
+# Tamaño de los bloques leídos al calcular el hash de un archivo
+TAMANO_BLOQUE_HASH = 1024 * 1024
+
+class Manifiesto:
+    """
+    Registro de los archivos fuente que ya están indexados
+    
+    Para cada ruta guarda el nombre del documento, su tamaño, su fecha de modificación y
+    el hash SHA-256 de su contenido. Al arrancar basta comparar tamaño y fecha con los del
+    disco para saber qué archivos no cambiaron; el hash sólo se calcula cuando alguno de
+    los dos difiere, y evita reindexar un archivo que se tocó sin cambiar su contenido.
+    """
+    
+    def __init__(self, ruta: str):
+        """
+        Inicializa el manifiesto y carga sus entradas si el archivo existe
+        
+        Args:
+            ruta (str): Ruta del archivo JSON del manifiesto
+        """
+        self.ruta = ruta
+        self.entradas = {}  # Mapa de ruta de archivo a {"nombre", "tamano", "mtime", "hash"}
+        self._hashes = {}  # Hashes calculados en ha_cambiado, por ruta, con el tamaño y la fecha medidos
+        self._lock = threading.Lock()
+        self.cargar()
+    
+    def cargar(self):
+        """Lee las entradas guardadas en disco"""
+        if not os.path.exists(self.ruta):
+            return
+        
+        try:
+            with open(self.ruta, 'r', encoding='utf-8') as f:
+                self.entradas = json.load(f)
+        except Exception as e:
+            logger.error(f"Error al cargar el manifiesto, se reindexarán todos los archivos: {e}")
+            self.entradas = {}
+    
+    def guardar(self):
+        """Escribe las entradas en disco de forma atómica"""
+        with self._lock:
+            entradas = dict(self.entradas)
+        escribir_atomico(self.ruta, lambda f: json.dump(entradas, f, ensure_ascii=False))
+    
+    def limpiar(self):
+        """Olvida todas las entradas y elimina el archivo del manifiesto"""
+        with self._lock:
+            self.entradas = {}
+            self._hashes = {}
+        if os.path.exists(self.ruta):
+            os.remove(self.ruta)
+    
+    def __contains__(self, ruta: str) -> bool:
+        return os.path.normpath(ruta) in self.entradas
+    
+    def __len__(self) -> int:
+        return len(self.entradas)
+    
+    def rutas(self) -> List[str]:
+        """Devuelve las rutas de todos los archivos registrados"""
+        with self._lock:
+            return list(self.entradas)
+    
+    @staticmethod
+    def calcular_hash(ruta: str) -> str:
+        """
+        Calcula el hash SHA-256 del contenido de un archivo leyéndolo por bloques
+        
+        Args:
+            ruta (str): Ruta del archivo
+        
+        Returns:
+            str: Hash en hexadecimal
+        """
+        resumen = hashlib.sha256()
+        with open(ruta, 'rb') as f:
+            for bloque in iter(lambda: f.read(TAMANO_BLOQUE_HASH), b''):
+                resumen.update(bloque)
+        return resumen.hexdigest()
+    
+    def ha_cambiado(self, ruta: str) -> bool:
+        """
+        Indica si un archivo es nuevo o su contenido cambió desde que se registró
+        
+        Args:
+            ruta (str): Ruta del archivo
+        
+        Returns:
+            bool: True si hay que (re)indexar el archivo
+        """
+        ruta = os.path.normpath(ruta)
+        estado = os.stat(ruta)
+        
+        with self._lock:
+            entrada = self.entradas.get(ruta)
+        
+        if entrada is None:
+            return True
+        if entrada["tamano"] == estado.st_size and entrada["mtime"] == estado.st_mtime_ns:
+            return False
+        
+        # El tamaño o la fecha difieren: sólo el hash decide si el contenido cambió
+        hash_actual = self.calcular_hash(ruta)
+        with self._lock:
+            self._hashes[ruta] = (estado.st_size, estado.st_mtime_ns, hash_actual)
+            if hash_actual != entrada["hash"]:
+                return True
+            entrada["tamano"] = estado.st_size
+            entrada["mtime"] = estado.st_mtime_ns
+        return False
+    
+    def registrar(self, ruta: str, nombre: str):
+        """
+        Registra un archivo como indexado con su estado actual en disco
+        
+        Args:
+            ruta (str): Ruta del archivo
+            nombre (str): Nombre del documento en el índice
+        """
+        ruta = os.path.normpath(ruta)
+        estado = os.stat(ruta)
+        
+        with self._lock:
+            calculado = self._hashes.pop(ruta, None)
+        
+        if calculado is not None and calculado[:2] == (estado.st_size, estado.st_mtime_ns):
+            hash_actual = calculado[2]
+        else:
+            hash_actual = self.calcular_hash(ruta)
+        
+        with self._lock:
+            self.entradas[ruta] = {"nombre": nombre, "tamano": estado.st_size,
+                                   "mtime": estado.st_mtime_ns, "hash": hash_actual}
+    
+    def eliminar(self, ruta: str) -> Optional[Dict]:
+        """
+        Quita un archivo del manifiesto
+        
+        Args:
+            ruta (str): Ruta del archivo
+        
+        Returns:
+            dict o None: Entrada eliminada, si existía
+        """
+        with self._lock:
+            return self.entradas.pop(os.path.normpath(ruta), None)
+    
+    def eliminar_documento(self, nombre: str) -> List[str]:
+        """
+        Quita del manifiesto todos los archivos indexados con un nombre de documento
+        
+        Args:
+            nombre (str): Nombre del documento
+        
+        Returns:
+            List[str]: Rutas eliminadas
+        """
+        with self._lock:
+            rutas = [ruta for ruta, entrada in self.entradas.items() if entrada["nombre"] == nombre]
+            for ruta in rutas:
+                del self.entradas[ruta]
+        return rutas
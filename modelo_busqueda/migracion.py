@@ -0,0 +1,107 @@
+import os
+import json
+import pickle
+import logging
+import numpy as np
+from collections import OrderedDict
+from typing import Any, Dict, List, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Claves que el formato anterior añadía a la copia de los metadatos del documento en cada fragmento
+CLAVES_FRAGMENTO = ('fragmento_num', 'fragmento_inicio', 'fragmento_fin', 'fragmento_text', 'pagina', 'linea')
+
+# Archivos exclusivos del formato anterior que se eliminan tras la migración
+ARCHIVOS_FORMATO_ANTERIOR = ('metadatos.json', 'fragmentos.json', 'embeddings.pkl')
+
+def hay_formato_anterior(directorio_datos: str) -> bool:
+    """
+    Indica si el directorio contiene un índice con metadatos completos por fragmento
+    
+    Args:
+        directorio_datos (str): Directorio de datos del indexador
+        
+    Returns:
+        bool: True si existe metadatos.json (formato con IDs "{nombre}_{i}")
+    """
+    return os.path.exists(os.path.join(directorio_datos, "metadatos.json"))
+
+def leer_formato_anterior(directorio_datos: str, embeddings, fragmentos, bitacora) -> List[Tuple[Dict[str, Any], List[Tuple[Dict[str, int], str, np.ndarray]]]]:
+    """
+    Lee un índice del formato anterior y lo agrupa por documento
+    
+    Admite los embeddings en embeddings.pkl o en la matriz binaria, los textos en
+    fragmentos.json o en el almacén de textos, y reaplica las entradas de la bitácora de
+    ese formato (altas con metadatos completos y bajas por ID de fragmento).
+    
+    Args:
+        directorio_datos (str): Directorio de datos del indexador
+        embeddings: AlmacenEmbeddings del indexador (aún sin cargar)
+        fragmentos: AlmacenTextos del indexador
+        bitacora: Bitacora del indexador
+        
+    Returns:
+        Lista de (metadatos_documento, fragmentos) en el orden original, donde cada fragmento
+        es una tupla (campos, texto, embedding) con los campos de la tabla de fragmentos
+    """
+    with open(os.path.join(directorio_datos, "metadatos.json"), 'r', encoding='utf-8') as f:
+        metadatos = json.load(f)
+    
+    ruta_pickle = os.path.join(directorio_datos, "embeddings.pkl")
+    if embeddings.cargar():
+        vectores = OrderedDict((fragmento_id, np.array(vector)) for fragmento_id, vector in embeddings.items())
+    elif os.path.exists(ruta_pickle):
+        with open(ruta_pickle, 'rb') as f:
+            vectores = OrderedDict(pickle.load(f))
+    else:
+        vectores = OrderedDict()
+    
+    ruta_textos = os.path.join(directorio_datos, "fragmentos.json")
+    if os.path.exists(ruta_textos):
+        with open(ruta_textos, 'r', encoding='utf-8') as f:
+            textos = json.load(f)
+    else:
+        textos = dict(fragmentos.items())
+    
+    for entrada in bitacora.leer():
+        if entrada["op"] == "alta":
+            vectores[entrada["id"]] = entrada["embedding"]
+            textos[entrada["id"]] = entrada["texto"]
+            metadatos[entrada["id"]] = entrada["metadatos"]
+        elif entrada["op"] == "baja":
+            for fragmento_id in entrada["ids"]:
+                vectores.pop(fragmento_id, None)
+                textos.pop(fragmento_id, None)
+                metadatos.pop(fragmento_id, None)
+    
+    documentos = OrderedDict()
+    for fragmento_id, vector in vectores.items():
+        if fragmento_id not in metadatos or fragmento_id not in textos:
+            continue
+        
+        meta = metadatos[fragmento_id]
+        nombre = meta.get('nombre', fragmento_id.rsplit('_', 1)[0])
+        if nombre not in documentos:
+            documentos[nombre] = ({clave: valor for clave, valor in meta.items() if clave not in CLAVES_FRAGMENTO}, [])
+        
+        campos = {
+            'numero': int(meta.get('fragmento_num', len(documentos[nombre][1]) + 1)),
+            'inicio': int(meta.get('fragmento_inicio', 0)),
+            'fin': int(meta.get('fragmento_fin', 0)),
+            'posicion': int(meta.get('pagina', meta.get('linea', -1))),
+        }
+        documentos[nombre][1].append((campos, textos[fragmento_id], vector))
+    
+    for _, fragmentos_documento in documentos.values():
+        fragmentos_documento.sort(key=lambda fragmento: fragmento[0]['numero'])
+    
+    logger.info(f"Formato anterior leído: {len(documentos)} documentos, "
+                f"{sum(len(f) for _, f in documentos.values())} fragmentos")
+    return list(documentos.values())
+
+def eliminar_formato_anterior(directorio_datos: str):
+    """Elimina los archivos exclusivos del formato anterior tras migrarlo"""
+    for nombre in ARCHIVOS_FORMATO_ANTERIOR:
+        ruta = os.path.join(directorio_datos, nombre)
+        if os.path.exists(ruta):
+            os.remove(ruta)
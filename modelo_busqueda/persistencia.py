@@ -0,0 +1,23 @@
+import os
+
+def escribir_atomico(ruta: str, escribir, modo: str = 'w'):
+    """
+    Escribe un archivo completo de forma atómica
+    
+    El contenido se escribe en un archivo temporal que luego reemplaza al original,
+    de modo que una caída a mitad de escritura nunca deja un archivo truncado.
+    
+    Args:
+        ruta (str): Ruta final del archivo
+        escribir: Función que recibe el archivo abierto y escribe su contenido
+        modo (str): Modo de apertura ('w' para texto, 'wb' para binario)
+    """
+    ruta_temporal = ruta + ".tmp"
+    opciones = {} if 'b' in modo else {'encoding': 'utf-8'}
+    
+    with open(ruta_temporal, modo, **opciones) as f:
+        escribir(f)
+        f.flush()
+        os.fsync(f.fileno())
+    
+    os.replace(ruta_temporal, ruta)
@@ -0,0 +1,287 @@
+import time
+import queue
+import logging
+import threading
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+# Marca de fin de datos que cada etapa pasa a la siguiente
+FIN = object()
+
+class EstadisticasEtapa:
+    """Contadores de una etapa del pipeline: elementos procesados y tiempo ocupado"""
+    
+    def __init__(self, nombre: str, cola: Optional[queue.Queue] = None, trabajadores: int = 1):
+        self.nombre = nombre
+        self.cola = cola  # Cola de entrada de la etapa
+        self.trabajadores = trabajadores  # Hilos que ejecutan la etapa
+        self.elementos = 0
+        self.fragmentos = 0
+        self.errores = 0
+        self.segundos_ocupada = 0.0
+        self.profundidad_maxima = 0
+        self._bloqueo = threading.Lock()
+    
+    def registrar(self, segundos: float, elementos: int = 1, fragmentos: int = 0):
+        with self._bloqueo:
+            self.elementos += elementos
+            self.fragmentos += fragmentos
+            self.segundos_ocupada += segundos
+    
+    def registrar_error(self):
+        with self._bloqueo:
+            self.errores += 1
+    
+    def observar_cola(self):
+        """Anota la profundidad actual de la cola de entrada"""
+        if self.cola is not None:
+            self.profundidad_maxima = max(self.profundidad_maxima, self.cola.qsize())
+    
+    def como_diccionario(self, segundos_totales: float) -> Dict[str, Any]:
+        """
+        Resume la etapa
+        
+        Args:
+            segundos_totales (float): Duración del pipeline hasta ahora
+        
+        Returns:
+            dict: Elementos y fragmentos procesados, rendimiento por segundo ocupado,
+            proporción del tiempo total que sus hilos estuvieron ocupados y profundidad de su cola
+        """
+        with self._bloqueo:
+            resumen = {
+                "elementos": self.elementos,
+                "fragmentos": self.fragmentos,
+                "errores": self.errores,
+                "segundos_ocupada": round(self.segundos_ocupada, 3),
+                "elementos_por_segundo": round(self.elementos / self.segundos_ocupada, 2) if self.segundos_ocupada else 0.0,
+                "ocupacion": round(self.segundos_ocupada / (segundos_totales * self.trabajadores), 3) if segundos_totales else 0.0,
+            }
+        if self.cola is not None:
+            resumen["cola"] = self.cola.qsize()
+            resumen["cola_maxima"] = self.profundidad_maxima
+            resumen["cola_capacidad"] = self.cola.maxsize
+        return resumen
+
+class PipelineIndexacion:
+    """
+    Indexación por etapas: extracción -> fragmentación -> codificación -> persistencia
+    
+    Cada etapa corre en sus propios hilos y se comunica con la siguiente mediante colas
+    acotadas, de modo que la lectura de PDF/DOCX se solapa con la codificación del modelo
+    y una etapa lenta frena a las anteriores en lugar de acumular documentos en memoria.
+    La etapa de codificación reúne fragmentos de varios documentos en cada llamada al
+    modelo, y la de persistencia es la única que modifica el índice.
+    
+    Las estadísticas de cada etapa (rendimiento, ocupación y profundidad de su cola de
+    entrada) indican cuál es el cuello de botella: la etapa con ocupación cercana a 1 y
+    cuya cola de entrada está llena.
+    """
+    
+    def __init__(self, indexador, extraer: Callable[[str], Optional[Tuple[str, Dict[str, Any]]]],
+                 al_persistir: Optional[Callable[[List[Tuple[str, Dict[str, Any]]]], None]] = None,
+                 hilos_extraccion: int = 2, tamano_cola: int = 16, fragmentos_por_lote: int = 512):
+        """
+        Prepara el pipeline
+        
+        Args:
+            indexador: Indexador en el que se añaden los documentos
+            extraer: Función que recibe una ruta y devuelve (texto, metadatos), o None para omitirla
+            al_persistir: Función llamada tras guardar cada lote con la lista de (ruta, metadatos)
+                          de sus documentos
+            hilos_extraccion (int): Hilos que extraen texto de los archivos en paralelo
+            tamano_cola (int): Capacidad de cada cola entre etapas
+            fragmentos_por_lote (int): Fragmentos que la etapa de codificación intenta reunir
+                                       en cada llamada al modelo
+        """
+        self.indexador = indexador
+        self.extraer = extraer
+        self.al_persistir = al_persistir
+        self.hilos_extraccion = max(1, hilos_extraccion)
+        self.fragmentos_por_lote = fragmentos_por_lote
+        
+        self._cola_rutas = queue.Queue(maxsize=tamano_cola)
+        self._cola_fragmentar = queue.Queue(maxsize=tamano_cola)
+        self._cola_codificar = queue.Queue(maxsize=tamano_cola)
+        self._cola_persistir = queue.Queue(maxsize=tamano_cola)
+        
+        self.etapas = {
+            "extraccion": EstadisticasEtapa("extraccion", self._cola_rutas, self.hilos_extraccion),
+            "fragmentacion": EstadisticasEtapa("fragmentacion", self._cola_fragmentar),
+            "codificacion": EstadisticasEtapa("codificacion", self._cola_codificar),
+            "persistencia": EstadisticasEtapa("persistencia", self._cola_persistir),
+        }
+        self.inicio = None
+        self.fin = None
+    
+    def estadisticas(self) -> Dict[str, Any]:
+        """
+        Devuelve el estado actual del pipeline
+        
+        Returns:
+            dict: Segundos transcurridos, si sigue en marcha y el resumen de cada etapa
+        """
+        if self.inicio is None:
+            return {"en_progreso": False, "segundos": 0.0, "etapas": {}}
+        
+        segundos = (self.fin or time.perf_counter()) - self.inicio
+        return {
+            "en_progreso": self.fin is None,
+            "segundos": round(segundos, 3),
+            "etapas": {nombre: etapa.como_diccionario(segundos) for nombre, etapa in self.etapas.items()},
+        }
+    
+    def ejecutar(self, rutas: Iterable[str]) -> Dict[str, Any]:
+        """
+        Indexa los archivos indicados y espera a que terminen todas las etapas
+        
+        Args:
+            rutas: Rutas de los archivos a procesar
+        
+        Returns:
+            dict: Estadísticas finales (ver estadisticas())
+        """
+        self.inicio = time.perf_counter()
+        self.fin = None
+        estadisticas_fragmentacion = dict(self.indexador.estadisticas_fragmentacion)
+        
+        hilos = [threading.Thread(target=self._extraer, daemon=True, name=f"extraccion-{i}")
+                 for i in range(self.hilos_extraccion)]
+        hilos.append(threading.Thread(target=self._fragmentar, daemon=True, name="fragmentacion"))
+        hilos.append(threading.Thread(target=self._codificar, daemon=True, name="codificacion"))
+        hilos.append(threading.Thread(target=self._persistir, daemon=True, name="persistencia"))
+        for hilo in hilos:
+            hilo.start()
+        
+        # Alimentar la primera cola; se bloquea si los extractores van por detrás
+        for ruta in rutas:
+            self._cola_rutas.put(ruta)
+            self.etapas["extraccion"].observar_cola()
+        for _ in range(self.hilos_extraccion):
+            self._cola_rutas.put(FIN)
+        
+        for hilo in hilos:
+            hilo.join()
+        self.fin = time.perf_counter()
+        
+        self.indexador._registrar_truncamiento(estadisticas_fragmentacion)
+        estadisticas = self.estadisticas()
+        for nombre, etapa in estadisticas["etapas"].items():
+            logger.info(f"Pipeline {nombre}: {etapa['elementos']} elementos, {etapa['elementos_por_segundo']}/s "
+                        f"ocupada {etapa['ocupacion']:.0%}, cola máxima {etapa.get('cola_maxima', 0)}"
+                        f"/{etapa.get('cola_capacidad', 0)}, errores {etapa['errores']}")
+        return estadisticas
+    
+    def _extraer(self):
+        """Etapa 1: lee los archivos con los procesadores y pasa (ruta, texto, metadatos)"""
+        etapa = self.etapas["extraccion"]
+        while True:
+            ruta = self._cola_rutas.get()
+            if ruta is FIN:
+                self._cola_fragmentar.put(FIN)
+                return
+            
+            inicio = time.perf_counter()
+            try:
+                documento = self.extraer(ruta)
+            except Exception as e:
+                logger.error(f"Error al procesar el documento {ruta}: {e}")
+                etapa.registrar_error()
+                continue
+            etapa.registrar(time.perf_counter() - inicio)
+            
+            if documento is not None:
+                self._cola_fragmentar.put((ruta,) + tuple(documento))
+                self.etapas["fragmentacion"].observar_cola()
+    
+    def _fragmentar(self):
+        """Etapa 2: divide cada documento en fragmentos"""
+        etapa = self.etapas["fragmentacion"]
+        extractores_activos = self.hilos_extraccion
+        
+        while extractores_activos:
+            elemento = self._cola_fragmentar.get()
+            if elemento is FIN:
+                extractores_activos -= 1
+                continue
+            
+            ruta, texto, metadatos = elemento
+            inicio = time.perf_counter()
+            try:
+                fragmentos = self.indexador._fragmentar_texto(texto, metadatos)
+            except Exception as e:
+                logger.error(f"Error al fragmentar el documento {ruta}: {e}")
+                etapa.registrar_error()
+                continue
+            etapa.registrar(time.perf_counter() - inicio, fragmentos=len(fragmentos))
+            
+            # Los documentos sin texto se pasan igualmente para registrarlos como procesados
+            self._cola_codificar.put((ruta, metadatos, fragmentos))
+            self.etapas["codificacion"].observar_cola()
+        
+        self._cola_codificar.put(FIN)
+    
+    def _codificar(self):
+        """Etapa 3: genera los embeddings reuniendo los fragmentos de varios documentos"""
+        etapa = self.etapas["codificacion"]
+        terminado = False
+        
+        while not terminado:
+            elemento = self._cola_codificar.get()
+            if elemento is FIN:
+                break
+            
+            # Añadir los documentos ya disponibles hasta completar el lote, sin esperar a más
+            lote = [elemento]
+            num_fragmentos = len(elemento[2])
+            while num_fragmentos < self.fragmentos_por_lote:
+                try:
+                    elemento = self._cola_codificar.get_nowait()
+                except queue.Empty:
+                    break
+                if elemento is FIN:
+                    terminado = True
+                    break
+                lote.append(elemento)
+                num_fragmentos += len(elemento[2])
+            
+            inicio = time.perf_counter()
+            try:
+                embeddings = self.indexador._codificar([fragmento for _, _, fragmentos in lote
+                                                        for fragmento, _ in fragmentos])
+            except Exception as e:
+                nombres = ', '.join(metadatos['nombre'] for _, metadatos, _ in lote)
+                logger.error(f"Error al codificar los documentos {nombres}: {e}")
+                etapa.registrar_error()
+                continue
+            etapa.registrar(time.perf_counter() - inicio, elementos=len(lote), fragmentos=num_fragmentos)
+            
+            self._cola_persistir.put((lote, embeddings))
+            self.etapas["persistencia"].observar_cola()
+        
+        self._cola_persistir.put(FIN)
+    
+    def _persistir(self):
+        """Etapa 4: añade los documentos al índice y los registra en la bitácora"""
+        etapa = self.etapas["persistencia"]
+        
+        while True:
+            elemento = self._cola_persistir.get()
+            if elemento is FIN:
+                return
+            
+            lote, embeddings = elemento
+            inicio = time.perf_counter()
+            try:
+                self.indexador._agregar_fragmentados([(metadatos, fragmentos) for _, metadatos, fragmentos in lote
+                                                      if fragmentos], embeddings)
+                if self.al_persistir is not None:
+                    self.al_persistir([(ruta, metadatos) for ruta, metadatos, _ in lote])
+            except Exception as e:
+                nombres = ', '.join(metadatos['nombre'] for _, metadatos, _ in lote)
+                logger.error(f"Error al indexar los documentos {nombres}: {e}")
+                etapa.registrar_error()
+                continue
+            etapa.registrar(time.perf_counter() - inicio, elementos=len(lote),
+                            fragmentos=sum(len(fragmentos) for _, _, fragmentos in lote))
@@ -0,0 +1,93 @@
+import time
+import logging
+import threading
+from typing import Dict, Optional, Tuple
+from .codificadores import Codificador, crear_codificador
+
+logger = logging.getLogger(__name__)
+
+class RegistroModelos:
+    """
+    Modelos de embeddings cargados en el proceso, compartidos por todos sus usuarios
+    
+    Cada modelo (motor y ruta) se carga una única vez, la primera vez que alguien lo pide
+    o en segundo plano con precargar(); los indexadores y buscadores que lo piden después
+    reciben la misma instancia. Si varios hilos lo piden mientras se carga, esperan a la
+    carga en curso en lugar de iniciar otra.
+    """
+    
+    def __init__(self):
+        self._modelos = {}  # Mapa de (motor, ruta) al codificador cargado
+        self._bloqueos = {}  # Un bloqueo por modelo, para no cargarlo dos veces a la vez
+        self._bloqueo = threading.Lock()
+    
+    @staticmethod
+    def _clave(tipo: str, ruta_modelo: str, ruta_onnx: Optional[str]) -> Tuple[str, str]:
+        return (tipo, ruta_onnx if tipo == 'onnx' else ruta_modelo)
+    
+    def obtener(self, tipo: str, ruta_modelo: str, ruta_onnx: Optional[str] = None) -> Codificador:
+        """
+        Devuelve el codificador indicado, cargándolo si todavía no lo está
+        
+        Args:
+            tipo (str): Motor del codificador ('sentence-transformers', 'torch-int8' u 'onnx')
+            ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+            ruta_onnx (str): Directorio del modelo exportado, para el motor 'onnx'
+        
+        Returns:
+            Codificador: Instancia compartida del modelo
+        """
+        clave = self._clave(tipo, ruta_modelo, ruta_onnx)
+        modelo = self._modelos.get(clave)
+        if modelo is not None:
+            return modelo
+        
+        with self._bloqueo:
+            bloqueo = self._bloqueos.setdefault(clave, threading.Lock())
+        
+        with bloqueo:
+            modelo = self._modelos.get(clave)
+            if modelo is None:
+                try:
+                    logger.info(f"Cargando modelo de embeddings {clave[1]} ({tipo})...")
+                    inicio = time.perf_counter()
+                    modelo = crear_codificador(tipo, ruta_modelo, ruta_onnx)
+                    logger.info(f"Modelo cargado correctamente en {time.perf_counter() - inicio:.1f} s")
+                except Exception as e:
+                    logger.error(f"Error al cargar el modelo: {e}")
+                    raise
+                self._modelos[clave] = modelo
+        return modelo
+    
+    def esta_cargado(self, tipo: str, ruta_modelo: str, ruta_onnx: Optional[str] = None) -> bool:
+        """Indica si el codificador ya está en memoria"""
+        return self._clave(tipo, ruta_modelo, ruta_onnx) in self._modelos
+    
+    def precargar(self, tipo: str, ruta_modelo: str, ruta_onnx: Optional[str] = None) -> threading.Thread:
+        """
+        Carga el codificador en un hilo en segundo plano
+        
+        Args:
+            tipo (str): Motor del codificador
+            ruta_modelo (str): Nombre o ruta del modelo de SentenceTransformer
+            ruta_onnx (str): Directorio del modelo exportado, para el motor 'onnx'
+        
+        Returns:
+            threading.Thread: Hilo de la carga, ya iniciado
+        """
+        def cargar():
+            try:
+                self.obtener(tipo, ruta_modelo, ruta_onnx)
+            except Exception:
+                pass  # Ya registrado en obtener(); el siguiente uso lo reintentará
+        
+        hilo = threading.Thread(target=cargar, daemon=True, name="precarga-modelo")
+        hilo.start()
+        return hilo
+    
+    def modelos(self) -> Dict[Tuple[str, str], Codificador]:
+        """Devuelve los codificadores cargados, por (motor, ruta)"""
+        return dict(self._modelos)
+
+# Registro único del proceso
+registro_modelos = RegistroModelos()
@@ -0,0 +1,1135 @@
+import os
+import re
+import json
+import logging
+import threading
+import numpy as np
+from typing import Dict, Iterable, List, Optional, Sequence, Set, Tuple
+from .ivf import IndiceIVF
+from .persistencia import escribir_atomico
+
+logger = logging.getLogger(__name__)
+
+# Manifiesto con los segmentos vigentes y sus marcas de borrado
+ARCHIVO_MANIFIESTO = "segmentos.json"
+PATRON_ARCHIVO = re.compile(r'^(segmento_\d+\.(npy|npz)|borrados_\d+\.npz)$')
+
+TIPOS = {'float32': np.float32, 'float16': np.float16}
+# Tipos de la copia compacta de la matriz con la que se puntúa ('float32' puntúa la matriz guardada)
+TIPOS_PUNTUACION = ('float32', 'float16', 'int8')
+
+# Filas que se convierten a float32 de una vez al puntuar una matriz float16 o int8; los
+# bloques pequeños caben en la caché del procesador entre la conversión y el producto
+FILAS_POR_BLOQUE = 8192
+
+def _normalizar(vectores) -> np.ndarray:
+    """Normaliza cada fila a norma 1 (las filas nulas se dejan a cero)"""
+    matriz = np.asarray(vectores, dtype=np.float32)
+    if matriz.ndim == 1:
+        matriz = matriz.reshape(1, -1)
+    normas = np.linalg.norm(matriz, axis=1, keepdims=True)
+    return matriz / np.where(normas > 0, normas, 1)
+
+def _comprimir(matriz: np.ndarray, tipo_puntuacion: str) -> Tuple[Optional[np.ndarray], Optional[np.ndarray]]:
+    """
+    Crea la copia compacta de una matriz de embeddings normalizados
+    
+    En int8 cada fila se guarda con su propia escala (su mayor valor absoluto entre 127),
+    de modo que el error de cada componente es como mucho la mitad de esa escala.
+    
+    Returns:
+        Tuple: Matriz compacta (None con 'float32') y escala de cada fila (sólo con 'int8')
+    """
+    if tipo_puntuacion == 'float32':
+        return None, None
+    if tipo_puntuacion == 'float16':
+        return np.asarray(matriz, dtype=np.float16), None
+    
+    compacta = np.empty(matriz.shape, dtype=np.int8)
+    escalas = np.empty(len(matriz), dtype=np.float32)
+    for inicio in range(0, len(matriz), FILAS_POR_BLOQUE):
+        bloque = np.asarray(matriz[inicio:inicio + FILAS_POR_BLOQUE], dtype=np.float32)
+        maximos = np.abs(bloque).max(axis=1) if bloque.shape[1] else np.zeros(len(bloque), dtype=np.float32)
+        escala = np.where(maximos > 0, maximos / 127, 1).astype(np.float32)
+        compacta[inicio:inicio + len(bloque)] = np.rint(bloque / escala[:, None])
+        escalas[inicio:inicio + len(bloque)] = escala
+    return compacta, escalas
+
+def _producto(matriz: np.ndarray, consulta: np.ndarray, escalas: Optional[np.ndarray] = None) -> np.ndarray:
+    """
+    Producto de una matriz (float32, float16 o int8 con escalas por fila) con un vector
+    float32, o con una matriz float32 de forma (dim, consultas)
+    """
+    if matriz.dtype == np.float32:
+        return matriz @ consulta
+    
+    similitudes = np.empty((len(matriz),) + consulta.shape[1:], dtype=np.float32)
+    for inicio in range(0, len(matriz), FILAS_POR_BLOQUE):
+        bloque = matriz[inicio:inicio + FILAS_POR_BLOQUE].astype(np.float32)
+        similitudes[inicio:inicio + len(bloque)] = bloque @ consulta
+    if escalas is not None:
+        similitudes *= escalas.reshape((-1,) + (1,) * (consulta.ndim - 1))
+    return similitudes
+
+def _terminos_por_fila(tokens_por_fila: Sequence[Iterable[str]], primera_fila: int = 0) -> Dict[str, List[int]]:
+    """Invierte los tokens de cada fila en un mapa de token a sus filas"""
+    terminos = {}
+    for fila, tokens in enumerate(tokens_por_fila, start=primera_fila):
+        for token in tokens:
+            terminos.setdefault(token, []).append(fila)
+    return terminos
+
+class Segmento:
+    """
+    Parte inmutable del índice: embeddings y términos de un conjunto fijo de fragmentos
+    
+    Las filas están ordenadas por ID de fragmento, de modo que localizar un ID es una
+    búsqueda binaria. Un segmento nunca se modifica después de crearse (las bajas se
+    marcan aparte, en las marcas de borrado de cada instantánea), por lo que puede leerse
+    desde cualquier hilo sin bloqueos. Los segmentos grandes pueden llevar además un
+    índice IVF de su matriz para la búsqueda aproximada.
+    
+    Con una copia compacta (float16 o int8) las consultas se puntúan sobre ella, en
+    memoria, y la matriz completa (en disco, con memmap) sólo se lee para recalcular de
+    forma exacta las mejores filas.
+    """
+    
+    def __init__(self, ids: np.ndarray, matriz: np.ndarray, terminos: Dict[str, np.ndarray],
+                 nombre: Optional[str] = None, ivf: Optional[IndiceIVF] = None,
+                 compacta: Optional[np.ndarray] = None, escalas: Optional[np.ndarray] = None):
+        """
+        Args:
+            ids (np.ndarray): ID de fragmento de cada fila, en orden ascendente
+            matriz (np.ndarray): Embeddings normalizados, una fila por fragmento
+            terminos (dict): Mapa de token a las filas (ascendentes) de los fragmentos que lo contienen
+            nombre (str): Nombre de sus archivos en disco, o None si aún no se ha guardado
+            ivf (IndiceIVF): Listas invertidas de la matriz, o None si sólo admite búsqueda exacta
+            compacta (np.ndarray): Copia float16 o int8 de la matriz con la que se puntúa, o None
+            escalas (np.ndarray): Escala de cada fila de una copia compacta int8
+        """
+        self.ids = ids
+        self.matriz = matriz
+        self.terminos = terminos
+        self.nombre = nombre
+        self.ivf = ivf
+        self.compacta = compacta
+        self.escalas = escalas
+    
+    def __len__(self) -> int:
+        return len(self.ids)
+    
+    @classmethod
+    def crear(cls, ids, matriz: np.ndarray, terminos: Dict[str, Iterable[int]], tipo) -> 'Segmento':
+        """
+        Crea un segmento ordenando sus filas por ID
+        
+        Args:
+            ids: ID de fragmento de cada fila
+            matriz (np.ndarray): Embeddings normalizados en el orden de ids
+            terminos (dict): Mapa de token a filas en el orden de ids
+            tipo: Tipo de dato de la matriz del segmento
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        orden = np.argsort(ids, kind='stable')
+        if np.all(orden == np.arange(len(ids))):
+            nueva_fila = None
+        else:
+            ids, matriz = ids[orden], matriz[orden]
+            nueva_fila = np.empty(len(orden), dtype=np.int32)
+            nueva_fila[orden] = np.arange(len(orden), dtype=np.int32)
+        
+        terminos_segmento = {}
+        for token, filas in terminos.items():
+            filas = np.asarray(filas, dtype=np.int32)
+            if nueva_fila is not None:
+                filas = np.sort(nueva_fila[filas])
+            terminos_segmento[token] = filas
+        
+        return cls(ids, np.ascontiguousarray(matriz, dtype=tipo), terminos_segmento)
+    
+    def filas(self, ids: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Localiza IDs de fragmento en el segmento
+        
+        Args:
+            ids (np.ndarray): IDs de fragmento (int64)
+        
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Filas de los IDs presentes y su posición en ids
+        """
+        if len(self.ids) == 0 or len(ids) == 0:
+            vacio = np.zeros(0, dtype=np.int64)
+            return vacio, vacio
+        filas = np.minimum(np.searchsorted(self.ids, ids), len(self.ids) - 1)
+        presentes = np.flatnonzero(self.ids[filas] == ids)
+        return filas[presentes], presentes
+    
+    def puntuar(self, consulta: np.ndarray, nprobe: int = 0, reevaluar: int = 0) -> np.ndarray:
+        """
+        Producto escalar de un vector normalizado float32 con las filas del segmento
+        
+        Args:
+            consulta (np.ndarray): Vector de la consulta normalizado
+            nprobe (int): Listas del IVF a explorar; con 0, o si el segmento no tiene IVF,
+                          se puntúan todas las filas
+            reevaluar (int): Con copia compacta, mejores filas cuya similitud se recalcula
+                             con la matriz completa; el resto queda aproximada
+        
+        Returns:
+            np.ndarray: Similitud de cada fila; -inf en las filas que no se han puntuado
+        """
+        filas = self.ivf.candidatas(consulta, nprobe) if nprobe > 0 and self.ivf is not None else None
+        
+        if self.compacta is None:
+            if filas is None:
+                return _producto(self.matriz, consulta)
+            similitudes = np.full(len(self.matriz), -np.inf, dtype=np.float32)
+            similitudes[filas] = self.puntuar_filas(consulta, filas)
+            return similitudes
+        
+        if filas is None:
+            similitudes = _producto(self.compacta, consulta, self.escalas)
+        else:
+            similitudes = np.full(len(self.matriz), -np.inf, dtype=np.float32)
+            similitudes[filas] = _producto(self.compacta[filas], consulta,
+                                           None if self.escalas is None else self.escalas[filas])
+        
+        if reevaluar > 0:
+            reevaluar = min(reevaluar, len(similitudes))
+            mejores = np.sort(np.argpartition(-similitudes, reevaluar - 1)[:reevaluar])
+            mejores = mejores[~np.isneginf(similitudes[mejores])]
+            similitudes[mejores] = self.puntuar_filas(consulta, mejores)
+        return similitudes
+    
+    def puntuar_lote(self, consultas: np.ndarray, reevaluar: int = 0) -> np.ndarray:
+        """
+        Producto escalar de varios vectores normalizados con todas las filas del segmento
+        
+        Todas las consultas se puntúan con un único producto matriz-matriz, de modo que la
+        matriz (o su copia compacta) se recorre una sola vez. No usa el IVF: cada consulta
+        exploraría listas distintas.
+        
+        Args:
+            consultas (np.ndarray): Vectores normalizados float32, una fila por consulta
+            reevaluar (int): Con copia compacta, mejores filas de cada consulta cuya
+                             similitud se recalcula con la matriz completa
+        
+        Returns:
+            np.ndarray: Similitudes de forma (consultas, filas)
+        """
+        if self.compacta is None:
+            return _producto(self.matriz, consultas.T).T
+        
+        similitudes = _producto(self.compacta, consultas.T, self.escalas).T
+        if reevaluar > 0:
+            reevaluar = min(reevaluar, similitudes.shape[1])
+            mejores = np.argpartition(-similitudes, reevaluar - 1, axis=1)[:, :reevaluar]
+            # Las filas elegidas por alguna consulta se leen una sola vez de la matriz completa
+            filas = np.unique(mejores)
+            exactas = self.puntuar_filas(consultas.T, filas)
+            columnas = np.arange(len(consultas))[:, None]
+            similitudes[columnas, mejores] = exactas[np.searchsorted(filas, mejores), columnas]
+        return similitudes
+    
+    def puntuar_filas(self, consulta: np.ndarray, filas: np.ndarray) -> np.ndarray:
+        """
+        Producto escalar exacto de un vector normalizado con las filas indicadas (ascendentes);
+        con una matriz (dim, consultas) devuelve una columna por consulta
+        """
+        return np.asarray(self.matriz[filas], dtype=np.float32) @ consulta
+
+class Instantanea:
+    """
+    Vista inmutable del índice en un momento dado, usada por una búsqueda completa
+    
+    Reúne la lista de segmentos y sus marcas de borrado tal como estaban al publicarse.
+    Las escrituras posteriores publican una instantánea nueva sin tocar esta, así que una
+    búsqueda ve siempre el mismo estado en todas sus fases (puntuación, filtrado por
+    palabras clave y posiciones) y nunca espera a los hilos que indexan.
+    
+    Las filas vivas de todos los segmentos, concatenadas en orden, forman la "matriz" del
+    índice: puntuar() devuelve una similitud por fila viva y posiciones() traduce IDs de
+    fragmento a esas mismas filas.
+    """
+    
+    def __init__(self, segmentos: Tuple[Segmento, ...], borrados: Tuple[Optional[np.ndarray], ...]):
+        self.segmentos = segmentos
+        self.borrados = borrados  # Por segmento, máscara de filas eliminadas (None si no hay)
+        self._vivas = None
+        self._ids = None
+    
+    def _filas_vivas(self) -> List[Optional[np.ndarray]]:
+        """Por segmento, sus filas vivas (None si lo están todas)"""
+        if self._vivas is None:
+            self._vivas = [None if borrados is None else np.flatnonzero(~borrados)
+                           for borrados in self.borrados]
+        return self._vivas
+    
+    def __len__(self) -> int:
+        return sum(len(segmento) if vivas is None else len(vivas)
+                   for segmento, vivas in zip(self.segmentos, self._filas_vivas()))
+    
+    @property
+    def ids(self) -> List[int]:
+        """IDs de fragmento de las filas vivas, en el orden de puntuar()"""
+        if self._ids is None:
+            partes = [segmento.ids if vivas is None else segmento.ids[vivas]
+                      for segmento, vivas in zip(self.segmentos, self._filas_vivas())]
+            self._ids = np.concatenate(partes).tolist() if partes else []
+        return self._ids
+    
+    def obtener_matriz(self) -> Tuple[List[int], np.ndarray]:
+        """Devuelve los IDs y la matriz de las filas vivas (una copia concatenada)"""
+        partes = [segmento.matriz if vivas is None else segmento.matriz[vivas]
+                  for segmento, vivas in zip(self.segmentos, self._filas_vivas())]
+        if not partes:
+            return [], np.zeros((0, 0), dtype=np.float32)
+        return self.ids, np.concatenate(partes)
+    
+    def puntuar(self, consulta: np.ndarray, nprobe: int = 0, reevaluar: int = 0) -> Tuple[List[int], np.ndarray]:
+        """
+        Calcula el producto escalar de un vector normalizado con todas las filas vivas
+        
+        Con nprobe > 0 los segmentos que tienen IVF sólo puntúan las filas de sus nprobe
+        listas más cercanas (búsqueda aproximada); el resto de sus filas recibe -inf. Los
+        segmentos con copia compacta puntúan sobre ella y recalculan de forma exacta sus
+        reevaluar mejores filas.
+        
+        Args:
+            consulta (np.ndarray): Vector de la consulta normalizado
+            nprobe (int): Listas del IVF a explorar en cada segmento (0 = búsqueda exacta)
+            reevaluar (int): Mejores filas de cada segmento compacto que se puntúan con la matriz completa
+        
+        Returns:
+            Tuple[List[int], np.ndarray]: IDs de fragmento y similitudes float32 paralelas
+        """
+        consulta = np.asarray(consulta, dtype=np.float32)
+        partes = []
+        for segmento, vivas in zip(self.segmentos, self._filas_vivas()):
+            if len(segmento) == 0:
+                continue
+            similitudes = segmento.puntuar(consulta, nprobe, reevaluar)
+            partes.append(similitudes if vivas is None else similitudes[vivas])
+        
+        if not partes:
+            return [], np.zeros(0, dtype=np.float32)
+        return self.ids, np.concatenate(partes)
+    
+    def puntuar_lote(self, consultas: np.ndarray, reevaluar: int = 0) -> Tuple[List[int], np.ndarray]:
+        """
+        Calcula el producto escalar de varios vectores normalizados con todas las filas vivas
+        
+        Cada segmento puntúa todas las consultas con un único producto matriz-matriz. La
+        búsqueda es siempre exacta (sin IVF); los segmentos con copia compacta recalculan
+        las reevaluar mejores filas de cada consulta.
+        
+        Args:
+            consultas (np.ndarray): Vectores normalizados, una fila por consulta
+            reevaluar (int): Mejores filas de cada segmento compacto y consulta que se
+                             puntúan con la matriz completa
+        
+        Returns:
+            Tuple[List[int], np.ndarray]: IDs de fragmento y similitudes float32 de forma
+            (consultas, filas vivas), una fila por consulta
+        """
+        consultas = np.asarray(consultas, dtype=np.float32)
+        partes = []
+        for segmento, vivas in zip(self.segmentos, self._filas_vivas()):
+            if len(segmento) == 0:
+                continue
+            similitudes = segmento.puntuar_lote(consultas, reevaluar)
+            partes.append(similitudes if vivas is None else similitudes[:, vivas])
+        
+        if not partes:
+            return [], np.zeros((len(consultas), 0), dtype=np.float32)
+        return self.ids, np.concatenate(partes, axis=1)
+    
+    def puntuar_posiciones(self, consulta: np.ndarray, posiciones: np.ndarray) -> np.ndarray:
+        """
+        Calcula la similitud exacta de un vector normalizado con algunas filas vivas
+        
+        Args:
+            consulta (np.ndarray): Vector de la consulta normalizado
+            posiciones (np.ndarray): Posiciones en el resultado de puntuar(), en orden ascendente
+        
+        Returns:
+            np.ndarray: Similitudes float32 paralelas a posiciones
+        """
+        consulta = np.asarray(consulta, dtype=np.float32)
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        similitudes = np.empty(len(posiciones), dtype=np.float32)
+        desplazamiento = 0
+        
+        for segmento, vivas in zip(self.segmentos, self._filas_vivas()):
+            filas_vivas = len(segmento) if vivas is None else len(vivas)
+            desde, hasta = np.searchsorted(posiciones, [desplazamiento, desplazamiento + filas_vivas])
+            if hasta > desde:
+                filas = posiciones[desde:hasta] - desplazamiento
+                if vivas is not None:
+                    filas = vivas[filas]
+                similitudes[desde:hasta] = segmento.puntuar_filas(consulta, filas)
+            desplazamiento += filas_vivas
+        return similitudes
+    
+    def posiciones(self, ids_fragmentos: Iterable[int]) -> np.ndarray:
+        """
+        Traduce IDs de fragmento a sus posiciones en el resultado de puntuar()
+        
+        Args:
+            ids_fragmentos: IDs de fragmento a localizar
+        
+        Returns:
+            np.ndarray: Posiciones en orden ascendente; los IDs eliminados o desconocidos se ignoran
+        """
+        ids = np.fromiter(ids_fragmentos, dtype=np.int64)
+        resultado = []
+        desplazamiento = 0
+        
+        for segmento, borrados, vivas in zip(self.segmentos, self.borrados, self._filas_vivas()):
+            filas, _ = segmento.filas(ids)
+            if borrados is None:
+                resultado.append(filas + desplazamiento)
+                desplazamiento += len(segmento)
+            else:
+                filas = filas[~borrados[filas]]
+                # Las filas vivas están ordenadas: la posición de una fila es cuántas vivas la preceden
+                resultado.append(np.searchsorted(vivas, filas) + desplazamiento)
+                desplazamiento += len(vivas)
+        
+        if not resultado:
+            return np.zeros(0, dtype=np.int64)
+        return np.sort(np.concatenate(resultado)).astype(np.int64)
+    
+    def _ids_de_filas(self, segmento: Segmento, borrados: Optional[np.ndarray], filas: np.ndarray) -> List[int]:
+        if borrados is not None:
+            filas = filas[~borrados[filas]]
+        return segmento.ids[filas].tolist()
+    
+    def fragmentos_con_tokens(self, tokens: List[str]) -> Set[int]:
+        """
+        Obtiene los fragmentos vivos que contienen todos los tokens indicados
+        
+        Args:
+            tokens: Tokens normalizados (ver indexador.tokenizar)
+        
+        Returns:
+            Set[int]: IDs de fragmento
+        """
+        resultado = set()
+        for segmento, borrados in zip(self.segmentos, self.borrados):
+            filas = segmento.terminos.get(tokens[0])
+            for token in tokens[1:]:
+                if filas is None or len(filas) == 0:
+                    break
+                otras = segmento.terminos.get(token)
+                filas = None if otras is None else np.intersect1d(filas, otras, assume_unique=True)
+            if filas is not None and len(filas):
+                resultado.update(self._ids_de_filas(segmento, borrados, filas))
+        return resultado
+    
+    def contienen_tokens(self, posiciones: np.ndarray, tokens: List[str]) -> np.ndarray:
+        """
+        Indica qué filas vivas de las indicadas contienen todos los tokens
+        
+        Consulta las listas de apariciones de cada token sólo para esas filas, sin construir
+        el conjunto de todos los fragmentos que los contienen.
+        
+        Args:
+            posiciones (np.ndarray): Posiciones en el resultado de puntuar(), en orden ascendente
+            tokens: Tokens normalizados (ver indexador.tokenizar)
+        
+        Returns:
+            np.ndarray: Máscara booleana paralela a posiciones
+        """
+        posiciones = np.asarray(posiciones, dtype=np.int64)
+        contienen = np.zeros(len(posiciones), dtype=bool)
+        desplazamiento = 0
+        
+        for segmento, vivas in zip(self.segmentos, self._filas_vivas()):
+            filas_vivas = len(segmento) if vivas is None else len(vivas)
+            desde, hasta = np.searchsorted(posiciones, [desplazamiento, desplazamiento + filas_vivas])
+            if hasta > desde:
+                filas = posiciones[desde:hasta] - desplazamiento
+                if vivas is not None:
+                    filas = vivas[filas]
+                mascara = np.ones(len(filas), dtype=bool)
+                for token in tokens:
+                    filas_token = segmento.terminos.get(token)
+                    if filas_token is None:
+                        mascara[:] = False
+                        break
+                    mascara &= np.isin(filas, filas_token, assume_unique=True)
+                contienen[desde:hasta] = mascara
+            desplazamiento += filas_vivas
+        return contienen
+    
+    def fragmentos_con_subcadenas(self, tokens: List[str]) -> Set[int]:
+        """
+        Obtiene los fragmentos vivos con, para cada token indicado, algún token que lo contiene
+        
+        Args:
+            tokens: Tokens normalizados a buscar como subcadena
+        
+        Returns:
+            Set[int]: IDs de fragmento
+        """
+        resultado = set()
+        for segmento, borrados in zip(self.segmentos, self.borrados):
+            filas = None
+            for token in tokens:
+                apariciones = [filas_termino for termino, filas_termino in segmento.terminos.items()
+                               if token in termino]
+                apariciones = np.unique(np.concatenate(apariciones)) if apariciones else np.zeros(0, dtype=np.int32)
+                filas = apariciones if filas is None else np.intersect1d(filas, apariciones, assume_unique=True)
+                if len(filas) == 0:
+                    break
+            if filas is not None and len(filas):
+                resultado.update(self._ids_de_filas(segmento, borrados, filas))
+        return resultado
+
+class SegmentoMemoria:
+    """
+    Segmento en construcción que recibe los fragmentos nuevos
+    
+    Las filas se añaden al final de búferes que crecen duplicando su tamaño, y las
+    instantáneas ven sólo las filas ya escritas (vistas [:n] de los búferes), por lo que
+    añadir filas nunca altera lo que está leyendo una búsqueda. El mapa de términos se
+    sustituye por una copia en cada lote en lugar de modificarse.
+    """
+    
+    def __init__(self, capacidad: int = 1024):
+        self._ids = np.zeros(capacidad, dtype=np.int64)
+        self._matriz = None  # Se crea con la dimensión del primer embedding
+        self._terminos = {}
+        self.num_filas = 0
+        self._fila_por_id = {}
+    
+    def __len__(self) -> int:
+        return self.num_filas
+    
+    def _asegurar_capacidad(self, filas: int, dimension: int):
+        if self._matriz is None:
+            self._matriz = np.zeros((len(self._ids), dimension), dtype=np.float32)
+        capacidad = len(self._ids)
+        if filas <= capacidad:
+            return
+        
+        nueva_capacidad = max(filas, capacidad * 2)
+        ids = np.zeros(nueva_capacidad, dtype=np.int64)
+        ids[:self.num_filas] = self._ids[:self.num_filas]
+        matriz = np.zeros((nueva_capacidad, dimension), dtype=np.float32)
+        matriz[:self.num_filas] = self._matriz[:self.num_filas]
+        self._ids, self._matriz = ids, matriz
+    
+    def agregar(self, ids: Sequence[int], vectores: np.ndarray, tokens_por_fila: Sequence[Iterable[str]]) -> np.ndarray:
+        """
+        Añade un lote de fragmentos al final del segmento
+        
+        Args:
+            ids: IDs de fragmento
+            vectores (np.ndarray): Embeddings normalizados, uno por ID
+            tokens_por_fila: Tokens distintos de cada fragmento
+        
+        Returns:
+            np.ndarray: Filas asignadas a los fragmentos
+        """
+        inicio = self.num_filas
+        fin = inicio + len(ids)
+        self._asegurar_capacidad(fin, vectores.shape[1])
+        self._ids[inicio:fin] = ids
+        self._matriz[inicio:fin] = vectores
+        
+        terminos = dict(self._terminos)
+        for token, filas in _terminos_por_fila(tokens_por_fila, inicio).items():
+            anteriores = terminos.get(token)
+            nuevas = np.asarray(filas, dtype=np.int32)
+            terminos[token] = nuevas if anteriores is None else np.concatenate((anteriores, nuevas))
+        self._terminos = terminos
+        
+        self._fila_por_id.update(zip(ids, range(inicio, fin)))
+        self.num_filas = fin
+        return np.arange(inicio, fin)
+    
+    def fila(self, fragmento_id: int) -> Optional[int]:
+        """Devuelve la fila de un fragmento del segmento, o None si no está"""
+        return self._fila_por_id.get(fragmento_id)
+    
+    def vista(self) -> Segmento:
+        """
+        Devuelve las filas escritas hasta ahora como un segmento de sólo lectura
+        
+        Las filas de un mismo lote están en orden de ID, pero un fragmento reemplazado al
+        reaplicar la bitácora puede romper el orden global; en ese caso la vista no admite
+        búsquedas binarias y hay que congelar el segmento.
+        """
+        n = self.num_filas
+        if self._matriz is None:
+            return Segmento(np.zeros(0, dtype=np.int64), np.zeros((0, 0), dtype=np.float32), {})
+        return Segmento(self._ids[:n], self._matriz[:n], self._terminos)
+    
+    def ordenado(self) -> bool:
+        """Indica si las filas están en orden ascendente de ID"""
+        ids = self._ids[:self.num_filas]
+        return bool(np.all(ids[1:] > ids[:-1]))
+    
+    def congelar(self, tipo) -> Segmento:
+        """Copia las filas escritas en un segmento inmutable del tipo indicado, ordenado por ID"""
+        n = self.num_filas
+        return Segmento.crear(self._ids[:n].copy(), self._matriz[:n], self._terminos, tipo)
+
+class IndiceSegmentos:
+    """
+    Índice vectorial y de términos formado por segmentos inmutables (estilo LSM)
+    
+    Los fragmentos nuevos entran en un segmento en memoria que, al llenarse, se congela
+    en un segmento inmutable. Las bajas no modifican ningún segmento: se registran en una
+    máscara de borrado por segmento, que se copia al cambiar (copia en escritura). Cada
+    cambio publica una Instantanea nueva con una simple asignación, de modo que las
+    búsquedas toman la vigente sin bloqueos y los escritores sólo se coordinan entre sí.
+    
+    Un hilo en segundo plano fusiona los segmentos pequeños: cuando hay factor_fusion
+    segmentos consecutivos del mismo nivel de tamaño los sustituye por uno solo sin las
+    filas eliminadas, de modo que el número de segmentos crece de forma logarítmica.
+    
+    Con tipo_puntuacion 'float16' o 'int8' cada segmento congelado tiene además una copia
+    compacta de su matriz, en memoria, sobre la que se puntúan las consultas; la matriz
+    completa queda en disco y sólo se leen de ella las filas que se recalculan.
+    
+    Los segmentos de al menos min_filas_ivf filas que crean las fusiones llevan un índice
+    IVF propio, entrenado en el hilo de fusión, con el que las búsquedas aproximadas
+    exploran sólo parte de sus filas. Así el índice aproximado se construye de forma
+    incremental: cada segmento nuevo trae el suyo y nunca hay que reentrenarlo todo.
+    
+    En disco, cada segmento tiene una matriz .npy (que se abre con memmap) y un .npz
+    con sus IDs, términos e IVF; las máscaras de borrado se guardan juntas y el
+    manifiesto segmentos.json indica qué archivos están vigentes.
+    """
+    
+    def __init__(self, directorio_datos: str, tipo: str = 'float32', capacidad_memoria: int = 4096,
+                 factor_fusion: int = 4, min_filas_ivf: int = 0, tipo_puntuacion: str = 'float32'):
+        """
+        Inicializa un índice vacío
+        
+        Args:
+            directorio_datos (str): Directorio donde se guardan los segmentos
+            tipo (str): Tipo de dato de las matrices guardadas ('float32' o 'float16')
+            capacidad_memoria (int): Fragmentos del segmento en memoria antes de congelarlo
+            factor_fusion (int): Segmentos del mismo nivel que se fusionan en uno (0 desactiva la fusión)
+            min_filas_ivf (int): Filas a partir de las cuales un segmento lleva índice IVF (0 = nunca)
+            tipo_puntuacion (str): Tipo de la copia compacta con la que se puntúa ('float16' o
+                                   'int8'); con 'float32' se puntúa directamente la matriz guardada
+        """
+        if tipo not in TIPOS:
+            raise ValueError(f"Tipo de embedding no soportado: {tipo}")
+        if tipo_puntuacion not in TIPOS_PUNTUACION:
+            raise ValueError(f"Tipo de puntuación no soportado: {tipo_puntuacion}")
+        
+        self.directorio_datos = directorio_datos
+        self.ruta_manifiesto = os.path.join(directorio_datos, ARCHIVO_MANIFIESTO)
+        self.tipo = np.dtype(TIPOS[tipo])
+        self.capacidad_memoria = max(1, capacidad_memoria)
+        self.factor_fusion = factor_fusion
+        self.min_filas_ivf = min_filas_ivf
+        self.tipo_puntuacion = tipo_puntuacion
+        
+        self._bloqueo = threading.RLock()  # Sólo para los escritores y el hilo de fusión
+        self._bloqueo_fusion = threading.Lock()  # Una sola fusión o compactación a la vez
+        self._segmentos = []   # Segmentos congelados, en orden de ID
+        self._borrados = []    # Máscara de borrado de cada segmento congelado (o None)
+        self._memoria = SegmentoMemoria()
+        self._borrados_memoria = None
+        self._siguiente_segmento = 1
+        self._version = 0
+        self._modificado = False
+        self._instantanea = Instantanea((), ())
+        
+        self._hay_trabajo = threading.Event()
+        self._hilo_fusion = None
+        self._detener = False
+        self.fusiones = 0
+    
+    def instantanea(self) -> Instantanea:
+        """Devuelve el estado vigente del índice; nunca espera a los escritores"""
+        return self._instantanea
+    
+    def __len__(self) -> int:
+        return len(self._instantanea)
+    
+    def _publicar(self):
+        """Crea la instantánea con el estado actual (llamar con el bloqueo tomado)"""
+        segmentos = list(self._segmentos)
+        borrados = list(self._borrados)
+        if len(self._memoria):
+            segmentos.append(self._memoria.vista())
+            borrados.append(self._borrados_memoria)
+        self._instantanea = Instantanea(tuple(segmentos), tuple(borrados))
+    
+    def agregar(self, ids: Sequence[int], vectores, tokens_por_fila: Sequence[Iterable[str]]):
+        """
+        Añade un lote de fragmentos nuevos
+        
+        Los IDs no deben estar vivos en el índice: para reemplazar un fragmento hay que
+        eliminarlo antes.
+        
+        Args:
+            ids: IDs de fragmento
+            vectores: Embeddings, uno por ID (se guardan normalizados)
+            tokens_por_fila: Tokens distintos del texto de cada fragmento
+        """
+        if not len(ids):
+            return
+        vectores = _normalizar(vectores)
+        
+        with self._bloqueo:
+            self._memoria.agregar(list(ids), vectores, tokens_por_fila)
+            if self._borrados_memoria is not None:
+                self._borrados_memoria = np.concatenate(
+                    (self._borrados_memoria, np.zeros(len(ids), dtype=bool)))
+            
+            self._modificado = True
+            if len(self._memoria) >= self.capacidad_memoria or not self._memoria.ordenado():
+                self._congelar_memoria()
+            self._publicar()
+    
+    def eliminar(self, ids: Iterable[int]):
+        """
+        Marca fragmentos como eliminados en los segmentos que los contienen
+        
+        Args:
+            ids: IDs de fragmento; los que no están en el índice se ignoran
+        """
+        ids = np.fromiter(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        
+        with self._bloqueo:
+            for indice, segmento in enumerate(self._segmentos):
+                filas, _ = segmento.filas(ids)
+                if len(filas):
+                    borrados = self._borrados[indice]
+                    borrados = np.zeros(len(segmento), dtype=bool) if borrados is None else borrados.copy()
+                    borrados[filas] = True
+                    self._borrados[indice] = borrados
+            
+            filas = [fila for fila in map(self._memoria.fila, ids.tolist()) if fila is not None]
+            if filas:
+                borrados = self._borrados_memoria
+                borrados = np.zeros(len(self._memoria), dtype=bool) if borrados is None else borrados.copy()
+                borrados[filas] = True
+                self._borrados_memoria = borrados
+            
+            self._modificado = True
+            self._publicar()
+        self._hay_trabajo.set()
+    
+    def importar(self, ids: Sequence[int], matriz: np.ndarray, terminos: Dict[str, Iterable[int]]):
+        """
+        Añade un segmento congelado completo (índices del formato anterior a los segmentos)
+        
+        Args:
+            ids: IDs de fragmento de cada fila
+            matriz (np.ndarray): Embeddings normalizados
+            terminos (dict): Mapa de token a los IDs de fragmento que lo contienen
+        """
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(ids) == 0:
+            return
+        fila_por_id = {fragmento_id: fila for fila, fragmento_id in enumerate(ids.tolist())}
+        filas = {token: sorted(fila_por_id[fragmento_id] for fragmento_id in ids_termino
+                               if fragmento_id in fila_por_id)
+                 for token, ids_termino in terminos.items()}
+        segmento = self._completar(Segmento.crear(ids, np.asarray(matriz), filas, self.tipo))
+        
+        with self._bloqueo:
+            self._congelar_memoria()
+            self._segmentos.append(segmento)
+            self._borrados.append(None)
+            self._modificado = True
+            self._publicar()
+    
+    def _congelar_memoria(self):
+        """Convierte el segmento en memoria en uno congelado (llamar con el bloqueo tomado)"""
+        if not len(self._memoria):
+            return
+        
+        if self._borrados_memoria is None:
+            segmento = self._completar(self._memoria.congelar(self.tipo))
+        else:
+            # Sin las filas eliminadas: un fragmento reemplazado tendría si no dos filas con
+            # el mismo ID, y la búsqueda binaria de filas() sólo encuentra una de ellas
+            segmento = self._fusionar([self._memoria.vista()], [self._borrados_memoria])
+        
+        if len(segmento):
+            self._segmentos.append(segmento)
+            self._borrados.append(None)
+        self._memoria = SegmentoMemoria()
+        self._borrados_memoria = None
+        self._hay_trabajo.set()
+    
+    # Fusión en segundo plano
+    
+    def iniciar_fusion(self):
+        """Arranca el hilo que fusiona segmentos, si la fusión está activada"""
+        if self.factor_fusion < 2 or self._hilo_fusion is not None:
+            return
+        self._detener = False
+        self._hilo_fusion = threading.Thread(target=self._bucle_fusion, daemon=True, name="fusion-segmentos")
+        self._hilo_fusion.start()
+        self._hay_trabajo.set()
+    
+    def detener_fusion(self):
+        """Detiene el hilo de fusión, esperando a que termine la fusión en curso"""
+        hilo = self._hilo_fusion
+        if hilo is None:
+            return
+        self._detener = True
+        self._hay_trabajo.set()
+        hilo.join()
+        self._hilo_fusion = None
+    
+    def _bucle_fusion(self):
+        while not self._detener:
+            self._hay_trabajo.wait()
+            self._hay_trabajo.clear()
+            try:
+                while not self._detener and self.fusionar_pendientes():
+                    pass
+            except Exception as e:
+                logger.error(f"Error al fusionar segmentos: {e}")
+    
+    def _nivel(self, filas: int) -> int:
+        """Nivel de tamaño de un segmento: cada nivel tiene factor_fusion veces más filas"""
+        nivel = 0
+        limite = self.capacidad_memoria
+        while filas > limite:
+            limite *= self.factor_fusion
+            nivel += 1
+        return nivel
+    
+    def _elegir_fusion(self) -> Optional[Tuple[int, int]]:
+        """Busca factor_fusion segmentos consecutivos del mismo nivel; devuelve su rango"""
+        niveles = [self._nivel(len(segmento) if borrados is None else int(np.count_nonzero(~borrados)))
+                   for segmento, borrados in zip(self._segmentos, self._borrados)]
+        inicio = 0
+        for fin in range(1, len(niveles) + 1):
+            if fin == len(niveles) or niveles[fin] != niveles[inicio]:
+                if fin - inicio >= self.factor_fusion:
+                    return inicio, inicio + self.factor_fusion
+                inicio = fin
+        
+        # Un segmento con más de la mitad de sus filas eliminadas se reescribe solo
+        for indice, (segmento, borrados) in enumerate(zip(self._segmentos, self._borrados)):
+            if borrados is not None and np.count_nonzero(borrados) * 2 > len(segmento):
+                return indice, indice + 1
+        return None
+    
+    def fusionar_pendientes(self) -> bool:
+        """
+        Hace una fusión si la política lo indica
+        
+        Returns:
+            bool: True si se fusionaron segmentos
+        """
+        with self._bloqueo_fusion:
+            with self._bloqueo:
+                rango = self._elegir_fusion()
+            return rango is not None and self._sustituir(*rango)
+    
+    def compactar(self) -> int:
+        """
+        Fusiona todos los segmentos en uno solo sin filas eliminadas
+        
+        Returns:
+            int: Filas eliminadas descartadas
+        """
+        with self._bloqueo_fusion:
+            with self._bloqueo:
+                self._congelar_memoria()
+                self._publicar()
+                fin = len(self._segmentos)
+                eliminadas = sum(int(np.count_nonzero(borrados)) for borrados in self._borrados
+                                 if borrados is not None)
+            if fin == 0 or (fin == 1 and eliminadas == 0):
+                return 0
+            return eliminadas if self._sustituir(0, fin) else 0
+    
+    def _sustituir(self, inicio: int, fin: int) -> bool:
+        """
+        Sustituye un rango de segmentos consecutivos por su fusión
+        
+        La fusión se calcula sin el bloqueo, a partir de segmentos inmutables; sólo la
+        sustitución final lo toma, y reaplica las bajas que hayan llegado mientras tanto.
+        Hay que llamarla con _bloqueo_fusion tomado.
+        
+        Returns:
+            bool: False si el índice se limpió o recargó mientras tanto
+        """
+        with self._bloqueo:
+            segmentos = self._segmentos[inicio:fin]
+            borrados = self._borrados[inicio:fin]
+        
+        fusionado = self._fusionar(segmentos, borrados)
+        
+        with self._bloqueo:
+            if self._segmentos[inicio:fin] != segmentos:
+                return False
+            
+            # Bajas registradas durante la fusión
+            eliminados = []
+            for segmento, antes, ahora in zip(segmentos, borrados, self._borrados[inicio:fin]):
+                if ahora is not None:
+                    nuevos = ahora if antes is None else ahora & ~antes
+                    eliminados.append(segmento.ids[nuevos])
+            borrados_fusion = None
+            if eliminados:
+                filas, _ = fusionado.filas(np.concatenate(eliminados))
+                if len(filas):
+                    borrados_fusion = np.zeros(len(fusionado), dtype=bool)
+                    borrados_fusion[filas] = True
+            
+            # Un segmento sin filas vivas desaparece
+            self._segmentos[inicio:fin] = [fusionado] if len(fusionado) else []
+            self._borrados[inicio:fin] = [borrados_fusion] if len(fusionado) else []
+            self._modificado = True
+            self.fusiones += 1
+            self._publicar()
+        
+        logger.info(f"Fusionados {fin - inicio} segmentos ({sum(len(s) for s in segmentos)} filas) "
+                    f"en uno de {len(fusionado)} filas")
+        return True
+    
+    def estadisticas(self) -> Dict[str, int]:
+        """
+        Número de segmentos, filas totales, filas eliminadas pendientes de descartar y
+        bytes de las matrices con las que se puntúan las consultas
+        """
+        instantanea = self._instantanea
+        filas = sum(len(segmento) for segmento in instantanea.segmentos)
+        eliminadas = sum(int(np.count_nonzero(borrados)) for borrados in instantanea.borrados
+                         if borrados is not None)
+        bytes_puntuacion = sum(segmento.matriz.nbytes if segmento.compacta is None
+                               else segmento.compacta.nbytes + (0 if segmento.escalas is None
+                                                                else segmento.escalas.nbytes)
+                               for segmento in instantanea.segmentos)
+        return {"segmentos": len(instantanea.segmentos), "filas": filas, "filas_eliminadas": eliminadas,
+                "fusiones": self.fusiones, "bytes_puntuacion": int(bytes_puntuacion)}
+    
+    def _fusionar(self, segmentos: List[Segmento], borrados: List[Optional[np.ndarray]]) -> Segmento:
+        """
+        Crea un segmento con las filas vivas de varios segmentos consecutivos
+        
+        Si un ID aparece vivo en más de una fila (índices dañados por un punto de control
+        interrumpido antes de que la bitácora se reaplicara sin duplicar), se conserva sólo
+        la última, la más reciente.
+        """
+        vivas_por_segmento = [np.arange(len(segmento)) if borrados_segmento is None
+                              else np.flatnonzero(~borrados_segmento)
+                              for segmento, borrados_segmento in zip(segmentos, borrados)]
+        ids_vivos = np.concatenate([segmento.ids[vivas] for segmento, vivas in zip(segmentos, vivas_por_segmento)])
+        _, ultimas = np.unique(ids_vivos[::-1], return_index=True)
+        if len(ultimas) < len(ids_vivos):
+            logger.warning(f"Descartadas {len(ids_vivos) - len(ultimas)} filas con IDs repetidos al fusionar")
+            conservar = np.zeros(len(ids_vivos), dtype=bool)
+            conservar[len(ids_vivos) - 1 - ultimas] = True
+            limites = np.cumsum([len(vivas) for vivas in vivas_por_segmento])[:-1]
+            vivas_por_segmento = [vivas[mascara] for vivas, mascara
+                                  in zip(vivas_por_segmento, np.split(conservar, limites))]
+        
+        ids, matrices, terminos = [], [], {}
+        desplazamiento = 0
+        for segmento, vivas in zip(segmentos, vivas_por_segmento):
+            # Nueva fila de cada fila viva; -1 para las eliminadas
+            nueva_fila = np.full(len(segmento), -1, dtype=np.int64)
+            nueva_fila[vivas] = np.arange(len(vivas)) + desplazamiento
+            
+            ids.append(segmento.ids[vivas])
+            matrices.append(np.asarray(segmento.matriz[vivas], dtype=self.tipo))
+            for token, filas in segmento.terminos.items():
+                filas = nueva_fila[filas]
+                filas = filas[filas >= 0]
+                if len(filas):
+                    terminos.setdefault(token, []).append(filas)
+            desplazamiento += len(vivas)
+        
+        terminos = {token: np.concatenate(partes) for token, partes in terminos.items()}
+        # Normalmente ya están en orden de ID; crear() sólo reordena si algún fragmento se reemplazó
+        return self._completar(Segmento.crear(np.concatenate(ids), np.concatenate(matrices), terminos, self.tipo))
+    
+    def _necesita_ivf(self, segmento: Segmento) -> bool:
+        return self.min_filas_ivf > 0 and segmento.ivf is None and len(segmento) >= self.min_filas_ivf
+    
+    def _necesita_compacta(self, segmento: Segmento) -> bool:
+        if self.tipo_puntuacion == 'float32':
+            return False
+        return segmento.compacta is None or segmento.compacta.dtype != np.dtype(self.tipo_puntuacion)
+    
+    def _completar(self, segmento: Segmento) -> Segmento:
+        """Crea la copia compacta de un segmento nuevo y, si tiene filas suficientes, su índice IVF"""
+        if self.tipo_puntuacion == 'float32':
+            segmento.compacta, segmento.escalas = None, None
+        elif self._necesita_compacta(segmento):
+            segmento.compacta, segmento.escalas = _comprimir(segmento.matriz, self.tipo_puntuacion)
+        if self._necesita_ivf(segmento):
+            segmento.ivf = IndiceIVF.entrenar(segmento.matriz)
+            logger.info(f"Índice IVF de {segmento.ivf.num_listas} listas para un segmento de {len(segmento)} filas")
+        return segmento
+    
+    # Persistencia
+    
+    def guardar(self):
+        """
+        Guarda en disco los segmentos nuevos, las máscaras de borrado y el manifiesto
+        
+        El segmento en memoria se congela antes. Los segmentos ya guardados no se
+        reescriben; el manifiesto se reemplaza de forma atómica al final y después se
+        borran los archivos que ya no referencia.
+        """
+        with self._bloqueo:
+            self._congelar_memoria()
+            if not self._modificado and os.path.exists(self.ruta_manifiesto):
+                self._publicar()
+                return
+            
+            self._version += 1
+            nombres = []
+            marcas = {}
+            for segmento, borrados in zip(self._segmentos, self._borrados):
+                if segmento.nombre is None:
+                    self._escribir_segmento(segmento)
+                nombres.append(segmento.nombre)
+                if borrados is not None:
+                    marcas[segmento.nombre] = np.packbits(borrados)
+            
+            archivo_borrados = None
+            if marcas:
+                archivo_borrados = f"borrados_{self._version:06d}.npz"
+                escribir_atomico(os.path.join(self.directorio_datos, archivo_borrados),
+                                 lambda f: np.savez(f, **marcas), 'wb')
+            
+            manifiesto = {"version": self._version, "tipo": str(self.tipo),
+                          "siguiente_segmento": self._siguiente_segmento,
+                          "segmentos": nombres, "borrados": archivo_borrados}
+            escribir_atomico(self.ruta_manifiesto, lambda f: json.dump(manifiesto, f))
+            self._modificado = False
+            self._publicar()
+            
+            vigentes = {f"{nombre}.{extension}" for nombre in nombres for extension in ("npy", "npz")}
+            if archivo_borrados:
+                vigentes.add(archivo_borrados)
+            self._eliminar_archivos(conservar=vigentes)
+    
+    def _escribir_segmento(self, segmento: Segmento):
+        """Escribe un segmento nuevo y reabre su matriz con memmap"""
+        nombre = f"segmento_{self._siguiente_segmento:06d}"
+        self._siguiente_segmento += 1
+        ruta_matriz = os.path.join(self.directorio_datos, f"{nombre}.npy")
+        
+        matriz = np.ascontiguousarray(segmento.matriz, dtype=self.tipo)
+        escribir_atomico(ruta_matriz, lambda f: np.save(f, matriz), 'wb')
+        self._escribir_datos(segmento, nombre)
+        
+        # El segmento es inmutable: cambiar su matriz por la del archivo no altera sus valores
+        segmento.matriz = np.load(ruta_matriz, mmap_mode='r')
+        segmento.nombre = nombre
+    
+    def _escribir_datos(self, segmento: Segmento, nombre: str):
+        """Escribe el .npz de un segmento: IDs, términos, copia compacta e índice IVF"""
+        # Términos en formato CSR: tokens, y sus filas concatenadas con un desplazamiento por token
+        tokens = list(segmento.terminos)
+        filas = [segmento.terminos[token] for token in tokens]
+        desplazamientos = np.zeros(len(tokens) + 1, dtype=np.int64)
+        np.cumsum([len(f) for f in filas], out=desplazamientos[1:])
+        datos = {"ids": segmento.ids, "tokens": np.array(tokens, dtype=str),
+                 "desplazamientos": desplazamientos,
+                 "filas": np.concatenate(filas).astype(np.int32) if filas else np.zeros(0, dtype=np.int32)}
+        if segmento.compacta is not None:
+            datos["compacta"] = segmento.compacta
+            if segmento.escalas is not None:
+                datos["escalas"] = segmento.escalas
+        if segmento.ivf is not None:
+            datos.update(segmento.ivf.a_arrays())
+        escribir_atomico(os.path.join(self.directorio_datos, f"{nombre}.npz"),
+                         lambda f: np.savez(f, **datos), 'wb')
+    
+    def _leer_segmento(self, nombre: str) -> Segmento:
+        ruta_matriz = os.path.join(self.directorio_datos, f"{nombre}.npy")
+        matriz = np.load(ruta_matriz, mmap_mode='r')
+        with np.load(os.path.join(self.directorio_datos, f"{nombre}.npz")) as datos:
+            ids = datos["ids"]
+            tokens = datos["tokens"].tolist()
+            desplazamientos = datos["desplazamientos"]
+            filas = datos["filas"]
+            ivf = IndiceIVF.desde_arrays(datos)
+            compacta = datos["compacta"] if "compacta" in datos else None
+            escalas = datos["escalas"] if "escalas" in datos else None
+        
+        if len(matriz) != len(ids):
+            raise ValueError(f"La matriz del segmento {nombre} no corresponde a sus IDs")
+        
+        terminos = {token: filas[desplazamientos[i]:desplazamientos[i + 1]] for i, token in enumerate(tokens)}
+        segmento = Segmento(ids, matriz, terminos, nombre, ivf, compacta, escalas)
+        reescribir = self._necesita_ivf(segmento) or self._necesita_compacta(segmento)
+        self._completar(segmento)
+        if reescribir:
+            # Segmento guardado con otra configuración: se reescribe su .npz con lo que le faltaba
+            self._escribir_datos(segmento, nombre)
+        return segmento
+    
+    def cargar(self) -> bool:
+        """
+        Abre los segmentos del manifiesto
+        
+        Returns:
+            bool: True si había un índice de segmentos guardado
+        """
+        if not os.path.exists(self.ruta_manifiesto):
+            return False
+        
+        with open(self.ruta_manifiesto, 'r', encoding='utf-8') as f:
+            manifiesto = json.load(f)
+        
+        segmentos = [self._leer_segmento(nombre) for nombre in manifiesto["segmentos"]]
+        borrados = [None] * len(segmentos)
+        if manifiesto.get("borrados"):
+            with np.load(os.path.join(self.directorio_datos, manifiesto["borrados"])) as marcas:
+                for indice, segmento in enumerate(segmentos):
+                    if segmento.nombre in marcas:
+                        borrados[indice] = np.unpackbits(marcas[segmento.nombre], count=len(segmento)).astype(bool)
+        
+        with self._bloqueo:
+            self._segmentos = segmentos
+            self._borrados = borrados
+            self._memoria = SegmentoMemoria()
+            self._borrados_memoria = None
+            self._siguiente_segmento = manifiesto["siguiente_segmento"]
+            self._version = manifiesto["version"]
+            # Una matriz guardada con otro tipo se convierte en la próxima fusión que la incluya
+            self._modificado = False
+            self._publicar()
+        
+        self._hay_trabajo.set()
+        return True
+    
+    def _eliminar_archivos(self, conservar: Set[str] = frozenset()):
+        """Elimina los archivos de segmentos y de marcas de borrado que no estén en conservar"""
+        for nombre in os.listdir(self.directorio_datos):
+            if PATRON_ARCHIVO.match(nombre) and nombre not in conservar:
+                try:
+                    os.remove(os.path.join(self.directorio_datos, nombre))
+                except OSError as e:
+                    # En Windows no se puede borrar un archivo que otro proceso tiene mapeado
+                    logger.warning(f"No se pudo eliminar {nombre}: {e}")
+    
+    def limpiar(self):
+        """Vacía el índice y elimina sus archivos"""
+        with self._bloqueo:
+            self._segmentos = []
+            self._borrados = []
+            self._memoria = SegmentoMemoria()
+            self._borrados_memoria = None
+            self._modificado = False
+            self._publicar()
+            
+            if os.path.exists(self.ruta_manifiesto):
+                os.remove(self.ruta_manifiesto)
+            self._eliminar_archivos()
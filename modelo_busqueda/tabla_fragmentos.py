@@ -0,0 +1,131 @@
+import numpy as np
+from typing import Dict, List, Optional
+from .persistencia import escribir_atomico
+
+class TablaFragmentos:
+    """
+    Tabla columnar con la información propia de cada fragmento
+    
+    El ID interno de un fragmento es su fila en la tabla. Cada columna es un array numpy
+    compacto (documento, número de fragmento, palabra inicial y final, página o línea), de
+    modo que los metadatos del documento se guardan una sola vez en la tabla de documentos
+    y no se copian en cada fragmento. Las filas eliminadas se marcan como no vivas.
+    """
+    
+    COLUMNAS = {
+        'documento': np.int32,  # ID del documento al que pertenece el fragmento
+        'numero': np.int32,     # Número de fragmento dentro del documento (desde 1)
+        'inicio': np.int32,     # Palabra inicial del fragmento
+        'fin': np.int32,        # Palabra final (exclusiva) del fragmento
+        'posicion': np.int32,   # Página (PDF) o línea en la que empieza; -1 si no se conoce
+        'vivo': np.bool_,       # False si el fragmento fue eliminado
+    }
+    
+    def __init__(self, capacidad: int = 1024):
+        self._columnas = {nombre: np.zeros(capacidad, dtype=tipo) for nombre, tipo in self.COLUMNAS.items()}
+        self.num_filas = 0
+    
+    def __getattr__(self, nombre: str) -> np.ndarray:
+        # Acceso a cada columna como atributo (tabla.documento, tabla.vivo, ...) limitado a las filas usadas
+        columnas = self.__dict__.get('_columnas')
+        if columnas is not None and nombre in columnas:
+            return columnas[nombre][:self.num_filas]
+        raise AttributeError(nombre)
+    
+    def __len__(self) -> int:
+        """Número de fragmentos vivos"""
+        return int(np.count_nonzero(self.vivo))
+    
+    def _asegurar_capacidad(self, filas: int):
+        """Amplía las columnas (duplicando su tamaño) para que quepan al menos `filas` filas"""
+        capacidad = len(self._columnas['vivo'])
+        if filas <= capacidad:
+            return
+        
+        nueva_capacidad = max(filas, capacidad * 2)
+        for nombre, columna in self._columnas.items():
+            ampliada = np.zeros(nueva_capacidad, dtype=columna.dtype)
+            ampliada[:capacidad] = columna
+            self._columnas[nombre] = ampliada
+    
+    def agregar(self, documento: int, numero: int, inicio: int, fin: int, posicion: int,
+                fila: Optional[int] = None) -> int:
+        """
+        Añade un fragmento a la tabla
+        
+        Args:
+            documento (int): ID del documento
+            numero (int): Número de fragmento dentro del documento
+            inicio (int): Palabra inicial
+            fin (int): Palabra final (exclusiva)
+            posicion (int): Página o línea (-1 si no se conoce)
+            fila (int): Fila en la que colocarlo; por defecto la siguiente libre. Se usa al
+                        reaplicar la bitácora para conservar los IDs originales.
+            
+        Returns:
+            int: ID interno (fila) del fragmento
+        """
+        if fila is None:
+            fila = self.num_filas
+        
+        self._asegurar_capacidad(fila + 1)
+        valores = {'documento': documento, 'numero': numero, 'inicio': inicio, 'fin': fin,
+                   'posicion': posicion, 'vivo': True}
+        for nombre, valor in valores.items():
+            self._columnas[nombre][fila] = valor
+        
+        self.num_filas = max(self.num_filas, fila + 1)
+        return fila
+    
+    def eliminar(self, fila: int):
+        """Marca un fragmento como eliminado"""
+        if 0 <= fila < self.num_filas:
+            self._columnas['vivo'][fila] = False
+    
+    def es_vivo(self, fila: int) -> bool:
+        return 0 <= fila < self.num_filas and bool(self._columnas['vivo'][fila])
+    
+    def fila(self, fila: int) -> Dict[str, int]:
+        """
+        Devuelve los valores de un fragmento como diccionario de enteros
+        
+        Args:
+            fila (int): ID interno del fragmento
+            
+        Returns:
+            dict: Valor de cada columna excepto 'vivo'
+        """
+        return {nombre: int(self._columnas[nombre][fila]) for nombre in self.COLUMNAS if nombre != 'vivo'}
+    
+    def agrupar_por_documento(self) -> Dict[int, List[int]]:
+        """
+        Agrupa los fragmentos vivos por documento en una sola pasada
+        
+        Returns:
+            dict: Mapa de ID de documento a los IDs de sus fragmentos en orden ascendente
+        """
+        filas = np.flatnonzero(self.vivo)
+        documentos = self.documento[filas]
+        orden = np.argsort(documentos, kind='stable')
+        filas, documentos = filas[orden], documentos[orden]
+        
+        # Cada documento ocupa un tramo contiguo de las filas ordenadas
+        inicios = np.flatnonzero(np.r_[True, documentos[1:] != documentos[:-1]]) if len(filas) else []
+        limites = list(inicios) + [len(filas)]
+        return {int(documentos[inicio]): filas[inicio:fin].tolist()
+                for inicio, fin in zip(limites[:-1], limites[1:])}
+    
+    def guardar(self, ruta: str):
+        """Guarda las columnas en un archivo .npz"""
+        columnas = {nombre: np.ascontiguousarray(getattr(self, nombre)) for nombre in self.COLUMNAS}
+        escribir_atomico(ruta, lambda f: np.savez(f, **columnas), 'wb')
+    
+    def cargar(self, ruta: str):
+        """Carga las columnas guardadas con guardar()"""
+        with np.load(ruta) as datos:
+            num_filas = len(datos['vivo'])
+            self._columnas = {nombre: np.zeros(max(num_filas, 1024), dtype=tipo)
+                              for nombre, tipo in self.COLUMNAS.items()}
+            for nombre in self.COLUMNAS:
+                self._columnas[nombre][:num_filas] = datos[nombre]
+        self.num_filas = num_filas